@@ -40,7 +40,6 @@ a = Analysis(
         'safetensors',
         # Database
         'sqlalchemy',
-        'sqlite3',
         'psycopg2',
         'pymysql',
         # Testing
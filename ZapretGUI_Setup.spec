@@ -4,7 +4,7 @@ a = Analysis(
     ['setup.py'],
     pathex=[],
     binaries=[],
-    datas=[('app.zip', '.'), ('app.ico', '.')],
+    datas=[('app.zip', '.'), ('app.manifest.json', '.'), ('app.ico', '.')],
     hiddenimports=['PyQt6', 'PyQt6.QtCore', 'PyQt6.QtGui', 'PyQt6.QtWidgets'],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,160 @@
+"""
+Logging setup for Zapret GUI.
+
+Callers use the standard library as usual (logging.getLogger(__name__)).
+setup() puts a single non-blocking QueueHandler on the root logger; a
+QueueListener thread does the actual work:
+
+- app/logs/zapret_gui.log, rotated at 1 MB, old files gzip-compressed;
+- an in-memory ring buffer the log page reads from;
+- stderr, when there is one (not in the windowed exe).
+
+The queue is bounded. When it is full, records are dropped and counted
+rather than making the logging thread wait.
+"""
+
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+LOG_DIR = "logs"
+LOG_FILE = "zapret_gui.log"
+MAX_BYTES = 1_000_000
+BACKUP_COUNT = 5
+QUEUE_SIZE = 10_000
+RING_SIZE = 5_000
+
+FORMAT = "%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+ring: Optional["RingBuffer"] = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising on a full queue."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RingBuffer(logging.Handler):
+    """Keeps the last `capacity` records as (seq, created, levelno, name, message) tuples.
+
+    seq grows by one per record, so readers poll with since(last_seq).
+    """
+
+    def __init__(self, capacity: int = RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        # QueueHandler.prepare() has already merged args and traceback into msg
+        message = record.getMessage()
+        with self._lock:
+            self.seq += 1
+            self.records.append((self.seq, record.created, record.levelno, record.name, message))
+
+    def since(self, seq: int) -> List[Tuple[int, float, int, str, str]]:
+        with self._lock:
+            if not self.records or self.records[-1][0] <= seq:
+                return []
+            first = self.records[0][0]
+            return list(self.records)[max(0, seq - first + 1):]
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup(app_dir: Path, level: int = logging.INFO) -> RingBuffer:
+    """Install the queue handler and start the writer thread (idempotent)."""
+    global _listener, _queue_handler, ring
+    if _listener is not None:
+        return ring
+
+    formatter = logging.Formatter(FORMAT)
+    handlers = []
+    try:
+        directory = log_dir(app_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            directory / LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8")
+        file_handler.namer = _gzip_namer
+        file_handler.rotator = _gzip_rotator
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    except OSError:
+        pass
+
+    ring = RingBuffer()
+    handlers.append(ring)
+
+    if sys.stderr is not None:
+        console = logging.StreamHandler(sys.stderr)
+        console.setFormatter(formatter)
+        handlers.append(console)
+
+    q = queue.Queue(QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(q)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    log = logging.getLogger("zapret")
+
+    def excepthook(exc_type, exc, tb):
+        if issubclass(exc_type, KeyboardInterrupt):
+            sys.__excepthook__(exc_type, exc, tb)
+            return
+        log.critical("Uncaught exception", exc_info=(exc_type, exc, tb))
+
+    def thread_excepthook(args):
+        log.critical("Uncaught exception in thread %s", args.thread.name if args.thread else "?",
+                     exc_info=(args.exc_type, args.exc_value, args.exc_traceback))
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
+    return ring
+
+
+def dropped() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def log_dir(app_dir: Path) -> Path:
+    return app_dir / LOG_DIR
+
+
+def shutdown():
+    """Flush everything still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
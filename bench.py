@@ -0,0 +1,787 @@
+"""
+Benchmarks for the non-GUI parts of Zapret GUI.
+
+    python bench.py            run everything
+    python bench.py lint       run one benchmark
+
+Each benchmark prints its own numbers; nothing here needs Qt or network.
+"""
+
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _random_domain(rnd):
+    label = "".join(rnd.choices(string.ascii_lowercase + string.digits, k=rnd.randint(3, 12)))
+    return f"{label}.{rnd.choice(['com', 'net', 'org', 'ru', 'io'])}"
+
+
+def _synthetic_list(path: Path, lines: int, seed: int = 1):
+    """Mostly valid domains with the usual junk mixed in."""
+    rnd = random.Random(seed)
+    junk = [
+        lambda d: f"https://{d}/path?q=1",
+        lambda d: f"{d}:443",
+        lambda d: f"*.{d}",
+        lambda d: f"  {d.upper()}  ",
+        lambda d: f"# comment about {d}",
+        lambda d: "",
+        lambda d: "bad_label.com",
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            d = _random_domain(rnd)
+            f.write((rnd.choice(junk)(d) if i % 10 == 0 else d) + "\n")
+
+
+def _measure(func):
+    """Time func, then run it again under tracemalloc for peak memory."""
+    t = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+@benchmark("lint")
+def bench_lint():
+    import listlint
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for lines in (100_000, 400_000):
+            src = Path(tmp) / f"in-{lines}.txt"
+            _synthetic_list(src, lines)
+            for label, stages in (
+                ("lint only", [listlint.normalize(), listlint.validate()]),
+                ("fix+sort+dedupe", listlint.default_stages(sort_entries=True, tmp_dir=tmp)),
+            ):
+                out = Path(tmp) / "out.txt"
+                report, elapsed, peak = _measure(lambda: listlint.lint_file(src, out, stages))
+                print(f"lint {label:16} {lines:>8} lines: {lines / elapsed:>10,.0f} lines/s, "
+                      f"peak {peak / 1e6:6.1f} MB, {report.invalid} invalid")
+
+
+@benchmark("tune")
+def bench_tune():
+    import tuner
+    from strategy import Strategy
+
+    base = Strategy.from_args("general", "--wf-tcp=80,443 --filter-tcp=443 --dpi-desync=fake "
+                                         "--dpi-desync-repeats=6")
+    effects = {("dpi-desync", "fake,multidisorder"): 0.45, ("dpi-desync-fooling", "badseq"): 0.25,
+               ("dpi-desync-split-pos", "midsld"): 0.1, ("dpi-desync-ttl", "4"): -0.3}
+    space = tuner.ParamSpace()
+    grid_trials = space.size() * 20
+    for seed in range(3):
+        prober = tuner.SimulatedProber(effects, base=0.15, seed=seed)
+        result, elapsed, _ = _measure(lambda: tuner.successive_halving(
+            base, space, prober, n_configs=81, min_trials=3, seed=seed))
+        p = prober.success_probability(result.strategy)
+        best_sampled = max(prober.success_probability(c.strategy) for c in result.rounds[0])
+        print(f"tune seed {seed}: {result.trials_used} probes (grid at 20/config: {grid_trials}), "
+              f"winner p={p:.2f}, best sampled p={best_sampled:.2f}, {elapsed * 1000:.0f} ms")
+
+
+@benchmark("supervisor")
+def bench_supervisor():
+    import supervisor
+
+    backend = supervisor.SubprocessBackend()
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = backend.spawn(supervisor.dummy_command(lifetime=30, busy=0.3), Path(tmp))
+        try:
+            time.sleep(0.3)
+            n = 2000
+            t = time.perf_counter()
+            for _ in range(n):
+                backend.sample(proc)
+            per_sample = (time.perf_counter() - t) / n
+        finally:
+            backend.terminate(proc)
+        print(f"supervisor sample: {per_sample * 1e6:.0f} us per sample "
+              f"({per_sample * 100:.4f}% of one core at 1 s interval)")
+
+        events = []
+        sup = supervisor.Supervisor(supervisor.dummy_command(lifetime=0.3), Path(tmp), interval=0.05,
+                                    backoff_initial=0.1, backoff_max=0.8, max_restarts=5,
+                                    on_event=lambda kind, info: events.append((time.monotonic(), kind)))
+        sup.start()
+        while sup.state != supervisor.FAILED:
+            time.sleep(0.05)
+        sup.stop()
+        gaps = [b[0] - a[0] for a, b in zip(events, events[1:])
+                if a[1] == supervisor.EXITED and b[1] == supervisor.STARTED]
+        print(f"supervisor restarts: {sup.restarts}, gaps exit->start "
+              f"{', '.join(f'{g * 1000:.0f}' for g in gaps)} ms (backoff 100 ms doubling)")
+
+
+@benchmark("pipe")
+def bench_pipe():
+    import shlex
+    import procout
+    import supervisor
+
+    lines = 300_000
+    script = (f"import sys\nw = sys.stdout.write\nfor i in range({lines}): "
+              f"w('winws: packet ' + str(i) + ' ' + 'x' * 60 + '\\n')")
+    argv = [sys.executable, "-c", script]
+    ring = procout.LineRing()
+    backend = supervisor.SubprocessBackend(capture_output=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        t = time.perf_counter()
+        proc = backend.spawn(shlex.join(argv) if sys.platform != "win32" else argv, Path(tmp))
+        reader = procout.PipeReader(proc.stdout, ring)
+        proc.wait()
+        child = time.perf_counter() - t
+        reader.join()
+        total = time.perf_counter() - t
+    print(f"pipe: {lines} lines, child done in {child:.2f} s, drained in {total:.2f} s "
+          f"({lines / total:,.0f} lines/s), kept {len(ring.lines)}, dropped {ring.dropped}")
+
+
+@benchmark("service")
+def bench_service():
+    import scm
+
+    def legacy_install(fake):
+        # The old ServiceManager sequence: sequential commands and two fixed 0.5 s sleeps
+        fake.stop(scm.SERVICE)
+        fake.kill(scm.WINWS)
+        time.sleep(0.5)
+        for name in [scm.SERVICE] + scm.DRIVERS:
+            fake.delete(name)
+        time.sleep(0.5)
+        fake.enable_tcp_timestamps()
+        fake.create(scm.SERVICE, "winws.exe", "zapret")
+        fake.describe(scm.SERVICE, scm.DESCRIPTION)
+        fake.start(scm.SERVICE)
+        fake.set_value(scm.REG_KEY, scm.REG_VALUE, "general")
+
+    for latency, transition in ((0.03, 0.15), (0.08, 0.5)):
+        label = f"cmd {latency * 1000:.0f} ms, transition {transition * 1000:.0f} ms"
+        fake = scm.FakeScm(latency, transition)
+        t = time.perf_counter()
+        legacy_install(fake)
+        legacy = time.perf_counter() - t
+        # Old flow returns before the service is up; wait for it to compare like for like
+        scm.wait_for(lambda: fake.query(scm.SERVICE) == scm.RUNNING, 10)
+        legacy_ready = time.perf_counter() - t
+
+        fake = scm.FakeScm(latency, transition)
+        t = time.perf_counter()
+        ok, _ = scm.install(fake, "winws.exe --a", "general")
+        fresh = time.perf_counter() - t
+        t = time.perf_counter()
+        ok2, _ = scm.install(fake, "winws.exe --b", "general (ALT)")
+        switch = time.perf_counter() - t
+        print(f"service [{label}]: legacy {legacy * 1000:.0f} ms (running after {legacy_ready * 1000:.0f} ms), "
+              f"new install {fresh * 1000:.0f} ms, switch {switch * 1000:.0f} ms, ok={ok and ok2}")
+
+    fake = scm.FakeScm()
+    scm.install(fake, "winws.exe --old", "general")
+    fake.fail_starts = 1
+    ok, msg = scm.install(fake, "winws.exe --new", "broken")
+    config = fake.config(scm.SERVICE)
+    print(f"service rollback: ok={ok}, '{msg}', binpath after rollback: {config and config['binpath']}, "
+          f"state {fake.query(scm.SERVICE)}")
+
+
+@benchmark("switch")
+def bench_switch():
+    import procout
+    import strategy
+    import supervisor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "bin").mkdir()
+        (root / "bin" / "winws.exe").write_bytes(b"MZ")
+        (root / "bin" / "quic.bin").write_bytes(bytes(1200))
+        (root / "lists").mkdir()
+        _synthetic_list(root / "lists" / "list-general.txt", 200_000)
+        bat = root / "general.bat"
+        bat.write_text('start "zapret" /min "%BIN%winws.exe" --wf-tcp=80,443 --wf-udp=443 ^\n'
+                       '--filter-udp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake '
+                       '--dpi-desync-fake-quic="%BIN%quic.bin" --new ^\n'
+                       '--filter-tcp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=split2\n',
+                       encoding="utf-8")
+        t = time.perf_counter()
+        prepared = strategy.prepare(bat, root)
+        print(f"switch prepare: {(time.perf_counter() - t) * 1000:.1f} ms, ok={prepared.ok}, "
+              f"{len(prepared.files)} files checked")
+
+        # winws stand-in that needs 50 ms to open WinDivert
+        cmdline = supervisor.dummy_command(startup=0.05)
+        runs = 5
+
+        def ready_after(ring, seq, t0):
+            while not any(supervisor.READY_MARKER in text for _, _, text in ring.since(seq)):
+                time.sleep(0.005)
+            return time.monotonic() - t0
+
+        # Old flow: kill, fixed 0.5 s sleep, start again
+        ring = procout.LineRing()
+        backend = supervisor.SubprocessBackend(capture_output=True)
+        proc = backend.spawn(cmdline, root)
+        procout.PipeReader(proc.stdout, ring)
+        legacy = []
+        for _ in range(runs):
+            seq = ring.seq
+            t0 = time.monotonic()
+            backend.terminate(proc)
+            time.sleep(0.5)
+            proc = backend.spawn(cmdline, root)
+            procout.PipeReader(proc.stdout, ring)
+            legacy.append(ready_after(ring, seq, t0))
+        backend.terminate(proc)
+
+        sup = supervisor.Supervisor(cmdline, root, output=procout.LineRing())
+        gaps = [sup.switch(cmdline) for _ in range(runs + 1)][1:]
+        sup.stop()
+    print(f"switch gap: legacy {min(legacy) * 1000:.0f}-{max(legacy) * 1000:.0f} ms, "
+          f"hot switch {min(gaps) * 1000:.0f}-{max(gaps) * 1000:.0f} ms "
+          f"(includes the stand-in's 50 ms startup)")
+
+
+@benchmark("unpack")
+def bench_unpack():
+    import shutil
+    import zipfile
+    import unpack
+
+    rnd = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        archive = root / "app.zip"
+        # Shaped like a PyInstaller onedir build: thousands of small files, a few big DLLs
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+            for i in range(4000):
+                size = rnd.choice([300, 2_000, 8_000, 30_000])
+                z.writestr(f"_internal/pkg{i % 40}/mod{i}.pyc", rnd.randbytes(size // 2) + bytes(size // 2))
+            for i in range(6):
+                z.writestr(f"_internal/Qt6Lib{i}.dll", rnd.randbytes(4_000_000) + bytes(4_000_000))
+            z.writestr("ZapretGUI.exe", rnd.randbytes(2_000_000))
+        manifest = unpack.build_manifest(archive)
+        size = sum(i.file_size for i in zipfile.ZipFile(archive).infolist())
+
+        def legacy():
+            out = root / "legacy"
+            calls = 0
+            with zipfile.ZipFile(archive) as z:
+                for info in z.infolist():
+                    z.extract(info, out)
+                    calls += 1  # one progress signal per entry
+            shutil.rmtree(out)
+            return calls
+
+        t = time.perf_counter()
+        calls = legacy()
+        print(f"unpack {len(manifest)} files, {size / 1e6:.0f} MB: legacy {time.perf_counter() - t:.2f} s, "
+              f"{calls} progress signals")
+        for workers in (1, 4):
+            out = root / f"new{workers}"
+            stats = unpack.extract(archive, out, lambda done, total, name: None, manifest, workers=workers)
+            shutil.rmtree(out)
+            print(f"unpack workers={workers}: {stats['seconds']:.2f} s with CRC + SHA-256, "
+                  f"{stats['progress_calls']} progress calls")
+
+        # A flipped byte in the stored data must be caught
+        bad = root / "bad.zip"
+        with zipfile.ZipFile(bad, "w", zipfile.ZIP_STORED) as z:
+            z.writestr("a.bin", b"x" * 100_000)
+        data = bytearray(bad.read_bytes())
+        data[50_000] ^= 1
+        bad.write_bytes(bytes(data))
+        try:
+            unpack.extract(bad, root / "bad")
+            print("unpack corrupt entry: NOT detected")
+        except unpack.VerifyError as e:
+            print(f"unpack corrupt entry: detected ({e})")
+
+
+@benchmark("reinstall")
+def bench_reinstall():
+    import json
+    import shutil
+    import zipfile
+    import unpack
+
+    rnd = random.Random(4)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = {f"_internal/pkg{i % 40}/mod{i}.pyc": rnd.randbytes(rnd.choice([300, 2_000, 8_000, 30_000]))
+                 for i in range(4000)}
+        files.update({f"_internal/Qt6Lib{i}.dll": rnd.randbytes(4_000_000) for i in range(6)})
+        files["ZapretGUI.exe"] = rnd.randbytes(2_000_000)
+
+        def build(path, contents):
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+                for name, data in contents.items():
+                    z.writestr(name, data)
+
+        v1, v2 = root / "v1.zip", root / "v2.zip"
+        build(v1, files)
+        upgraded = dict(files)
+        upgraded["ZapretGUI.exe"] = rnd.randbytes(2_000_000)
+        del upgraded["_internal/pkg0/mod0.pyc"]
+        build(v2, upgraded)
+        app = root / "app"
+
+        t = time.perf_counter()
+        shutil.rmtree(app, ignore_errors=True)
+        unpack.extract(v2, app, workers=1)
+        legacy = time.perf_counter() - t
+        shutil.rmtree(app)
+
+        first = unpack.install(v1, app, workers=1)
+        (app / "logs").mkdir()
+        (app / "logs" / "zapret_gui.log").write_text("keep me")
+        same = unpack.install(v1, app, workers=1)
+        upgrade = unpack.install(v2, app, workers=1)
+        print(f"reinstall {first['files']} files: legacy rmtree + extract {legacy:.2f} s, "
+              f"first install {first['seconds']:.2f} s")
+        print(f"reinstall unchanged: {same['seconds'] * 1000:.0f} ms, {same['changed']} written")
+        print(f"reinstall upgrade: {upgrade['seconds'] * 1000:.0f} ms, {upgrade['changed']} written "
+              f"({upgrade['bytes_written'] / 1e6:.1f} MB), {upgrade['deleted']} deleted, "
+              f"user log kept: {(app / 'logs' / 'zapret_gui.log').exists()}")
+
+        # Interrupted commit: journal written, only some files moved
+        (app / "ZapretGUI.exe").write_bytes(b"old")
+        journal = {"moves": ["ZapretGUI.exe"], "delete": [], "records": {
+            "ZapretGUI.exe": {"size": len(upgraded["ZapretGUI.exe"]), "crc": 0, "mtime_ns": 0}}}
+        (app / unpack.STAGING_DIR).mkdir()
+        (app / unpack.STAGING_DIR / "ZapretGUI.exe").write_bytes(upgraded["ZapretGUI.exe"])
+        (app / unpack.JOURNAL).write_text(json.dumps(journal))
+        again = unpack.install(v2, app, workers=1)
+        print(f"reinstall after interrupted commit: recovered={again['recovered']}, "
+              f"exe correct: {(app / 'ZapretGUI.exe').read_bytes() == upgraded['ZapretGUI.exe']}")
+
+
+@benchmark("scan")
+def bench_scan():
+    import scancache
+    import strategy
+    from watcher import STRATEGY, ZapretWatcher, _matches
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        body = ('start "zapret" /min "%BIN%winws.exe" --wf-tcp=80,443 --wf-udp=443 ^\n'
+                '--filter-udp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake --new ^\n'
+                '--filter-tcp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=split2\n')
+        for i in range(40):
+            (root / f"general ({i}).bat").write_text(body, encoding="utf-8")
+        for name in ("service.bat", "start.bat"):
+            (root / name).write_text("@echo off\n")
+        runs = 50
+
+        def legacy():
+            watcher = ZapretWatcher(root)
+            watcher.scan()
+            names = watcher.strategies()
+            return [strategy.Strategy.from_file(root / n).summary() for n in names]
+
+        def cached(cache):
+            return [cache.meta(root / n)["summary"]
+                    for n in cache.names(root, lambda n: _matches(STRATEGY, n))]
+
+        t = time.perf_counter()
+        for _ in range(runs):
+            expected = legacy()
+        legacy_ms = (time.perf_counter() - t) / runs * 1000
+
+        cache = scancache.ScanCache()
+        t = time.perf_counter()
+        cached(cache)
+        cold_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        for _ in range(runs):
+            result = cached(cache)
+        warm_ms = (time.perf_counter() - t) / runs * 1000
+
+        saved = root / scancache.FILE
+        cache.save(saved)
+        t = time.perf_counter()
+        reloaded = cached(scancache.ScanCache.load(saved))
+        reload_ms = (time.perf_counter() - t) * 1000
+
+        edited = root / "general (0).bat"
+        time.sleep(0.01)
+        edited.write_text(body.replace("split2", "disorder2"), encoding="utf-8")
+        fresh = cache.meta(edited)["summary"]
+    print(f"scan 40 strategies: rescan + parse {legacy_ms:.2f} ms, cache cold {cold_ms:.2f} ms, "
+          f"warm {warm_ms:.3f} ms, after reload from disk {reload_ms:.2f} ms")
+    print(f"scan results equal: {result == expected == reloaded}, edit picked up: {'disorder2' in fresh}")
+
+
+@benchmark("history")
+def bench_history():
+    import history
+
+    rnd = random.Random(5)
+    domains = ["discord.com", "www.youtube.com", "i.ytimg.com", "gateway.discord.gg"]
+    strategies = ["general", "general (ALT)", "general (FAKE TLS)"]
+    days = 180
+    now = time.time() // history.DAY * history.DAY + 12 * 3600
+    start = now - days * history.DAY
+    rows = []
+    ts = start
+    while ts < now:
+        strat = strategies[int((ts - start) // (30 * history.DAY)) % len(strategies)]
+        for d in domains:
+            ok = rnd.random() < 0.93
+            rows.append((ts + rnd.random(), "check", d, strat, "1.8.5", int(ok), rnd.uniform(2, 30),
+                         rnd.lognormvariate(5, 0.4) if ok else None, 200 if ok else None, None))
+        ts += 300
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = history.History(Path(tmp) / history.FILE, history.Retention(raw_days=None))
+        t = time.perf_counter()
+        for i in range(0, len(rows), 1000):
+            store.record_many(rows[i:i + 1000])
+        insert = time.perf_counter() - t
+        t = time.perf_counter()
+        written = store.rollup(now)
+        rollup = time.perf_counter() - t
+
+        domain = "www.youtube.com"
+        t = time.perf_counter()
+        raw = store._db.execute("SELECT ts, domain, strategy, ok, https_ms FROM probes "
+                                "WHERE domain = ? AND ts >= ?", (domain, start)).fetchall()
+        scanned = history._aggregate(raw, history.DAY)
+        raw_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        daily = store.series(domain, history.DAY, start, now)
+        daily_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        hourly = store.series(domain, history.HOUR, now - 30 * history.DAY, now)
+        hourly_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        per_strategy = store.summary(domain, start, now)
+        summary_ms = (time.perf_counter() - t) * 1000
+        same = [b["p90"] for b in daily] == [v["p90"] for (b, _, s), v in sorted(scanned.items()) if s == "*"]
+
+        store.retention = history.Retention(raw_days=30, hourly_days=90)
+        t = time.perf_counter()
+        pruned = store.prune(now)
+        prune_ms = (time.perf_counter() - t) * 1000
+        after = store.series(domain, history.DAY, start, now)
+        store.close()
+    print(f"history {len(rows)} probes over {days} days: insert {insert:.2f} s "
+          f"({len(rows) / insert:.0f}/s), rollup {rollup:.2f} s -> {written} rollup rows")
+    print(f"history {domain}: raw scan + aggregate {raw_ms:.0f} ms, daily series {daily_ms:.1f} ms "
+          f"({len(daily)} days, same percentiles: {same}), hourly 30 days {hourly_ms:.1f} ms "
+          f"({len(hourly)} h), per-strategy summary {summary_ms:.1f} ms ({len(per_strategy)} strategies)")
+    print(f"history prune to 30 days raw / 90 days hourly: {prune_ms:.0f} ms, {pruned}, "
+          f"daily series intact: {after == daily}")
+
+
+@benchmark("health")
+def bench_health():
+    import health
+
+    rates = {"general": 0.97, "general (ALT)": 0.9, "general (FAKE TLS)": 0.2, "general (ALT2)": 0.85}
+    ranked = ["general", "general (FAKE TLS)", "general (ALT)", "general (ALT2)"]
+    rounds_per_day = 24 * 12  # every 5 minutes
+    net = health.SimulatedNetwork(rates, "general", seed=3)
+    monitor = health.HealthMonitor(net.check, net.launch, net.current, lambda: ranked)
+
+    timeline = []
+    t = time.perf_counter()
+    for i in range(7 * rounds_per_day):
+        if i == 2 * rounds_per_day:
+            net.rates["general"] = 0.05        # provider changes its DPI
+        if 3 * rounds_per_day <= i < 3 * rounds_per_day + 24:
+            net.offline = True                 # two hours without network
+        else:
+            net.offline = False
+        if i == 5 * rounds_per_day:
+            net.rates = {name: 0.02 for name in rates}  # nothing works any more
+        monitor.run_round()
+        timeline.append((i, net.active, net.rates.get(net.active, 0)))
+    elapsed = time.perf_counter() - t
+
+    broken_at = 2 * rounds_per_day
+    fixed_at = next(i for i, active, rate in timeline if i > broken_at and rate > 0.5)
+    kinds = [kind for kind, _ in monitor.log]
+    print(f"health 7 days at 5 min: {net.checks} checks ({net.checks / (7 * 24):.0f}/h), "
+          f"{elapsed / len(timeline) * 1e6:.0f} us per round of monitor overhead")
+    print(f"health DPI change: working strategy again after {(fixed_at - broken_at) * 5} min "
+          f"(without the monitor: until someone notices), {net.switches} switches")
+    print("health events: " + ", ".join(f"{k} x{kinds.count(k)}" for k in dict.fromkeys(kinds)))
+    for kind, info in list(monitor.log)[:6]:
+        print(f"  {health.describe(kind, info)}")
+
+
+@benchmark("necessity")
+def bench_necessity():
+    import necessity
+
+    rnd = random.Random(6)
+    domains = sorted({_random_domain(rnd) for _ in range(2000)})
+    domains += ["www.youtube.com", "rr1.googlevideo.com", "discord.com"]
+    blocked = set(rnd.sample(domains, 300)) | {"www.youtube.com", "rr1.googlevideo.com"}
+    unfixable = set(rnd.sample(sorted(blocked), 30))
+    dead = set(rnd.sample(domains, 60))
+    net = necessity.SimulatedNetwork(blocked, unfixable, dead, latency=0.05, loss=0.02, seed=6)
+    lines = ["# test list"] + [d.upper() if i % 50 == 0 else d for i, d in enumerate(domains)]
+
+    workers, rate = 64, 800.0
+    report = necessity.analyze(necessity.list_domains(lines), net.check, net.set_bypass,
+                               workers=workers, rate=rate)
+    truth = {}
+    for d in domains:
+        if d in dead or d in unfixable:
+            truth[d] = necessity.NOT_FIXED
+        elif d in blocked:
+            truth[d] = necessity.FIXED
+        else:
+            truth[d] = necessity.NEVER_BLOCKED
+    wrong = sum(report.classes[d] != truth[d] for d in domains)
+    prune = report.prune_set()
+    kept, removed = necessity.prune_lines(lines, prune)
+    print(f"necessity {len(domains)} domains: {report.seconds:.1f} s with {workers} workers at "
+          f"{rate:.0f}/s (peak {net.peak} in flight), {report.checks} checks; one at a time "
+          f"would take {report.checks * net.latency:.0f} s")
+    print(f"necessity {report.counts()}, misclassified {wrong} (2% simulated loss, 2 attempts), "
+          f"bypass toggled {net.toggles} times")
+    print(f"necessity prune: {len(prune)} entries, {removed} lines removed, "
+          f"protected kept: {'discord.com' in kept}, list {len(lines)} -> {len(kept)} lines")
+
+
+@benchmark("extract")
+def bench_extract():
+    import json
+    import subprocess
+    import importers
+
+    rnd = random.Random(7)
+    hosts = [_random_domain(rnd) for _ in range(400)] + ["rr3---sn-abc.googlevideo.com", "i.ytimg.com"]
+    body = json.dumps({"items": [{"url": f"https://{rnd.choice(hosts)}/x"} for _ in range(200)]})
+    with tempfile.TemporaryDirectory() as tmp:
+        har = Path(tmp) / "capture.har"
+        with open(har, "w", encoding="utf-8") as f:
+            f.write('{"log": {"version": "1.2", "creator": {"name": "bench"}, "entries": [')
+            for i in range(6000):
+                host = hosts[min(int(rnd.expovariate(0.02)), len(hosts) - 1)]
+                entry = {"request": {"method": "GET", "url": f"https://{host}/p/{i}?q=\u0026",
+                                     "headers": [{"name": "Host", "value": host}]},
+                         "response": {"status": 200, "redirectURL": "",
+                                      "content": {"size": 9000, "text": body + rnd.randbytes(6000).hex()}}}
+                f.write(("," if i else "") + json.dumps(entry))
+            f.write("]}}")
+        log = Path(tmp) / "pihole.log"
+        with open(log, "w", encoding="utf-8") as f:
+            for i in range(300_000):
+                host = hosts[min(int(rnd.expovariate(0.01)), len(hosts) - 1)]
+                f.write(f"Jan  1 00:00:{i % 60:02d} dnsmasq[123]: query[A] {host} from 192.168.1.{i % 50}\n"
+                        f"Jan  1 00:00:{i % 60:02d} dnsmasq[123]: forwarded {host} to 1.1.1.1\n")
+
+        def peak_mb(code):
+            out = subprocess.run([sys.executable, "-c", code + "\nimport resource\n"
+                                  "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"],
+                                 cwd=str(Path(__file__).parent), capture_output=True, text=True)
+            return int(out.stdout.split()[-1]) / 1024
+
+        base = peak_mb("import importers")
+        stream_mb = peak_mb(f"import importers; importers.rank(r'{har}')") - base
+        load_mb = peak_mb(f"import json; json.load(open(r'{har}', encoding='utf-8'))") - base
+
+        t = time.perf_counter()
+        json.load(open(har, encoding="utf-8"))
+        load_s = time.perf_counter() - t
+        ranking = importers.rank(har)
+        dns = importers.rank(log)
+        size = har.stat().st_size / 2**20
+    print(f"extract HAR {size:.0f} MB: streaming {ranking.seconds:.2f} s, +{stream_mb:.0f} MB peak; "
+          f"json.load {load_s:.2f} s, +{load_mb:.0f} MB peak (and no hostnames yet)")
+    print(f"extract {ranking.summary()}; top: {ranking.top(3)}")
+    print(f"extract {dns.summary()} ({dns.seen / dns.seconds / 1e6:.1f}M queries/s)")
+
+
+@benchmark("import")
+def bench_import():
+    import gzip
+    import zipfile
+    import importers
+    import listlint
+
+    rnd = random.Random(9)
+    hosts = [_random_domain(rnd) for _ in range(200_000)]
+    writers = {
+        "adblock": lambda h, i: f"||{h}^" + ("$third-party" if i % 7 == 0 else "")
+                                + ("\n@@||" + h + "^\n" + h + "##.ad" if i % 50 == 0 else ""),
+        "hosts": lambda h, i: f"0.0.0.0 {h}" + (" # tracker" if i % 10 == 0 else ""),
+        "dnsmasq": lambda h, i: f"server=/{h}/77.88.8.8" if i % 3 else f"ipset=/{h}/www.{h}/unblock",
+        "csv": lambda h, i: f'{i};"https://{h}/path";{rnd.randint(1, 9)}',
+        "plain": lambda h, i: h if i % 20 else f"https://{h.upper()}/x",
+    }
+    headers = {"adblock": "[Adblock Plus 2.0]\n! Title: bench", "hosts": "127.0.0.1 localhost",
+               "dnsmasq": "# bench", "csv": "rank;url;score", "plain": "# bench"}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write in writers.items():
+            path = Path(tmp) / f"{name}.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(headers[name] + "\n")
+                for i, h in enumerate(hosts):
+                    f.write(write(h, i) + "\n")
+            sources = [path, Path(tmp) / f"{name}.txt.gz"]
+            with open(path, "rb") as src, gzip.open(sources[1], "wb", compresslevel=6) as dst:
+                dst.write(src.read())
+            if name == "hosts":
+                sources.append(Path(tmp) / "hosts.zip")
+                with zipfile.ZipFile(sources[2], "w", zipfile.ZIP_DEFLATED) as z:
+                    z.write(path, "hosts")
+            for source in sources:
+                kind = importers.sniff(source)
+                stats = importers.Stats(kind)
+                entries = sum(1 for _ in importers.parse(source, None, stats))
+                print(f"import {source.name:16} -> {stats.summary()}, "
+                      f"{stats.seen / stats.seconds / 1e3:,.0f}k entries/s")
+                assert kind == name and entries == stats.entries
+            if name == "hosts":
+                tracemalloc.start()
+                for _ in importers.parse(sources[2]):
+                    pass
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+                print(f"import hosts.zip peak {peak:.1f} MB for {path.stat().st_size / 2**20:.1f} MB unpacked")
+                # What the old whole-line import made of a hosts file
+                old = list(listlint.run(path, [listlint.normalize(), listlint.validate(),
+                                               listlint.drop_invalid(), listlint.strip_comments()]))
+                print(f"import hosts as whole lines: {len(old)} entries, {len(set(old))} distinct "
+                      f"({old[:2]})")
+
+
+@benchmark("subscriptions")
+def bench_subscriptions():
+    import gzip
+    import hashlib
+    import threading
+    from email.utils import formatdate
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import subscriptions
+
+    rnd = random.Random(11)
+    pool = [_random_domain(rnd) for _ in range(60_000)]
+    a = set(pool[:30_000])                 # AdBlock, gzip, ETag
+    b = set(pool[25_000:50_000])           # hosts, Last-Modified only; 5000 shared with a
+    user = set(pool[29_000:29_500]) | set(pool[50_000:50_500])
+    docs = {}
+    log = []
+
+    def publish(name, body, etag=True):
+        docs[name] = {"body": body, "etag": f'"{hashlib.md5(body).hexdigest()}"' if etag else None,
+                      "modified": formatdate(time.time() + len(log), usegmt=True)}
+
+    def publish_a():
+        publish("/a.txt.gz", gzip.compress(("! adblock\n" + "".join(f"||{h}^\n" for h in sorted(a))).encode()))
+
+    def publish_b():
+        publish("/hosts", "".join(f"0.0.0.0 {h}\n" for h in sorted(b)).encode(), etag=False)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            doc = docs[self.path]
+            unchanged = (doc["etag"] and self.headers.get("If-None-Match") == doc["etag"]) or \
+                        (not doc["etag"] and self.headers.get("If-Modified-Since") == doc["modified"])
+            self.send_response(304 if unchanged else 200)
+            if doc["etag"]:
+                self.send_header("ETag", doc["etag"])
+            self.send_header("Last-Modified", doc["modified"])
+            self.send_header("Content-Length", "0" if unchanged else str(len(doc["body"])))
+            self.end_headers()
+            if not unchanged:
+                self.wfile.write(doc["body"])
+            log.append((self.path, 304 if unchanged else 200, 0 if unchanged else len(doc["body"])))
+
+        def log_message(self, *args):
+            pass
+
+    publish_a()
+    publish_b()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def step(label, action):
+        del log[:]
+        t = time.perf_counter()
+        result = action()
+        ms = (time.perf_counter() - t) * 1000
+        codes = ", ".join(f"{p} {c} ({n / 1024:.0f} KB)" for p, c, n in log)
+        print(f"subscriptions {label:22} {ms:7.0f} ms  {codes or '-'}  {result}")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            lists_dir = Path(tmp) / "lists"
+            lists_dir.mkdir()
+            target = lists_dir / "list-general.txt"
+            target.write_text("# my list\n" + "\n".join(sorted(user)) + "\n", encoding="utf-8")
+            subs = subscriptions.Subscriptions(Path(tmp) / "subs", lists_dir)
+            sa = subs.add("list-general.txt", base + "/a.txt.gz")["id"]
+            sb = subs.add("list-general.txt", base + "/hosts")["id"]
+
+            def entries():
+                return {l for l in target.read_text(encoding="utf-8").splitlines() if l and not l.startswith("#")}
+
+            step("first fetch", subs.refresh)
+            assert entries() == a | b | user
+            mtime = target.stat().st_mtime_ns
+            step("unchanged", lambda: subs.refresh(force=False, now=time.time() + subs.interval))
+            assert target.stat().st_mtime_ns == mtime
+            dropped = set(rnd.sample(sorted(a - b - user), 200))
+            a.difference_update(dropped)
+            a.update(pool[50_000:50_100] + pool[55_000:55_100])
+            publish_a()
+            step("a changed", lambda: subs.refresh(now=time.time() + 2 * subs.interval))
+            assert entries() == a | b | user and not entries() & dropped
+            deleted = sorted(b - a - user)[0]
+            target.write_text(target.read_text(encoding="utf-8").replace(f"\n{deleted}\n", "\n"), encoding="utf-8")
+            step("hand-deleted, merge", lambda: subs.merge("list-general.txt"))
+            assert deleted not in entries()
+            print(f"subscriptions origin of {sorted(a & b)[0]}: {len(subs.origin('list-general.txt', sorted(a & b)[0]))} "
+                  f"sources; of a user entry: {subs.origin('list-general.txt', sorted(user)[0])}")
+            before = entries()
+            step("unsubscribe a", lambda: subs.remove(sa))
+            after = entries()
+            assert before - after == a - b - user and after == (b | user) - {deleted}
+            print(f"subscriptions unsubscribe removed {len(before - after)} = a only ({len(a - b - user)}); "
+                  f"kept {len(a & b)} shared with b and {len(a & user)} the user had")
+            target.write_text("# my list\n" + "\n".join(sorted(user)) + "\n", encoding="utf-8")
+            step("list replaced (update)", lambda: subs.refresh(now=time.time() + 4 * subs.interval))
+            assert entries() == b | user
+            subs.remove(sb)
+            assert entries() == user
+    finally:
+        server.shutdown()
+
+
+def main(argv):
+    names = argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"unknown benchmark: {name} (available: {', '.join(BENCHMARKS)})")
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -11,6 +11,7 @@ if exist "build" rd /s /q "build"
 if exist "dist" rd /s /q "dist"
 if exist "release" rd /s /q "release"
 if exist "app.zip" del "app.zip"
+if exist "app.manifest.json" del "app.manifest.json"
 
 :: 2. Build Main Application (Onedir)
 echo.
@@ -23,6 +24,8 @@ echo.
 echo [3/5] Compressing Application...
 powershell -Command "Compress-Archive -Path 'dist\ZapretGUI\*' -DestinationPath 'app.zip' -Force"
 if errorlevel 1 goto error
+python unpack.py manifest app.zip
+if errorlevel 1 goto error
 
 :: 4. Build Installer
 echo.
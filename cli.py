@@ -0,0 +1,470 @@
+"""
+Zapret GUI - headless command line.
+
+Uses the same Installer/ServiceManager/list code as the GUI without
+importing PyQt6 or qfluentwidgets, so it starts fast enough for scripts.
+Every command prints a JSON document to stdout; the exit code is 0 on
+success and 1 on failure.
+
+    python cli.py status
+    python cli.py strategies
+    python cli.py run "general (ALT)"
+    python cli.py install-service general
+    python cli.py lists compact list-general.txt [--sort]
+    python cli.py lists import list-general.txt other.txt
+    python cli.py lists diff list-general.txt other.txt [--show added]
+    python cli.py lists subscribe list-general.txt https://example.org/list.txt
+    python cli.py lists refresh [--force]
+    python cli.py test discord.com
+    python cli.py update [--install]
+    python cli.py search discord --mode suffix
+    python cli.py watch [status fs]
+    python cli.py metrics [--prometheus]
+    python cli.py ports general
+
+When the GUI is running, status, strategies and search are answered by it
+over the local control connection (see ipc.py), reusing its caches and
+search index; --no-daemon forces the direct path. A GUI running as
+administrator can't be reached from a non-elevated prompt: those commands
+then take the direct path on their own, while watch and metrics, which only
+the GUI can answer, need an elevated prompt too.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from core import (get_zapret_dir, get_app_dir, is_admin, check_domain,
+                  Installer, ServiceManager)
+
+
+NO_DAEMON = "Zapret GUI is not running (or runs as administrator: use an elevated prompt)"
+
+
+class CliError(Exception):
+    pass
+
+
+def _daemon(args):
+    if args.no_daemon:
+        return None
+    from ipc import ControlClient
+    return ControlClient.connect(get_app_dir())
+
+
+def _strategy_path(zapret_dir: Path, name: str) -> Path:
+    path = zapret_dir / (name if name.lower().endswith(".bat") else f"{name}.bat")
+    if not path.exists():
+        raise CliError(f"strategy not found: {path.name}")
+    return path
+
+
+def _list_path(zapret_dir: Path, name: str) -> Path:
+    path = Path(name)
+    if not path.is_absolute() and not path.exists():
+        path = zapret_dir / "lists" / name
+    if not path.exists():
+        raise CliError(f"list not found: {name}")
+    return path
+
+
+def cmd_status(args, zapret_dir):
+    client = _daemon(args)
+    if client:
+        try:
+            return dict(client.call("status"), source="daemon")
+        finally:
+            client.close()
+    installer = Installer()
+    return {
+        "installed": installer.check_installed(),
+        "version": installer.get_local_version(),
+        "admin": bool(is_admin()),
+        "status": ServiceManager.status_json(ServiceManager.get_status()),
+    }
+
+
+def cmd_strategies(args, zapret_dir):
+    from scancache import FILE, ScanCache
+    from watcher import STRATEGY, _matches
+
+    cache_file = get_app_dir() / FILE
+    cache = ScanCache.load(cache_file)
+    client = _daemon(args)
+    if client:
+        try:
+            names = client.call("strategies")
+        finally:
+            client.close()
+    else:
+        names = cache.names(zapret_dir, lambda n: _matches(STRATEGY, n))
+    result = []
+    for name in names:
+        entry = {"name": name[:-4], "file": name}
+        meta = cache.meta(zapret_dir / name)
+        if meta is None:
+            entry["error"] = "файл не найден"
+        elif "summary" in meta:
+            entry["summary"] = meta["summary"]
+        else:
+            entry["error"] = meta.get("error", "")
+        result.append(entry)
+    cache.save(cache_file)
+    return {"strategies": result}
+
+
+def cmd_run(args, zapret_dir):
+    path = _strategy_path(zapret_dir, args.name)
+    subprocess.Popen(str(path), cwd=str(zapret_dir), shell=True,
+                     creationflags=getattr(subprocess, "CREATE_NEW_CONSOLE", 0))
+    return {"started": path.name}
+
+
+def cmd_install_service(args, zapret_dir):
+    path = _strategy_path(zapret_dir, args.name)
+    ok, msg = ServiceManager.install_service(path, zapret_dir)
+    if not ok:
+        raise CliError(msg)
+    return {"installed": path.name, "message": msg}
+
+
+def _snapshot(zapret_dir, reason):
+    from snapshots import SnapshotStore
+    try:
+        SnapshotStore(get_app_dir() / "lists_backup").snapshot(zapret_dir / "lists", reason)
+    except Exception as e:
+        print(f"Snapshot error: {e}", file=sys.stderr)
+
+
+def cmd_lists_compact(args, zapret_dir):
+    import listlint
+
+    path = _list_path(zapret_dir, args.file)
+    stages = listlint.default_stages(sort_entries=args.sort, keep_comments=not args.strip_comments)
+    if args.dry_run:
+        report = listlint.lint(path, stages)
+    else:
+        _snapshot(zapret_dir, f"cli compact {path.name}")
+        report = listlint.lint_file(path, stages=stages)
+    return {"file": str(path), "lines_in": report.lines_in, "lines_out": report.lines_out,
+            "entries": report.entries_out, "invalid": report.invalid, "issues": report.issues,
+            "written": not args.dry_run}
+
+
+def cmd_lists_import(args, zapret_dir):
+    import importers
+    import listdiff
+
+    path = _list_path(zapret_dir, args.file)
+    kind = args.format or importers.sniff(args.source)
+    if kind not in importers.FORMATS:
+        raise CliError(f"unknown format: {kind} (available: {', '.join(importers.FORMATS)})")
+    if importers.FORMATS[kind].ranked:
+        # HAR captures, DNS logs: hostnames by frequency
+        stats = importers.rank(args.source, kind)
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            hosts = importers.new_hosts(stats, f, args.min_count)
+        to_add = [h for h, _ in hosts[:args.top]]
+    else:
+        stats = importers.Stats(kind)
+        to_add = list(listdiff.new_entries(path, importers.parse(args.source, kind, stats)))
+    if to_add and not args.dry_run:
+        _snapshot(zapret_dir, f"cli import {path.name}")
+        text = path.read_text(encoding="utf-8", errors="ignore").rstrip()
+        path.write_text(text + "\n" + "\n".join(to_add) + "\n", encoding="utf-8")
+    return {"file": str(path), "format": kind, "compression": stats.compression, "added": len(to_add),
+            "skipped_invalid": stats.skipped, "mb_per_s": round(stats.mb_per_s(), 1),
+            "written": bool(to_add) and not args.dry_run}
+
+
+def cmd_lists_diff(args, zapret_dir):
+    import listdiff
+
+    old = _list_path(zapret_dir, args.old)
+    new = _list_path(zapret_dir, args.new)
+    result = listdiff.diff(old, new)
+    try:
+        out = {"old": str(old), "new": str(new), "counts": result.counts()}
+        for view in args.show or []:
+            out[view] = list(result[view])
+        return out
+    finally:
+        result.close()
+
+
+def _subscriptions(zapret_dir):
+    import subscriptions
+    return subscriptions.Subscriptions(get_app_dir() / subscriptions.DIR, zapret_dir / "lists",
+                                       before_write=lambda reason: _snapshot(zapret_dir, reason))
+
+
+def _find_subscription(subs, key):
+    found = [s for s in subs.subscriptions() if key in (s["id"], s["url"])]
+    if not found:
+        raise CliError(f"subscription not found: {key}")
+    if len(found) > 1:
+        raise CliError(f"{key} is subscribed by several lists, use the id: {', '.join(s['id'] for s in found)}")
+    return found[0]
+
+
+def cmd_lists_subscribe(args, zapret_dir):
+    subs = _subscriptions(zapret_dir)
+    path = _list_path(zapret_dir, args.file)
+    try:
+        sub = subs.add(path.name, args.url, args.format)
+    except ValueError as e:
+        raise CliError(str(e))
+    merged = subs.refresh([sub["id"]], force=True)
+    sub = _find_subscription(subs, sub["id"])
+    if sub["error"]:
+        raise CliError(f"{sub['url']}: {sub['error']}")
+    return {"subscription": sub, "merged": merged}
+
+
+def cmd_lists_unsubscribe(args, zapret_dir):
+    subs = _subscriptions(zapret_dir)
+    return subs.remove(_find_subscription(subs, args.subscription)["id"])
+
+
+def cmd_lists_subscriptions(args, zapret_dir):
+    subs = _subscriptions(zapret_dir)
+    return {"subscriptions": subs.subscriptions(Path(args.file).name if args.file else None)}
+
+
+def cmd_lists_refresh(args, zapret_dir):
+    subs = _subscriptions(zapret_dir)
+    merged = subs.refresh(force=args.force)
+    return {"merged": merged, "errors": {s["url"]: s["error"] for s in subs.subscriptions() if s["error"]}}
+
+
+def _history():
+    import history
+    try:
+        return history.History(get_app_dir() / history.FILE)
+    except Exception:
+        return None
+
+
+def cmd_test(args, zapret_dir):
+    results = {domain: check_domain(domain) for domain in args.domains}
+    store = _history()
+    if store:
+        version = Installer().get_local_version()
+        for domain, result in results.items():
+            store.record_check("cli", domain, result, version=version)
+        store.close()
+    return results
+
+
+def cmd_history(args, zapret_dir):
+    import history
+
+    store = _history()
+    if store is None:
+        raise CliError("history database unavailable")
+    try:
+        store.maintain()
+        since = time.time() - args.days * history.DAY
+        period = history.HOUR if args.period == "hour" else history.DAY
+        return {"domain": args.domain, "period": args.period,
+                "buckets": store.series(args.domain, period, since, strategy=args.strategy or history.ALL),
+                "strategies": store.summary(args.domain, since)}
+    finally:
+        store.close()
+
+
+def cmd_search(args, zapret_dir):
+    client = _daemon(args)
+    if client:
+        try:
+            matches = client.call("search", query=args.query, mode=args.mode, limit=args.limit)
+        finally:
+            client.close()
+    else:
+        import listsearch
+        index = listsearch.SearchIndex(zapret_dir / "lists")
+        index.build()
+        matches = index.search(args.query, args.mode, args.limit)
+    return {"matches": [{"file": f, "line": n, "entry": e} for f, n, e in matches]}
+
+
+def cmd_watch(args, zapret_dir):
+    """Print one JSON line per event from the running GUI until it exits."""
+    client = _daemon(args)
+    if not client:
+        raise CliError(NO_DAEMON)
+
+    def on_event(topic, data):
+        print(json.dumps({"topic": topic, "data": data}, ensure_ascii=False), flush=True)
+
+    try:
+        client.subscribe(args.topics or ["*"], on_event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return {"watch": "closed"}
+
+
+def cmd_metrics(args, zapret_dir):
+    client = _daemon(args)
+    if not client:
+        raise CliError(NO_DAEMON)
+    try:
+        result = client.call("metrics", prometheus=args.prometheus)
+    finally:
+        client.close()
+    return {"prometheus": result} if args.prometheus else {"metrics": result}
+
+
+def cmd_ports(args, zapret_dir):
+    import portset
+    import strategy
+
+    path = _strategy_path(zapret_dir, args.name)
+    try:
+        _, report = portset.compile_strategy(strategy.Strategy.from_file(path),
+                                             strategy.game_filter_ports(zapret_dir))
+    except ValueError as e:
+        raise CliError(str(e))
+    return dict(report.to_json(), strategy=path.name)
+
+
+def cmd_update(args, zapret_dir):
+    installer = Installer()
+    has_update, latest = installer.check_updates()
+    out = {"local": installer.get_local_version(), "latest": latest or None,
+           "update_available": has_update}
+    if args.install and has_update:
+        _snapshot(zapret_dir, "cli update")
+
+        def progress(text, value):
+            print(f"[{value:3d}%] {text}", file=sys.stderr)
+
+        if not installer.download_and_install(progress, reset=False):
+            raise CliError("update failed")
+        out["installed"] = installer.get_local_version()
+    return out
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="zapret-cli", description="Zapret GUI command line")
+    parser.add_argument("--zapret-dir", type=Path, default=None,
+                        help="zapret directory (default: ~/zapret-gui/zapret)")
+    parser.add_argument("--pretty", action="store_true", help="indent JSON output")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="do not use the running GUI even if there is one")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="winws/service/driver status").set_defaults(func=cmd_status)
+    sub.add_parser("strategies", help="list strategy files").set_defaults(func=cmd_strategies)
+
+    p = sub.add_parser("run", help="start a strategy .bat")
+    p.add_argument("name")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("install-service", help="install the zapret service with a strategy")
+    p.add_argument("name")
+    p.set_defaults(func=cmd_install_service)
+
+    lists = sub.add_parser("lists", help="list file operations").add_subparsers(dest="lists_command",
+                                                                               required=True)
+    p = lists.add_parser("compact", help="normalize, validate and dedupe a list in place")
+    p.add_argument("file")
+    p.add_argument("--sort", action="store_true")
+    p.add_argument("--strip-comments", action="store_true")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_lists_compact)
+
+    p = lists.add_parser("import", help="append new valid entries from a list (plain, hosts, AdBlock, dnsmasq, "
+                                        "CSV; gzip/zip too), HAR capture or DNS log")
+    p.add_argument("file")
+    p.add_argument("source")
+    p.add_argument("--format", help="source format instead of detecting it (har, dnsmasq-log, adblock, "
+                                    "dnsmasq, hosts, csv, plain)")
+    p.add_argument("--min-count", type=int, default=1, help="HAR/logs: hosts seen at least this often")
+    p.add_argument("--top", type=int, default=None, help="HAR/logs: only the most frequent hosts")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_lists_import)
+
+    p = lists.add_parser("subscribe", help="keep a list merged with a list published at a URL")
+    p.add_argument("file")
+    p.add_argument("url")
+    p.add_argument("--format", help="source format instead of detecting it (adblock, dnsmasq, hosts, csv, plain)")
+    p.set_defaults(func=cmd_lists_subscribe)
+
+    p = lists.add_parser("unsubscribe", help="drop a subscription and the entries only it provided")
+    p.add_argument("subscription", help="id or URL")
+    p.set_defaults(func=cmd_lists_unsubscribe)
+
+    p = lists.add_parser("subscriptions", help="show subscriptions and their last fetch")
+    p.add_argument("file", nargs="?")
+    p.set_defaults(func=cmd_lists_subscriptions)
+
+    p = lists.add_parser("refresh", help="fetch due subscriptions (conditional requests) and merge changes")
+    p.add_argument("--force", action="store_true", help="fetch every subscription in full")
+    p.set_defaults(func=cmd_lists_refresh)
+
+    p = lists.add_parser("diff", help="compare two lists")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--show", action="append", choices=["added", "removed", "common"])
+    p.set_defaults(func=cmd_lists_diff)
+
+    p = sub.add_parser("test", help="DNS and HTTPS check")
+    p.add_argument("domains", nargs="+")
+    p.set_defaults(func=cmd_test)
+
+    p = sub.add_parser("history", help="stored connectivity checks of a domain")
+    p.add_argument("domain")
+    p.add_argument("--period", default="day", choices=["hour", "day"])
+    p.add_argument("--days", type=float, default=30)
+    p.add_argument("--strategy", default=None, help="only checks made with this strategy")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("search", help="search all lists")
+    p.add_argument("query")
+    p.add_argument("--mode", default="substring", choices=["exact", "suffix", "substring", "regex"])
+    p.add_argument("--limit", type=int, default=1000)
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("watch", help="stream events from the running GUI")
+    p.add_argument("topics", nargs="*", help="status, fs (default: all)")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("metrics", help="timings collected by the running GUI")
+    p.add_argument("--prometheus", action="store_true", help="Prometheus text format")
+    p.set_defaults(func=cmd_metrics)
+
+    p = sub.add_parser("ports", help="port filter overlaps and the minimized arguments of a strategy")
+    p.add_argument("name")
+    p.set_defaults(func=cmd_ports)
+
+    p = sub.add_parser("update", help="check for (and optionally install) a zapret update")
+    p.add_argument("--install", action="store_true")
+    p.set_defaults(func=cmd_update)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    zapret_dir = args.zapret_dir or get_zapret_dir()
+    try:
+        result = args.func(args, zapret_dir)
+        code = 0
+    except CliError as e:
+        result = {"error": str(e)}
+        code = 1
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+        code = 1
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2 if args.pretty else None)
+    sys.stdout.write("\n")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
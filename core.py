@@ -0,0 +1,351 @@
+"""
+Zapret management without any GUI dependency: paths, config, installer and
+Windows service control. Shared by the Qt app (main.py) and the CLI (cli.py).
+
+requests and packaging are imported where they are used to keep the import
+of this module cheap for the CLI.
+"""
+
+import re
+import json
+import logging
+import shutil
+import ctypes
+import socket
+import subprocess
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional, Tuple, Dict
+
+import metrics
+import scm
+import strategy
+
+log = logging.getLogger(__name__)
+
+# Constants
+GITHUB_REPO = "Flowseal/zapret-discord-youtube"
+GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
+GITHUB_RELEASES_URL = f"https://github.com/{GITHUB_REPO}/releases/latest"
+GUI_VERSION = "2.0.0"
+APP_NAME = f"ZapretGUI v{GUI_VERSION}"
+
+INSTALL_DIR_NAME = "zapret-gui"
+CONFIG_FILE = "zapret_gui_config.json"
+
+
+def get_base_install_dir() -> Path:
+    return Path.home() / INSTALL_DIR_NAME
+
+def get_zapret_dir() -> Path:
+    return get_base_install_dir() / "zapret"
+
+def get_app_dir() -> Path:
+    return get_base_install_dir() / "app"
+
+def is_admin() -> bool:
+    try:
+        return ctypes.windll.shell32.IsUserAnAdmin()
+    except:
+        return False
+
+
+def http_get(url: str, **kwargs):
+    """requests.get with a span and a per-host request counter."""
+    import requests
+    host = url.split("/")[2] if "://" in url else url
+    with metrics.span("http.get", host=host):
+        response = requests.get(url, **kwargs)
+    metrics.count("http.responses", host=host, status=response.status_code)
+    return response
+
+
+class Config:
+    def __init__(self, app_dir: Path):
+        self.config_path = app_dir / CONFIG_FILE
+        self.data = {"theme": "dark", "check_updates": True}
+        self.load()
+
+    def load(self):
+        try:
+            if self.config_path.exists():
+                with open(self.config_path, "r") as f:
+                    self.data.update(json.load(f))
+        except:
+            pass
+
+    def save(self):
+        try:
+            self.config_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.config_path, "w") as f:
+                json.dump(self.data, f, indent=2)
+        except:
+            pass
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.save()
+
+
+class Installer:
+    def __init__(self):
+        self.base_dir = get_base_install_dir()
+        self.zapret_dir = get_zapret_dir()
+        self.app_dir = get_app_dir()
+        self.bin_dir = self.zapret_dir / "bin"
+        self.lists_dir = self.zapret_dir / "lists"
+        self.service_bat = self.zapret_dir / "service.bat"
+
+    def check_installed(self) -> bool:
+        return self.bin_dir.exists() and self.service_bat.exists()
+
+    @metrics.timed("installer.local_version")
+    def get_local_version(self) -> Optional[str]:
+        if not self.service_bat.exists():
+            return None
+        try:
+            with open(self.service_bat, "r", encoding="utf-8", errors="ignore") as f:
+                match = re.search(r'set\s+"LOCAL_VERSION=([^"]+)"', f.read())
+                if match:
+                    return match.group(1)
+        except:
+            pass
+        return None
+
+    @metrics.timed("installer.latest_tag")
+    def get_latest_tag(self) -> Optional[str]:
+        headers = {"User-Agent": APP_NAME}
+        # Try API first
+        try:
+            response = http_get(GITHUB_API_URL, headers=headers, timeout=5)
+            if response.status_code == 200:
+                tag = response.json()["tag_name"]
+                log.info("API found tag: %s", tag)
+                return tag
+        except Exception as e:
+            log.warning("API check failed: %s", e)
+            pass
+            
+        # Fallback to web (follows redirects)
+        try:
+            # Added headers because GitHub blocks requests without User-Agent
+            response = http_get(GITHUB_RELEASES_URL, headers=headers, timeout=10)
+            # URL should be .../releases/tag/v1.9.2
+            if "/releases/tag/" in response.url:
+                tag = response.url.split("/")[-1]
+                log.info("Web found tag: %s", tag)
+                return tag
+        except Exception as e:
+            log.warning("Web check failed: %s", e)
+            pass
+            
+        return None
+
+    def check_updates(self) -> Tuple[bool, str]:
+        latest = self.get_latest_tag()
+        if not latest:
+            return False, ""
+            
+        local = self.get_local_version()
+        if not local:
+            return True, latest
+
+        from packaging import version
+        try:
+            return version.parse(latest.lstrip('v')) > version.parse(local.lstrip('v')), latest
+        except:
+            return True, latest
+
+    def _get_release_urls(self, tag: str) -> list[str]:
+        """Return list of possible download URLs in order of preference"""
+        # 1. Binary release (zip) - matches user's rar pattern but zip
+        # 2. Source code (zip) - fallback
+        return [
+            f"https://github.com/{GITHUB_REPO}/releases/download/{tag}/zapret-discord-youtube-{tag}.zip",
+            f"https://github.com/{GITHUB_REPO}/archive/refs/tags/{tag}.zip"
+        ]
+
+    @metrics.timed("installer.download_and_install")
+    def download_and_install(self, progress_callback, reset: bool = False) -> bool:
+        try:
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            self.zapret_dir.mkdir(parents=True, exist_ok=True)
+            self.app_dir.mkdir(parents=True, exist_ok=True)
+
+            if reset and self.zapret_dir.exists():
+                progress_callback("Удаление старых файлов...", 10)
+                try:
+                    for item in self.zapret_dir.iterdir():
+                        if item.is_dir():
+                            shutil.rmtree(item)
+                        else:
+                            item.unlink()
+                except Exception as e:
+                    log.error("Error cleaning dir: %s", e)
+
+            progress_callback("Получение информации о релизе...", 20)
+            tag = self.get_latest_tag()
+            if not tag:
+                progress_callback("Ошибка: Не удалось найти релиз (проверьте интернет)", 0)
+                return False
+
+            progress_callback(f"Скачивание версии {tag}...", 30)
+            headers = {"User-Agent": APP_NAME}
+            
+            # Try URLs in order
+            urls = self._get_release_urls(tag)
+            success = False
+            temp_zip = self.base_dir / "zapret_download.zip"
+
+            for url in urls:
+                try:
+                    log.info("Trying url: %s", url)
+                    r = http_get(url, headers=headers, stream=True, timeout=120)
+                    if r.status_code == 200:
+                        with metrics.span("installer.download"), open(temp_zip, "wb") as f:
+                            for chunk in r.iter_content(chunk_size=8192):
+                                f.write(chunk)
+                        metrics.count("installer.download_bytes", temp_zip.stat().st_size)
+                        success = True
+                        break
+                    else:
+                        log.warning("URL failed with status %s: %s", r.status_code, url)
+                except Exception as e:
+                    log.warning("URL download error: %s", e)
+            
+            if not success:
+               progress_callback("Ошибка: Не удалось скачать файл релиза (404/Connection Error)", 0)
+               return False
+
+            progress_callback("Распаковка...", 60)
+            extract_dir = self.base_dir / "temp_extract"
+            if extract_dir.exists():
+                shutil.rmtree(extract_dir)
+            extract_dir.mkdir()
+
+            try:
+                with metrics.span("installer.extract"), zipfile.ZipFile(temp_zip, 'r') as z:
+                    z.extractall(extract_dir)
+            except zipfile.BadZipFile:
+                 progress_callback("Ошибка: Скачанный файл поврежден или не является zip архивом", 0)
+                 return False
+
+            contents = list(extract_dir.iterdir())
+            source_dir = contents[0] if len(contents) == 1 and contents[0].is_dir() else extract_dir
+
+            progress_callback("Установка файлов...", 80)
+            with metrics.span("installer.move"):
+                for item in source_dir.iterdir():
+                    if item.name in ["gui", ".git", ".github"]:
+                        continue
+                    dest = self.zapret_dir / item.name
+                    if dest.exists():
+                        if dest.is_dir():
+                            shutil.rmtree(dest)
+                        else:
+                            dest.unlink()
+                    shutil.move(str(item), str(dest))
+
+            shutil.rmtree(extract_dir)
+            if temp_zip.exists():
+                temp_zip.unlink()
+
+            progress_callback("Готово!", 100)
+            return True
+        except Exception as e:
+            progress_callback(f"Ошибка: {str(e)[:50]}", 0)
+            return False
+
+
+class ServiceManager:
+    """Service control on top of scm (state polling instead of fixed sleeps)."""
+
+    backend = None  # scm.ScmBackend; ScBackend unless replaced
+
+    @classmethod
+    def _scm(cls):
+        if cls.backend is None:
+            cls.backend = scm.ScBackend()
+        return cls.backend
+
+    @classmethod
+    @metrics.timed("service.stop")
+    def stop_service(cls) -> bool:
+        return scm.stop(cls._scm())
+
+    @classmethod
+    @metrics.timed("service.remove")
+    def remove_service(cls) -> bool:
+        return scm.remove(cls._scm())
+
+    @classmethod
+    @metrics.timed("service.install")
+    def install_service(cls, strategy_path: Path, app_dir: Path) -> Tuple[bool, str]:
+        try:
+            with open(strategy_path, "r", encoding="utf-8", errors="ignore") as f:
+                content = f.read()
+            binpath = strategy.winws_cmdline(app_dir, strategy.extract_args(content))
+            return scm.install(cls._scm(), binpath, strategy_path.stem)
+        except Exception as e:
+            return False, str(e)
+
+    @staticmethod
+    @metrics.timed("service.get_status")
+    def get_status() -> Dict[str, Tuple[str, bool]]:
+        res = {}
+        try:
+            o = subprocess.check_output('tasklist /FI "IMAGENAME eq winws.exe"',
+                                       creationflags=subprocess.CREATE_NO_WINDOW).decode('cp866', errors='ignore')
+            res["winws"] = ("РАБОТАЕТ", True) if "winws.exe" in o else ("ОСТАНОВЛЕН", False)
+        except:
+            res["winws"] = ("НЕИЗВЕСТНО", False)
+
+        try:
+            o = subprocess.check_output("sc query zapret",
+                                       creationflags=subprocess.CREATE_NO_WINDOW).decode('cp866', errors='ignore')
+            if "RUNNING" in o:
+                res["zapret"] = ("ЗАПУЩЕНА", True)
+            elif "STOPPED" in o:
+                res["zapret"] = ("ОСТАНОВЛЕНА", False)
+            else:
+                res["zapret"] = ("НЕ УСТАНОВЛЕНА", False)
+        except:
+            res["zapret"] = ("НЕ УСТАНОВЛЕНА", False)
+
+        try:
+            o = subprocess.check_output("sc query WinDivert",
+                                       creationflags=subprocess.CREATE_NO_WINDOW).decode('cp866', errors='ignore')
+            res["windivert"] = ("ЗАГРУЖЕН", True) if "RUNNING" in o else ("ВЫГРУЖЕН", False)
+        except:
+            res["windivert"] = ("НЕ НАЙДЕН", False)
+
+        return res
+
+    @staticmethod
+    def status_json(status: Dict[str, Tuple[str, bool]]) -> Dict[str, dict]:
+        return {k: {"text": text, "running": running} for k, (text, running) in status.items()}
+
+
+@metrics.timed("net.check_domain")
+def check_domain(domain: str) -> Dict[str, dict]:
+    """DNS lookup and HTTPS request timings for one domain."""
+    result = {}
+    try:
+        t = time.time()
+        with metrics.span("net.dns"):
+            ip = socket.gethostbyname(domain)
+        result["dns"] = {"ok": True, "ip": ip, "ms": int((time.time() - t) * 1000)}
+    except Exception as e:
+        result["dns"] = {"ok": False, "error": str(e)}
+
+    try:
+        t = time.time()
+        r = http_get(f"https://{domain}", timeout=10, headers={"User-Agent": "Mozilla/5.0"})
+        result["https"] = {"ok": True, "status": r.status_code, "ms": int((time.time() - t) * 1000)}
+    except Exception as e:
+        result["https"] = {"ok": False, "error": str(e)}
+    return result
@@ -0,0 +1,278 @@
+"""
+Background health checks of the active strategy with automatic failover.
+
+Every `interval` seconds a HealthMonitor checks a few canary domains (one
+TLS handshake each, so a round costs a few KB and no measurable CPU) and
+keeps the results of the last `window` checks. When the success rate drops
+below `threshold` it switches to the next strategy of a ranked list and
+gives it `trial_rounds` rounds; if the candidate does no better than the
+strategy it replaced, the monitor switches back and remembers the candidate
+as tried. Once every candidate has been tried it only reports. The
+strategy counts as working again only at `recover` or better, so a rate
+hovering around the threshold doesn't make it switch back and forth.
+
+If the control domains (reachable without any bypass) fail as well, the
+network is down and nothing is switched.
+
+The check, the launcher and the ranking are plain callables, so the monitor
+runs offline with SimulatedNetwork and can be driven round by round through
+run_round().
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+CANARY_DOMAINS = ["discord.com", "www.youtube.com", "i.ytimg.com"]
+CONTROL_DOMAINS = ["ya.ru"]
+
+# Events passed to on_event(kind, info) and kept in HealthMonitor.log
+DEGRADED = "degraded"
+FAILOVER = "failover"
+KEPT = "kept"
+REVERTED = "reverted"
+EXHAUSTED = "exhausted"
+NETWORK_DOWN = "network_down"
+RECOVERED = "recovered"
+
+# Monitor states
+MONITORING = "monitoring"
+TRIAL = "trial"
+
+
+def rank_strategies(history, domains: List[str], candidates: List[str], since: float) -> List[str]:
+    """Candidates ordered by stored success rate on the canary domains, untested ones last."""
+    rates: Dict[str, List[int]] = {}
+    for domain in domains:
+        for t in history.summary(domain, since):
+            r = rates.setdefault(t["strategy"], [0, 0])
+            r[0] += t["ok"]
+            r[1] += t["count"]
+    order = {name: i for i, name in enumerate(candidates)}
+    return sorted(candidates, key=lambda n: (-(rates[n][0] / rates[n][1]) if n in rates else 1, order[n]))
+
+
+class HealthMonitor:
+    def __init__(self, check: Callable[[str], bool], launcher: Callable[[str], bool],
+                 current: Callable[[], Optional[str]], rank: Callable[[], List[str]],
+                 domains: Optional[List[str]] = None, control: Optional[List[str]] = None,
+                 interval: float = 300.0, threshold: float = 0.5, recover: float = 0.8, window: int = 6,
+                 trial_rounds: int = 2, on_event: Optional[Callable[[str, dict], None]] = None,
+                 record: Optional[Callable[[str, bool, Optional[float], Optional[str]], None]] = None,
+                 log_size: int = 100):
+        self.check = check
+        self.launcher = launcher
+        self.current = current
+        self.rank = rank
+        self.domains = domains or CANARY_DOMAINS
+        self.control = CONTROL_DOMAINS if control is None else control
+        self.interval = interval
+        self.threshold = threshold
+        self.recover = max(recover, threshold)
+        self.window = window
+        self.trial_rounds = trial_rounds
+        self.on_event = on_event
+        self.record = record
+        self.log = deque(maxlen=log_size)
+
+        self.state = MONITORING
+        self.results = deque(maxlen=window)
+        self.tried = set()
+        self.rounds = 0
+        self._trial = None  # {"from", "to", "baseline", "rounds"}
+        self._degraded = False
+        self._exhausted = False
+        self._offline = False
+        self.paused = False  # set while something else stops winws on purpose
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ----- scheduling -----
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # Spread the first round so it doesn't land on application startup
+        delay = random.uniform(0.2, 1.0) * self.interval
+        while not self._stop.wait(delay):
+            delay = self.interval
+            if self.paused:
+                continue
+            try:
+                self.run_round()
+            except Exception as e:
+                log.error("Health check failed: %s", e)
+
+    # ----- one round -----
+
+    def rate(self) -> Optional[float]:
+        return sum(self.results) / len(self.results) if self.results else None
+
+    def _probe(self, domains: List[str]) -> List[bool]:
+        strat = self.current()
+        out = []
+        for domain in domains:
+            t = time.perf_counter()
+            ok = bool(self.check(domain))
+            ms = (time.perf_counter() - t) * 1000
+            metrics.count("health.check", ok=str(ok).lower())
+            if self.record:
+                self.record(domain, ok, ms if ok else None, strat)
+            out.append(ok)
+        return out
+
+    def run_round(self) -> Optional[float]:
+        """Check the canaries once and act on the result; returns the current success rate."""
+        with metrics.span("health.round"):
+            self.rounds += 1
+            self.results.extend(self._probe(self.domains))
+            rate = self.rate()
+            if self.state == TRIAL:
+                self._trial["rounds"] += 1
+                if self._trial["rounds"] >= self.trial_rounds:
+                    self._finish_trial(rate)
+                return rate
+            if len(self.results) < self.window:
+                return rate
+            if rate >= self.recover and self._degraded:
+                self._reset()
+                self._emit(RECOVERED, rate=rate)
+            if rate >= self.threshold:
+                return rate
+            if not self._degraded:
+                self._degraded = True
+                self._emit(DEGRADED, rate=rate)
+            self._failover(rate)
+            return rate
+
+    def _failover(self, rate: float):
+        active = self.current()
+        if active is None:
+            return
+        if self.control and not any(self._probe(self.control)):
+            if not self._offline:
+                self._offline = True
+                self._emit(NETWORK_DOWN, rate=rate)
+            self.results.clear()
+            return
+        self._offline = False
+        self.tried.add(active)
+        candidates = [n for n in self.rank() if n not in self.tried]
+        if not candidates:
+            if not self._exhausted:
+                self._exhausted = True
+                self._emit(EXHAUSTED, rate=rate, strategy=active)
+            self.results.clear()
+            return
+        target = candidates[0]
+        self._emit(FAILOVER, rate=rate, previous=active, strategy=target)
+        if not self.launcher(target):
+            self.tried.add(target)
+            self.results.clear()
+            return
+        self.state = TRIAL
+        self._trial = {"from": active, "to": target, "baseline": rate, "rounds": 0}
+        self.results.clear()
+
+    def _finish_trial(self, rate: float):
+        trial, self._trial = self._trial, None
+        self.state = MONITORING
+        if rate > trial["baseline"]:
+            self._emit(KEPT, rate=rate, baseline=trial["baseline"], strategy=trial["to"])
+            if rate >= self.recover:
+                self._reset()
+            return
+        self.tried.add(trial["to"])
+        self._emit(REVERTED, rate=rate, baseline=trial["baseline"], strategy=trial["from"],
+                   rejected=trial["to"])
+        self.launcher(trial["from"])
+        self.results.clear()
+
+    def _reset(self):
+        self._degraded = False
+        self._exhausted = False
+        self.tried.clear()
+
+    def _emit(self, kind: str, **info):
+        info["t"] = time.time()
+        self.log.append((kind, info))
+        log.info("health: %s", describe(kind, info))
+        metrics.count("health.event", kind=kind)
+        if self.on_event:
+            try:
+                self.on_event(kind, info)
+            except Exception as e:
+                log.error("Health event handler error: %s", e)
+
+
+class SimulatedNetwork:
+    """Offline stand-in: each strategy unblocks a domain with a fixed probability.
+
+    `rates` maps strategy -> success probability; change it to emulate the
+    provider's DPI changing. Control domains succeed unless `offline`.
+    """
+
+    def __init__(self, rates: Dict[str, float], active: str, control: Optional[List[str]] = None,
+                 seed: int = 0):
+        self.rates = dict(rates)
+        self.active = active
+        self.control = set(CONTROL_DOMAINS if control is None else control)
+        self.offline = False
+        self.switches = 0
+        self.checks = 0
+        self.rnd = random.Random(seed)
+
+    def check(self, domain: str) -> bool:
+        self.checks += 1
+        if self.offline:
+            return False
+        if domain in self.control:
+            return True
+        return self.rnd.random() < self.rates.get(self.active, 0.0)
+
+    def launch(self, name: str) -> bool:
+        if name not in self.rates:
+            return False
+        self.switches += 1
+        self.active = name
+        return True
+
+    def current(self) -> Optional[str]:
+        return self.active
+
+
+def describe(kind: str, info: dict) -> str:
+    """One-line Russian description of an event for the Status page and the log."""
+    rate = info.get("rate")
+    pct = f"{rate:.0%}" if rate is not None else "—"
+    if kind == DEGRADED:
+        return f"Успешных проверок {pct} — ниже порога"
+    if kind == FAILOVER:
+        return f"Переключение: {info['previous']} → {info['strategy']}"
+    if kind == KEPT:
+        return f"{info['strategy']} оставлена: {pct} против {info['baseline']:.0%}"
+    if kind == REVERTED:
+        return (f"{info['rejected']} не лучше ({pct} против {info['baseline']:.0%}), "
+                f"возврат на {info['strategy']}")
+    if kind == EXHAUSTED:
+        return "Все стратегии проверены, ни одна не помогла"
+    if kind == NETWORK_DOWN:
+        return "Контрольный домен тоже недоступен (нет сети?), переключение отменено"
+    if kind == RECOVERED:
+        return f"Работа восстановлена ({pct})"
+    return kind
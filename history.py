@@ -0,0 +1,260 @@
+"""
+Connectivity history in a local SQLite database.
+
+Every probe (the Test page, `cli.py test`, parameter search, health checks)
+is stored as a raw row tagged with the domain, the active strategy and the
+zapret version. Closed hour and day buckets are rolled up once into a
+rollups table (count, success count, latency percentiles), per strategy and
+for all strategies together ('*'), so a chart over months reads a few
+hundred precomputed rows instead of scanning raw probes; only the still-open
+buckets are aggregated on the fly.
+
+Retention downsamples: raw rows are dropped after `raw_days` (once their day
+is rolled up), hourly rollups after `hourly_days`, daily rollups are kept.
+
+The database runs in WAL mode, so the GUI can read charts while a worker
+thread is writing.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import metrics
+
+FILE = "history.db"
+HOUR = 3600
+DAY = 86400
+PERIODS = (HOUR, DAY)
+ALL = "*"
+RAW = 0  # rollup_state row for raw probes: complete from done_until on, older ones may be pruned
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    strategy TEXT NOT NULL DEFAULT '',
+    version TEXT NOT NULL DEFAULT '',
+    ok INTEGER NOT NULL,
+    dns_ms REAL,
+    https_ms REAL,
+    status INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS probes_ts ON probes(ts);
+CREATE INDEX IF NOT EXISTS probes_domain_ts ON probes(domain, ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    period INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    domain TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    p50 REAL, p90 REAL, p99 REAL,
+    PRIMARY KEY (period, domain, strategy, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_state (
+    period INTEGER PRIMARY KEY,
+    done_until INTEGER NOT NULL
+);
+"""
+
+
+class Retention:
+    """How long each resolution is kept; None keeps it forever."""
+
+    def __init__(self, raw_days: Optional[float] = 90, hourly_days: Optional[float] = 400,
+                 daily_days: Optional[float] = None):
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _aggregate(rows: Iterable[tuple], period: int) -> Dict[tuple, dict]:
+    """(ts, domain, strategy, ok, https_ms) rows -> {(bucket, domain, strategy): stats}."""
+    groups: Dict[tuple, list] = {}
+    for ts, domain, strat, ok, ms in rows:
+        bucket = int(ts // period * period)
+        for key in ((bucket, domain, strat), (bucket, domain, ALL)):
+            g = groups.get(key)
+            if g is None:
+                g = groups[key] = [0, 0, []]
+            g[0] += 1
+            if ok:
+                g[1] += 1
+                if ms is not None:
+                    g[2].append(ms)
+    result = {}
+    for key, (count, ok, times) in groups.items():
+        times.sort()
+        result[key] = {"count": count, "ok": ok, "p50": percentile(times, 50),
+                       "p90": percentile(times, 90), "p99": percentile(times, 99)}
+    return result
+
+
+class History:
+    def __init__(self, path: Path, retention: Optional[Retention] = None):
+        self.path = path
+        self.retention = retention or Retention()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        with self._db:
+            if self._done_until(RAW) is None:
+                # A database from before the raw watermark may have been pruned: trust only what is left
+                oldest = self._db.execute("SELECT MIN(ts) FROM probes").fetchone()[0]
+                self._db.execute("INSERT INTO rollup_state VALUES (?, ?)",
+                                 (RAW, math.ceil(oldest) if oldest is not None else self._done_until(DAY) or 0))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ----- writing -----
+
+    def record(self, source: str, domain: str, ok: bool, strategy: Optional[str] = None,
+               version: Optional[str] = None, dns_ms: Optional[float] = None,
+               https_ms: Optional[float] = None, status: Optional[int] = None,
+               error: Optional[str] = None, ts: Optional[float] = None):
+        self.record_many([(ts or time.time(), source, domain, strategy or "", version or "",
+                           int(bool(ok)), dns_ms, https_ms, status, error)])
+
+    def record_check(self, source: str, domain: str, result: dict, strategy: Optional[str] = None,
+                     version: Optional[str] = None):
+        """Store a core.check_domain() result."""
+        dns, https = result.get("dns", {}), result.get("https", {})
+        self.record(source, domain, https.get("ok", False), strategy, version,
+                    dns_ms=dns.get("ms"), https_ms=https.get("ms"), status=https.get("status"),
+                    error=https.get("error") or dns.get("error"))
+
+    def record_many(self, rows: List[tuple]):
+        """Raw rows: (ts, source, domain, strategy, version, ok, dns_ms, https_ms, status, error)."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO probes (ts, source, domain, strategy, version, ok, dns_ms, https_ms, "
+                "status, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # A row older than a rollup watermark (clock change, import) reopens its buckets,
+            # but only those whose raw rows are all still kept: rollup() recomputes them
+            oldest = min(r[0] for r in rows) if rows else None
+            if oldest is not None:
+                raw_from = self._done_until(RAW)
+                for period in PERIODS:
+                    reopen = max(int(oldest // period * period), -(-raw_from // period) * period)
+                    self._db.execute("UPDATE rollup_state SET done_until = ? WHERE period = ? AND done_until > ?",
+                                     (reopen, period, reopen))
+
+    # ----- maintenance -----
+
+    def _done_until(self, period: int) -> Optional[int]:
+        row = self._db.execute("SELECT done_until FROM rollup_state WHERE period = ?", (period,)).fetchone()
+        return row[0] if row else None
+
+    def rollup(self, now: Optional[float] = None) -> int:
+        """Aggregate every closed bucket not rolled up yet; returns the rollup rows written."""
+        now = time.time() if now is None else now
+        written = 0
+        with metrics.span("history.rollup"), self._lock, self._db:
+            for period in PERIODS:
+                end = int(now // period * period)
+                start = self._done_until(period)
+                if start is None:
+                    row = self._db.execute("SELECT MIN(ts) FROM probes").fetchone()
+                    if row[0] is None:
+                        continue
+                    start = int(row[0] // period * period)
+                if start >= end:
+                    continue
+                rows = self._db.execute(
+                    "SELECT ts, domain, strategy, ok, https_ms FROM probes WHERE ts >= ? AND ts < ?",
+                    (start, end))
+                stats = _aggregate(rows, period)
+                self._db.execute("DELETE FROM rollups WHERE period = ? AND bucket >= ? AND bucket < ?",
+                                 (period, start, end))
+                self._db.executemany(
+                    "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(period, b, d, s, v["count"], v["ok"], v["p50"], v["p90"], v["p99"])
+                     for (b, d, s), v in stats.items()])
+                self._db.execute("INSERT OR REPLACE INTO rollup_state VALUES (?, ?)", (period, end))
+                written += len(stats)
+        return written
+
+    def prune(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Apply the retention policy; raw rows go only once their day is rolled up."""
+        now = time.time() if now is None else now
+        r = self.retention
+        deleted = {"raw": 0, "hourly": 0, "daily": 0}
+        with self._lock, self._db:
+            if r.raw_days is not None:
+                cutoff = min(now - r.raw_days * DAY, self._done_until(DAY) or 0)
+                deleted["raw"] = self._db.execute("DELETE FROM probes WHERE ts < ?", (cutoff,)).rowcount
+                if deleted["raw"] and cutoff > self._done_until(RAW):
+                    self._db.execute("INSERT OR REPLACE INTO rollup_state VALUES (?, ?)", (RAW, math.ceil(cutoff)))
+            for name, period, days in (("hourly", HOUR, r.hourly_days), ("daily", DAY, r.daily_days)):
+                if days is not None:
+                    deleted[name] = self._db.execute(
+                        "DELETE FROM rollups WHERE period = ? AND bucket < ?",
+                        (period, now - days * DAY)).rowcount
+        return deleted
+
+    def maintain(self, now: Optional[float] = None):
+        self.rollup(now)
+        self.prune(now)
+
+    # ----- reading -----
+
+    def series(self, domain: str, period: int = DAY, since: float = 0, until: Optional[float] = None,
+               strategy: str = ALL) -> List[dict]:
+        """Buckets for one domain, oldest first: {bucket, count, ok, p50, p90, p99}."""
+        until = time.time() if until is None else until
+        with metrics.span("history.series"), self._lock:
+            done = self._done_until(period) or 0
+            rows = self._db.execute(
+                "SELECT bucket, count, ok, p50, p90, p99 FROM rollups "
+                "WHERE period = ? AND domain = ? AND strategy = ? AND bucket >= ? AND bucket < ? "
+                "ORDER BY bucket", (period, domain, strategy, since // period * period, min(done, until)))
+            result = [dict(zip(("bucket", "count", "ok", "p50", "p90", "p99"), row)) for row in rows]
+            if until > done:
+                sql = "SELECT ts, domain, strategy, ok, https_ms FROM probes WHERE domain = ? AND ts >= ? AND ts < ?"
+                params = [domain, max(done, since), until]
+                if strategy != ALL:
+                    sql += " AND strategy = ?"
+                    params.append(strategy)
+                live = _aggregate(self._db.execute(sql, params), period)
+                result.extend(dict(v, bucket=b) for (b, _, s), v in sorted(live.items()) if s == strategy)
+        return result
+
+    def summary(self, domain: str, since: float, until: Optional[float] = None) -> List[dict]:
+        """Per-strategy totals over a range, from daily rollups plus the open day."""
+        totals: Dict[str, dict] = {}
+        with self._lock:
+            open_since = max(since, self._done_until(DAY) or 0)
+            strategies = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT strategy FROM rollups WHERE period = ? AND domain = ? AND bucket >= ? "
+                "UNION SELECT DISTINCT strategy FROM probes WHERE domain = ? AND ts >= ?",
+                (DAY, domain, since // DAY * DAY, domain, open_since))]
+        for strat in strategies:
+            if strat == ALL:
+                continue
+            buckets = self.series(domain, DAY, since, until, strat)
+            count = sum(b["count"] for b in buckets)
+            if count:
+                medians = sorted(b["p50"] for b in buckets if b["p50"] is not None)
+                totals[strat] = {"strategy": strat, "count": count,
+                                 "ok": sum(b["ok"] for b in buckets),
+                                 "p50": percentile(medians, 50)}
+        return sorted(totals.values(), key=lambda t: -t["count"])
@@ -0,0 +1,491 @@
+"""
+Format-aware, streaming import of hostnames.
+
+Lists people bring come in many shapes, and what needs unblocking often
+shows up in a HAR capture or a DNS log rather than a ready-made list. Every
+source format is a parser registered with @register: a generator that reads
+a text stream in one pass and yields raw entries (None for a line it
+couldn't use), plus a sniffer that scores the first SNIFF_BYTES of a file.
+
+    har          browser/devtools HAR: request and redirect URLs. The JSON is
+                 scanned in chunks for "url"/"redirectURL" keys instead of
+                 being loaded; response bodies are skipped undecoded
+    dnsmasq-log  dnsmasq / Pi-hole query logs ("query[A] host from client")
+    adblock      AdBlock filters ("||host^"); exceptions, cosmetic and path
+                 rules are skipped
+    dnsmasq      dnsmasq config ("server=/host/", "address=/host/0.0.0.0")
+    hosts        hosts files ("0.0.0.0 host1 host2")
+    csv          any delimiter; the host column is found by header name or
+                 by content
+    plain        one entry per line (the fallback)
+
+Sources may be gzip or zip files; they are decompressed on the fly, never
+extracted to disk.
+
+parse() yields the normalized entries of a list format (the listlint rules,
+so the result matches what the editor would write) for listdiff to merge,
+and fills a Stats with per-format throughput and skipped lines. Captures and
+logs are `ranked`: rank() counts their hostnames for the user to pick from,
+and new_hosts() leaves out what an existing list already covers (an entry
+covers its subdomains in winws).
+"""
+
+import csv
+import gzip
+import io
+import ipaddress
+import itertools
+import json
+import re
+import time
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import listlint
+import metrics
+
+HAR = "har"
+DNSMASQ_LOG = "dnsmasq-log"
+ADBLOCK = "adblock"
+DNSMASQ = "dnsmasq"
+HOSTS = "hosts"
+CSV = "csv"
+PLAIN = "plain"
+
+CHUNK = 1 << 20
+SNIFF_BYTES = 8192
+# URLs longer than this (data: URIs and the like) are skipped
+MAX_URL = 64 * 1024
+# parse() times the parser in batches, not the consumer of its entries
+BATCH = 4096
+
+_HAR_URL_RE = re.compile(r'"(?:url|redirectURL)"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+_DNSMASQ_LOG_RE = re.compile(r"\bquery\[[A-Za-z0-9]+\] (\S+) from ")
+_ADBLOCK_RE = re.compile(r"\|\|([^\^$/|*\s]+)\^?\|?(?:\$.*)?$")
+_DNSMASQ_KEYS = {"server", "local", "address", "ipset", "nftset", "rev-server"}
+_CSV_HEADERS = {"domain", "domains", "host", "hostname", "url", "site", "website", "домен", "сайт", "адрес"}
+_LOCAL_SUFFIXES = (".local", ".lan", ".home", ".internal", ".localdomain", ".arpa", ".home.arpa")
+_LOCAL_NAMES = {"localhost", "localhost.localdomain", "broadcasthost", "local", "ip6-localhost",
+                "ip6-loopback", "0.0.0.0"}
+
+
+def _is_local(host: str) -> bool:
+    return host in _LOCAL_NAMES or host.endswith(_LOCAL_SUFFIXES)
+
+
+def normalize_host(host: str) -> Optional[str]:
+    """Lowercase punycode hostname, or None for IPs, local and invalid names."""
+    host = host.strip().rstrip(".").lower()
+    if not host or _is_local(host):
+        return None
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return None
+    except ValueError:
+        pass
+    try:
+        host = listlint._to_ascii(host)
+    except UnicodeError:
+        return None
+    return host if listlint.HOSTNAME_RE.match(host) else None
+
+
+# ----- registry -----
+
+class Format:
+    def __init__(self, name: str, parse: Callable, sniff: Optional[Callable[[str, List[str]], float]],
+                 ranked: bool, ips: bool):
+        self.name = name
+        self.parse = parse    # text stream -> raw entries, None for an unusable line
+        self.sniff = sniff    # (head, head lines) -> share of lines that look like this format
+        self.ranked = ranked  # hosts are counted and picked by frequency, not imported wholesale
+        self.ips = ips        # IP and CIDR entries are kept (ipset lists)
+
+
+FORMATS: Dict[str, Format] = {}
+
+
+def register(name: str, sniff: Optional[Callable[[str, List[str]], float]] = None,
+             ranked: bool = False, ips: bool = False):
+    """Decorator: add a parser; sniffers run in registration order, the first best score wins."""
+    def wrap(parse):
+        FORMATS[name] = Format(name, parse, sniff, ranked, ips)
+        return parse
+    return wrap
+
+
+def _share(lines: list, pred: Callable) -> float:
+    return sum(1 for l in lines if pred(l)) / len(lines) if lines else 0.0
+
+
+# ----- parsers -----
+
+def har_urls(f) -> Iterator[str]:
+    """URLs of a HAR document, read in CHUNK-sized pieces."""
+    carry = ""
+    while True:
+        chunk = f.read(CHUNK)
+        buf = carry + chunk
+        last_end = 0
+        for m in _HAR_URL_RE.finditer(buf):
+            last_end = m.end()
+            raw = m.group(1)
+            if len(raw) > MAX_URL:
+                continue
+            try:
+                yield json.loads(f'"{raw}"') if "\\" in raw else raw
+            except ValueError:
+                continue
+        if not chunk:
+            return
+        # Keep an unfinished key/value at the end for the next round, not whole bodies
+        carry = buf[max(last_end, len(buf) - MAX_URL - 32):]
+
+
+@register(HAR, sniff=lambda head, lines: float(head.lstrip().startswith("{") and '"log"' in head),
+          ranked=True)
+def har_hosts(f) -> Iterator[str]:
+    for url in har_urls(f):
+        if url.startswith(("http://", "https://", "ws://", "wss://")):
+            try:
+                host = urlsplit(url).hostname
+            except ValueError:
+                continue
+            if host:
+                yield host
+
+
+@register(DNSMASQ_LOG, sniff=lambda head, lines: _share(
+    lines, lambda l: "dnsmasq[" in l or _DNSMASQ_LOG_RE.search(l) is not None), ranked=True)
+def dnsmasq_log_hosts(f) -> Iterator[str]:
+    # Only queries count (each is one lookup by a client); replies and forwards repeat them
+    for line in f:
+        i = line.find("query[")
+        if i >= 0:
+            parts = line[i:].split(None, 3)
+            if len(parts) >= 3 and parts[2] == "from":
+                yield parts[1]
+
+
+@register(ADBLOCK, sniff=lambda head, lines: _share(lines, lambda l: l.startswith(("||", "@@")) or "##" in l))
+def adblock_entries(f) -> Iterator[Optional[str]]:
+    for line in f:
+        line = line.strip()
+        if not line or line[0] in "!#[":
+            continue
+        m = _ADBLOCK_RE.match(line)
+        # Exceptions (@@), cosmetic (##) and URL-path rules block less than a whole host
+        yield m.group(1) if m else None
+
+
+def _dnsmasq_key(line: str) -> Optional[str]:
+    key, sep, _ = line.partition("=/")
+    return key if sep and key in _DNSMASQ_KEYS else None
+
+
+@register(DNSMASQ, sniff=lambda head, lines: _share(lines, lambda l: _dnsmasq_key(l) is not None))
+def dnsmasq_entries(f) -> Iterator[Optional[str]]:
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if _dnsmasq_key(line) is None:
+            yield None
+            continue
+        # key=/host1/host2/value: the last field is the upstream, address or set name
+        hosts = line.split("=/", 1)[1].split("/")[:-1]
+        if not hosts:
+            yield None
+        for host in hosts:
+            yield host or None
+
+
+def _hosts_line(parts: List[str]) -> bool:
+    # Cheap test for an address in the first column; normalization drops anything odd later
+    return len(parts) >= 2 and (parts[0][0].isdigit() or ":" in parts[0])
+
+
+@register(HOSTS, sniff=lambda head, lines: _share(lines, lambda l: _hosts_line(l.split("#", 1)[0].split())))
+def hosts_entries(f) -> Iterator[Optional[str]]:
+    for line in f:
+        parts = line.split("#", 1)[0].split()
+        if not parts:
+            continue
+        if _hosts_line(parts):
+            yield from parts[1:]
+        else:
+            yield None
+
+
+def _csv_dialect(lines: List[str]):
+    try:
+        return csv.Sniffer().sniff("\n".join(lines[:50]), delimiters=",;\t|")
+    except csv.Error:
+        return None
+
+
+def _csv_share(lines: List[str]) -> float:
+    dialect = _csv_dialect(lines)
+    if dialect is None:
+        return 0.0
+    widths = [len(row) for row in csv.reader(lines[:50], dialect)]
+    return _share(widths, lambda w: w >= 2 and w == widths[0])
+
+
+def _clean(records: Iterator[listlint.Record]) -> Iterator[listlint.Record]:
+    return listlint.validate()(listlint.normalize()(records))
+
+
+def _valid_entry(value: str) -> bool:
+    rec = next(_clean(iter([listlint.Record(0, value.strip())])))
+    return rec.kind in (listlint.DOMAIN, listlint.IP)
+
+
+def _csv_column(rows: List[List[str]]) -> Tuple[int, bool]:
+    """(index of the host column, whether the first row is a header)."""
+    header = [c.strip().lower() for c in rows[0]]
+    for i, name in enumerate(header):
+        if name in _CSV_HEADERS:
+            return i, True
+    width = max(len(r) for r in rows)
+    scores = [sum(1 for r in rows if i < len(r) and _valid_entry(r[i])) for i in range(width)]
+    best = max(range(width), key=lambda i: scores[i])
+    return best, (best >= len(rows[0]) or not _valid_entry(rows[0][best]))
+
+
+@register(CSV, sniff=lambda head, lines: _csv_share(lines), ips=True)
+def csv_entries(f) -> Iterator[Optional[str]]:
+    lines = (l for l in f if l.strip() and not l.lstrip().startswith("#"))
+    head = list(itertools.islice(lines, 50))
+    if not head:
+        return
+    rows = csv.reader(itertools.chain(head, lines), _csv_dialect(head) or csv.excel)
+    first = list(itertools.islice(rows, 50))
+    column, has_header = _csv_column(first)
+    for row in itertools.chain(first[1:] if has_header else first, rows):
+        yield row[column] if column < len(row) and row[column].strip() else None
+
+
+@register(PLAIN, ips=True)
+def plain_entries(f) -> Iterator[str]:
+    # listlint's normalize() deals with URLs, ports, wildcards and inline comments
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+# ----- sources -----
+
+class _CountingReader(io.RawIOBase):
+    """Counts the (decompressed) bytes read through it, for throughput."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.raw.readinto(b)
+        self.bytes += n or 0
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def _zip_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    files = [i for i in archive.infolist() if not i.is_dir()]
+    if not files:
+        raise ValueError("в архиве нет файлов")
+    return max(files, key=lambda i: i.file_size)
+
+
+@contextmanager
+def open_source(path: Union[str, Path], stats: Optional["Stats"] = None):
+    """Text stream of a plain, gzip or zip file (largest member), decompressed as it is read."""
+    path = Path(path)
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    archive = None
+    if magic[:2] == b"\x1f\x8b":
+        raw, compression = gzip.open(path, "rb"), "gzip"
+    elif magic == b"PK\x03\x04":
+        archive = zipfile.ZipFile(path)
+        member = _zip_member(archive)
+        raw, compression = archive.open(member), f"zip:{member.filename}"
+    else:
+        raw, compression = open(path, "rb"), None
+    counter = _CountingReader(raw)
+    text = io.TextIOWrapper(io.BufferedReader(counter, CHUNK), encoding="utf-8-sig", errors="ignore")
+    try:
+        yield text
+    finally:
+        text.close()
+        if archive is not None:
+            archive.close()
+        if stats is not None:
+            stats.bytes = counter.bytes
+            stats.compression = compression
+
+
+def _head_lines(head: str) -> List[str]:
+    lines = head.splitlines()
+    if len(head) >= SNIFF_BYTES:
+        lines = lines[:-1]  # cut off mid-line
+    return [l.strip() for l in lines[:200] if l.strip() and l.lstrip()[0] not in "#![;"]
+
+
+def sniff(path: Union[str, Path]) -> str:
+    """Name of the registered format the start of a source looks like most; PLAIN if none fits."""
+    path = Path(path)
+    name = path.name.lower()
+    for suffix in (".gz", ".zip"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    if name.endswith(".har"):
+        return HAR
+    with open_source(path) as f:
+        head = f.read(SNIFF_BYTES)
+    lines = _head_lines(head)
+    best, score = PLAIN, 0.0
+    for fmt in FORMATS.values():
+        if fmt.sniff is not None:
+            s = fmt.sniff(head, lines)
+            if s > score:
+                best, score = fmt.name, s
+    return best if score >= 0.5 else PLAIN
+
+
+# ----- statistics -----
+
+class Stats:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.seen = 0       # raw entries read
+        self.entries = 0    # of those, valid ones
+        self.skipped = 0    # unusable lines, local names, invalid hosts
+        self.bytes = 0      # decompressed
+        self.seconds = 0.0
+        self.compression: Optional[str] = None
+
+    def mb_per_s(self) -> float:
+        return self.bytes / 2**20 / self.seconds if self.seconds else 0.0
+
+    def _source(self) -> str:
+        mb = self.bytes / 2**20
+        packed = f", {self.compression}" if self.compression else ""
+        return f"{mb:.1f} МБ{packed} за {self.seconds:.2f} с ({self.mb_per_s():.1f} МБ/с)"
+
+    def summary(self) -> str:
+        return f"{self.kind}: {self.entries} записей, пропущено {self.skipped}, {self._source()}"
+
+    def _publish(self):
+        metrics.count("lists.import.entries", self.entries, format=self.kind)
+        metrics.count("lists.import.skipped", self.skipped, format=self.kind)
+        metrics.count("lists.import.bytes", self.bytes, format=self.kind)
+        # Parse time only (not the consumer's); the rate is bytes over time at query time
+        metrics.observe("lists.import", self.seconds, format=self.kind)
+
+
+class Ranking(Stats):
+    def __init__(self, kind: str):
+        super().__init__(kind)
+        self.counts: Counter = Counter()
+
+    def top(self, n: Optional[int] = None, min_count: int = 1) -> List[Tuple[str, int]]:
+        return [(h, c) for h, c in self.counts.most_common(n) if c >= min_count]
+
+    def summary(self) -> str:
+        return (f"{self.kind}: {len(self.counts)} хостов из {self.seen} упоминаний, "
+                f"пропущено {self.skipped}, {self._source()}")
+
+
+# ----- import -----
+
+def parse(path: Union[str, Path], kind: Optional[str] = None, stats: Optional[Stats] = None) -> Iterator[str]:
+    """Normalized entries of a source in file order, duplicates included; kind defaults to sniff()."""
+    fmt = FORMATS[kind or sniff(path)]
+    stats = stats if stats is not None else Stats(fmt.name)
+    stats.kind = fmt.name
+
+    def entries(f):
+        # One long-lived listlint pipeline, fed a record at a time (both stages are 1:1)
+        pending: List[listlint.Record] = []
+        cleaned = _clean(iter(pending.pop, None))
+        for raw in fmt.parse(f):
+            stats.seen += 1
+            if raw is None:
+                stats.skipped += 1
+                continue
+            # Most entries are clean hostnames already; the rest go through listlint
+            if len(raw) <= 253 and listlint.HOSTNAME_RE.match(raw):
+                text, kind = raw, listlint.DOMAIN
+            else:
+                pending.append(listlint.Record(stats.seen, raw))
+                rec = next(cleaned)
+                text, kind = rec.text, rec.kind
+            if (kind == listlint.DOMAIN and not _is_local(text)) or (kind == listlint.IP and fmt.ips):
+                stats.entries += 1
+                yield text
+            else:
+                stats.skipped += 1
+
+    with metrics.span("lists.parse", format=fmt.name), open_source(path, stats) as f:
+        it = entries(f)
+        while True:
+            t = time.perf_counter()
+            batch = list(itertools.islice(it, BATCH))
+            stats.seconds += time.perf_counter() - t
+            if not batch:
+                break
+            yield from batch
+    stats._publish()
+
+
+@metrics.timed("lists.extract")
+def rank(path: Union[str, Path], kind: Optional[str] = None) -> Ranking:
+    """Count the hostnames of a source; kind defaults to sniff()."""
+    fmt = FORMATS[kind or sniff(path)]
+    ranking = Ranking(fmt.name)
+    t = time.perf_counter()
+    cache: Dict[str, Optional[str]] = {}
+    with open_source(path, ranking) as f:
+        for raw in fmt.parse(f):
+            ranking.seen += 1
+            host = cache.get(raw, "") if raw is not None else None
+            if host == "":
+                host = cache[raw] = normalize_host(raw)
+            if host is None:
+                ranking.skipped += 1
+            else:
+                ranking.counts[host] += 1
+    ranking.entries = len(ranking.counts)
+    ranking.seconds = time.perf_counter() - t
+    ranking._publish()
+    return ranking
+
+
+def covered(host: str, entries: set) -> bool:
+    """True if the host or one of its parent domains is already an entry."""
+    while True:
+        if host in entries:
+            return True
+        dot = host.find(".")
+        if dot < 0:
+            return False
+        host = host[dot + 1:]
+
+
+def new_hosts(ranking: Ranking, existing: Iterable[str], min_count: int = 1) -> List[Tuple[str, int]]:
+    """Ranked hosts that the existing list lines don't cover yet."""
+    entries = {rec.text for rec in listlint.normalize()(listlint.read_records(existing))
+               if rec.kind == listlint.DOMAIN}
+    return [(h, c) for h, c in ranking.top(min_count=min_count) if not covered(h, entries)]
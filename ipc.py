@@ -0,0 +1,290 @@
+"""
+Single-instance lock and local control server.
+
+The running app holds an OS lock on app/zapret_gui.lock and serves JSON-RPC
+2.0 over a local connection: a named pipe on Windows, a Unix socket
+elsewhere (multiprocessing.connection handles both). Connections are
+authenticated with a random key stored in the app directory, so only the
+same user can talk to the server.
+
+A second GUI launch, the CLI or any other client connects and calls methods
+instead of starting from scratch. Clients can call "subscribe" with a list
+of topics and then receive {"method": "event", "params": {"topic", "data"}}
+notifications on the same connection.
+
+On Windows the pipe keeps the default DACL, so when the GUI runs elevated
+(it usually does) a client that isn't gets access denied. connect() treats
+that like no running instance, and callers fall back to doing the work
+themselves.
+"""
+
+import getpass
+import json
+import os
+import secrets
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+LOCK_FILE = "zapret_gui.lock"
+KEY_FILE = "ipc.key"
+SOCKET_FILE = "zapret_gui.sock"
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+# ----- single instance -----
+
+class InstanceLock:
+    def __init__(self, app_dir: Path):
+        self.path = app_dir / LOCK_FILE
+        self._fd = None
+
+    def acquire(self) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+
+# ----- addressing -----
+
+def address(app_dir: Path) -> str:
+    if sys.platform == "win32":
+        return r"\\.\pipe\zapret-gui-" + getpass.getuser()
+    return str(app_dir / SOCKET_FILE)
+
+
+def _load_key(app_dir: Path, create: bool) -> Optional[bytes]:
+    path = app_dir / KEY_FILE
+    try:
+        return path.read_bytes()
+    except OSError:
+        if not create:
+            return None
+    key = secrets.token_bytes(32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _send(conn, lock: threading.Lock, message: dict):
+    data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    with lock:
+        conn.send_bytes(data)
+
+
+# ----- server -----
+
+class _ClientConn:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.topics = set()
+
+
+class ControlServer:
+    """JSON-RPC server; handlers are called as handler(**params) on server threads."""
+
+    def __init__(self, app_dir: Path, handlers: Optional[Dict[str, Callable]] = None):
+        self.app_dir = app_dir
+        self.handlers = dict(handlers or {})
+        self.handlers.setdefault("ping", lambda: "pong")
+        self._clients: List[_ClientConn] = []
+        self._clients_lock = threading.Lock()
+        self._listener = None
+        self._running = False
+
+    def register(self, name: str, handler: Callable):
+        self.handlers[name] = handler
+
+    def start(self):
+        addr = address(self.app_dir)
+        if sys.platform != "win32" and os.path.exists(addr):
+            # Left over from a crashed instance; we hold the instance lock
+            os.unlink(addr)
+        self._listener = Listener(addr, authkey=_load_key(self.app_dir, create=True))
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        try:
+            # Wake up accept()
+            Client(self._listener.address, authkey=_load_key(self.app_dir, create=False)).close()
+        except Exception:
+            pass
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        with self._clients_lock:
+            for c in self._clients:
+                try:
+                    c.conn.close()
+                except Exception:
+                    pass
+            self._clients.clear()
+
+    def publish(self, topic: str, data):
+        """Send an event to every client subscribed to topic (or to '*')."""
+        message = {"jsonrpc": "2.0", "method": "event", "params": {"topic": topic, "data": data}}
+        with self._clients_lock:
+            targets = [c for c in self._clients if topic in c.topics or "*" in c.topics]
+        for c in targets:
+            try:
+                _send(c.conn, c.lock, message)
+            except Exception:
+                self._drop(c)
+
+    def _drop(self, client: _ClientConn):
+        with self._clients_lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        try:
+            client.conn.close()
+        except Exception:
+            pass
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                # Failed authentication or listener closed
+                if not self._running:
+                    return
+                continue
+            if not self._running:
+                conn.close()
+                return
+            client = _ClientConn(conn)
+            with self._clients_lock:
+                self._clients.append(client)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: _ClientConn):
+        try:
+            while True:
+                try:
+                    request = json.loads(client.conn.recv_bytes().decode("utf-8"))
+                except (EOFError, OSError):
+                    return
+                except ValueError:
+                    _send(client.conn, client.lock, {"jsonrpc": "2.0", "id": None,
+                                                     "error": {"code": -32700, "message": "Parse error"}})
+                    continue
+                self._handle(client, request)
+        finally:
+            self._drop(client)
+
+    def _handle(self, client: _ClientConn, request: dict):
+        req_id = request.get("id")
+        method = request.get("method")
+        params = request.get("params") or {}
+        if method == "subscribe":
+            client.topics.update(params.get("topics") or ["*"])
+            response = {"jsonrpc": "2.0", "id": req_id, "result": sorted(client.topics)}
+        elif method not in self.handlers:
+            response = {"jsonrpc": "2.0", "id": req_id,
+                        "error": {"code": -32601, "message": f"Unknown method: {method}"}}
+        else:
+            try:
+                response = {"jsonrpc": "2.0", "id": req_id, "result": self.handlers[method](**params)}
+            except Exception as e:
+                response = {"jsonrpc": "2.0", "id": req_id,
+                            "error": {"code": -32000, "message": f"{type(e).__name__}: {e}"}}
+        if req_id is not None:
+            _send(client.conn, client.lock, response)
+
+
+# ----- client -----
+
+class ControlClient:
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._pending_events = []
+
+    @classmethod
+    def connect(cls, app_dir: Path) -> Optional["ControlClient"]:
+        """Connect to the running instance, or return None if there is none."""
+        key = _load_key(app_dir, create=False)
+        if key is None:
+            return None
+        addr = address(app_dir)
+        if sys.platform != "win32" and not os.path.exists(addr):
+            return None
+        try:
+            return cls(Client(addr, authkey=key))
+        except Exception:
+            # Includes access denied to an elevated server's pipe (see the module docstring)
+            return None
+
+    def call(self, method: str, **params):
+        self._next_id += 1
+        req_id = self._next_id
+        _send(self.conn, self._lock, {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params})
+        while True:
+            message = json.loads(self.conn.recv_bytes().decode("utf-8"))
+            if message.get("id") == req_id:
+                if "error" in message:
+                    raise RpcError(message["error"]["code"], message["error"]["message"])
+                return message.get("result")
+            if message.get("method") == "event":
+                self._pending_events.append(message["params"])
+
+    def subscribe(self, topics: List[str], callback: Callable[[str, object], None]):
+        """Subscribe and block, calling callback(topic, data) for each event."""
+        self.call("subscribe", topics=topics)
+        for event in self._pending_events:
+            callback(event["topic"], event["data"])
+        self._pending_events.clear()
+        while True:
+            try:
+                message = json.loads(self.conn.recv_bytes().decode("utf-8"))
+            except (EOFError, OSError):
+                return
+            if message.get("method") == "event":
+                params = message["params"]
+                callback(params["topic"], params["data"])
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,249 @@
+"""
+Sorted-merge diff and three-way merge for domain lists.
+
+Inputs are normalized (stripped, lowercased, comments and blank lines
+dropped) and put through an external sort: chunks are sorted in memory,
+spilled to temporary run files and k-way merged, so files larger than RAM
+work. Two sorted streams are then compared with a single merge-join pass.
+
+Results are written to temporary files together with an index of line
+offsets, so a view with millions of lines can be shown without loading it.
+"""
+
+import heapq
+import os
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+import metrics
+
+CHUNK_LINES = 200_000
+
+REMOVED = "removed"   # only in the old/left list
+ADDED = "added"       # only in the new/right list
+COMMON = "common"
+
+Source = Union[str, Path, Iterable[str]]
+
+
+def normalize(line: str) -> str:
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return ""
+    return line.lower()
+
+
+def _iter_lines(source: Source) -> Iterator[str]:
+    if isinstance(source, (str, Path)):
+        with open(source, "r", encoding="utf-8", errors="ignore") as f:
+            yield from f
+    else:
+        yield from source
+
+
+def _spill(chunk: List[str], tmp_dir: str) -> str:
+    chunk.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.writelines(x + "\n" for x in chunk)
+    return path
+
+
+def _read_run(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def iter_sorted(source: Source, chunk_lines: int = CHUNK_LINES, tmp_dir: Optional[str] = None,
+                prepare: Optional[Callable[[str], str]] = normalize) -> Iterator[str]:
+    """Yield the normalized, de-duplicated entries of source in sorted order.
+
+    prepare=None sorts the lines as given (they must not contain newlines).
+    """
+    runs = []
+    chunk = []
+    try:
+        for raw in _iter_lines(source):
+            entry = prepare(raw) if prepare else raw
+            if entry:
+                chunk.append(entry)
+                if len(chunk) >= chunk_lines:
+                    runs.append(_spill(chunk, tmp_dir))
+                    chunk = []
+        if runs:
+            if chunk:
+                runs.append(_spill(chunk, tmp_dir))
+                chunk = []
+            merged = heapq.merge(*[_read_run(r) for r in runs])
+        else:
+            chunk.sort()
+            merged = iter(chunk)
+
+        prev = None
+        for entry in merged:
+            if entry != prev:
+                yield entry
+                prev = entry
+    finally:
+        for r in runs:
+            try:
+                os.unlink(r)
+            except OSError:
+                pass
+
+
+def merge_join(left: Iterator[str], right: Iterator[str]) -> Iterator[tuple]:
+    """Walk two sorted unique streams, yielding (view, entry)."""
+    sentinel = None
+    a = next(left, sentinel)
+    b = next(right, sentinel)
+    while a is not sentinel or b is not sentinel:
+        if b is sentinel or (a is not sentinel and a < b):
+            yield REMOVED, a
+            a = next(left, sentinel)
+        elif a is sentinel or b < a:
+            yield ADDED, b
+            b = next(right, sentinel)
+        else:
+            yield COMMON, a
+            a = next(left, sentinel)
+            b = next(right, sentinel)
+
+
+class LineView:
+    """A file of result lines plus the byte offset of each line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = array("q")
+        self._f = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def line(self, i: int) -> str:
+        if self._f is None:
+            self._f = open(self.path, "rb")
+        self._f.seek(self.offsets[i])
+        return self._f.readline().decode("utf-8").rstrip("\n")
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class _ViewWriter:
+    def __init__(self, tmp_dir: Optional[str]):
+        fd, path = tempfile.mkstemp(suffix=".lst", dir=tmp_dir)
+        self.view = LineView(path)
+        self._f = os.fdopen(fd, "wb")
+        self._pos = 0
+
+    def add(self, entry: str):
+        data = entry.encode("utf-8") + b"\n"
+        self.view.offsets.append(self._pos)
+        self._f.write(data)
+        self._pos += len(data)
+
+    def close(self) -> LineView:
+        self._f.close()
+        return self.view
+
+
+class DiffResult:
+    def __init__(self, views: dict):
+        self.views = views
+
+    def counts(self) -> dict:
+        return {k: len(v) for k, v in self.views.items()}
+
+    def __getitem__(self, view: str) -> LineView:
+        return self.views[view]
+
+    def close(self):
+        for v in self.views.values():
+            v.close()
+
+
+@metrics.timed("lists.diff")
+def diff(old: Source, new: Source, tmp_dir: Optional[str] = None,
+         progress: Optional[Callable[[int], None]] = None) -> DiffResult:
+    """Diff two lists into removed/added/common views."""
+    writers = {}
+    try:
+        for k in (REMOVED, ADDED, COMMON):
+            writers[k] = _ViewWriter(tmp_dir)
+        n = 0
+        for view, entry in merge_join(iter_sorted(old, tmp_dir=tmp_dir),
+                                      iter_sorted(new, tmp_dir=tmp_dir)):
+            writers[view].add(entry)
+            n += 1
+            if progress and n % 100_000 == 0:
+                progress(n)
+    except BaseException:
+        # Nobody gets the views to close: remove their files here
+        for w in writers.values():
+            w.close().close()
+        raise
+    return DiffResult({k: w.close() for k, w in writers.items()})
+
+
+def new_entries(current: Source, incoming: Source) -> Iterator[str]:
+    """Entries of incoming that are not in current, in sorted order."""
+    for view, entry in merge_join(iter_sorted(current), iter_sorted(incoming)):
+        if view == ADDED:
+            yield entry
+
+
+@metrics.timed("lists.merge3")
+def merge3(base: Source, local: Source, upstream: Source, out_path: Union[str, Path],
+           tmp_dir: Optional[str] = None) -> dict:
+    """Three-way merge of domain sets, written sorted to out_path.
+
+    An entry is kept if both sides have it, or if one side added it
+    relative to base; an entry removed on either side is dropped.
+    Returns counts of what each side contributed.
+    """
+    stats = {"kept": 0, "added_local": 0, "added_upstream": 0,
+             "removed_local": 0, "removed_upstream": 0}
+    streams = [iter_sorted(s, tmp_dir=tmp_dir) for s in (base, local, upstream)]
+    heads = [next(s, None) for s in streams]
+    tmp_out = str(out_path) + ".tmp"
+    with open(tmp_out, "w", encoding="utf-8") as out:
+        while any(h is not None for h in heads):
+            key = min(h for h in heads if h is not None)
+            in_base, in_local, in_up = (h == key for h in heads)
+            keep = False
+            if in_local and in_up:
+                keep = True
+            elif in_local:
+                if in_base:
+                    stats["removed_upstream"] += 1
+                else:
+                    keep = True
+                    stats["added_local"] += 1
+            elif in_up:
+                if in_base:
+                    stats["removed_local"] += 1
+                else:
+                    keep = True
+                    stats["added_upstream"] += 1
+            if keep:
+                out.write(key + "\n")
+                stats["kept"] += 1
+            heads = [next(s, None) if h == key else h for s, h in zip(streams, heads)]
+    os.replace(tmp_out, out_path)
+    return stats
@@ -0,0 +1,382 @@
+"""
+Streaming linter and normalizer for list files.
+
+A list is read as a stream of Records and pushed through composable stages
+(plain generator functions), so files of any size are processed line by
+line. Typical use:
+
+    report = lint_file(path, out_path, stages=default_stages(sort_entries=True))
+
+Stages:
+    normalize()   lowercase, strip URLs/ports/wildcards/trailing dots/stray text,
+                  convert IDN to punycode (fixes are counted as issues)
+    validate()    check hostnames against a compiled grammar; IPs and CIDRs pass
+    drop_invalid(), strip_comments(), filter_tlds(), sort(), dedupe()
+
+sort() uses the external sort from listdiff, and dedupe() after sort() only
+compares neighbours, so that combination runs in bounded memory. Without
+sort(), dedupe() has to remember the (hashed) entries it has seen.
+"""
+
+import hashlib
+import ipaddress
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import listdiff
+import metrics
+
+# Record kinds
+DOMAIN = "domain"
+IP = "ip"
+COMMENT = "comment"
+BLANK = "blank"
+INVALID = "invalid"
+
+_LABEL = r"(?!-)[a-z0-9-]{1,63}(?<!-)"
+HOSTNAME_RE = re.compile(rf"^(?:{_LABEL}\.)+(?:[a-z]{{2,63}}|xn--[a-z0-9-]{{1,59}})$")
+_SCHEME_RE = re.compile(r"^[a-z][a-z0-9+.-]*://")
+
+
+class Record:
+    __slots__ = ("line_no", "text", "kind", "issues", "comments")
+
+    def __init__(self, line_no: int, text: str, kind: str = DOMAIN):
+        self.line_no = line_no
+        self.text = text
+        self.kind = kind
+        self.issues: List[str] = []
+        # Comment lines directly above an entry travel with it through sort()
+        self.comments: List[str] = []
+
+    def __repr__(self):
+        return f"Record({self.line_no}, {self.text!r}, {self.kind}, {self.issues})"
+
+
+Stage = Callable[[Iterator[Record]], Iterator[Record]]
+
+
+def read_records(source: Union[str, Path, Iterable[str]]) -> Iterator[Record]:
+    if isinstance(source, (str, Path)):
+        f = open(source, "r", encoding="utf-8", errors="ignore")
+    else:
+        f = None
+    try:
+        for line_no, raw in enumerate(f if f is not None else source, 1):
+            raw = raw.rstrip("\r\n")
+            stripped = raw.strip()
+            if not stripped:
+                yield Record(line_no, "", BLANK)
+            elif stripped.startswith("#"):
+                yield Record(line_no, stripped, COMMENT)
+            else:
+                rec = Record(line_no, raw)
+                if stripped != raw:
+                    rec.issues.append("whitespace")
+                    rec.text = stripped
+                yield rec
+    finally:
+        if f is not None:
+            f.close()
+
+
+# ----- stages -----
+
+def _to_ascii(host: str) -> str:
+    if host.isascii():
+        return host
+    return ".".join(label.encode("idna").decode("ascii") if not label.isascii() else label
+                    for label in host.split("."))
+
+
+def normalize() -> Stage:
+    def stage(records):
+        for rec in records:
+            if rec.kind not in (DOMAIN, IP):
+                yield rec
+                continue
+            text = rec.text
+            # Inline comments / extra columns
+            if "#" in text:
+                text = text.split("#", 1)[0].strip()
+                rec.issues.append("inline-comment")
+            if " " in text or "\t" in text:
+                text = text.split()[0]
+                rec.issues.append("whitespace")
+            lower = text.lower()
+            if lower != text:
+                rec.issues.append("case")
+                text = lower
+            if _SCHEME_RE.match(text):
+                text = _SCHEME_RE.sub("", text)
+                text = re.split(r"[/?#]", text, 1)[0]
+                text = text.rsplit("@", 1)[-1]
+                rec.issues.append("url")
+            elif "/" in text and not _looks_like_network(text):
+                text = text.split("/", 1)[0]
+                rec.issues.append("url")
+            if text.count(":") == 1 and not _looks_like_network(text):
+                host, port = text.split(":")
+                if port.isdigit():
+                    text = host
+                    rec.issues.append("port")
+            if text.startswith("*."):
+                text = text[2:]
+                rec.issues.append("wildcard")
+            elif text.startswith("."):
+                text = text.lstrip(".")
+                rec.issues.append("leading-dot")
+            if text.endswith("."):
+                text = text.rstrip(".")
+                rec.issues.append("trailing-dot")
+            try:
+                ascii_text = _to_ascii(text)
+                if ascii_text != text:
+                    rec.issues.append("idn")
+                    text = ascii_text
+            except UnicodeError:
+                rec.kind = INVALID
+                rec.issues.append("bad-idn")
+            rec.text = text
+            yield rec
+    return stage
+
+
+def _looks_like_network(text: str) -> bool:
+    # Cheap pre-check: hostnames rarely start with a digit, IPv6 has colons
+    if not text or not (text[0].isdigit() or ":" in text):
+        return False
+    try:
+        ipaddress.ip_network(text, strict=False)
+        return True
+    except ValueError:
+        return False
+
+
+def validate() -> Stage:
+    def stage(records):
+        for rec in records:
+            if rec.kind in (DOMAIN, IP):
+                text = rec.text
+                if _looks_like_network(text):
+                    rec.kind = IP
+                elif len(text) > 253 or not HOSTNAME_RE.match(text):
+                    rec.kind = INVALID
+                    rec.issues.append("bad-hostname")
+                else:
+                    rec.kind = DOMAIN
+            yield rec
+    # run() collects issues right after validation, before anything is dropped
+    stage.observe_after = True
+    return stage
+
+
+def drop_invalid() -> Stage:
+    def stage(records):
+        for rec in records:
+            if rec.kind != INVALID:
+                yield rec
+    return stage
+
+
+def strip_comments(keep_blank: bool = False) -> Stage:
+    def stage(records):
+        for rec in records:
+            if rec.kind == COMMENT or (rec.kind == BLANK and not keep_blank):
+                continue
+            rec.comments = []
+            yield rec
+    return stage
+
+
+def filter_tlds(allow: Optional[Iterable[str]] = None, deny: Optional[Iterable[str]] = None) -> Stage:
+    allow = {t.lower().lstrip(".") for t in allow} if allow else None
+    deny = {t.lower().lstrip(".") for t in deny} if deny else set()
+
+    def stage(records):
+        for rec in records:
+            if rec.kind == DOMAIN:
+                tld = rec.text.rsplit(".", 1)[-1]
+                if (allow is not None and tld not in allow) or tld in deny:
+                    continue
+            yield rec
+    return stage
+
+
+def _attach_comments(records: Iterator[Record]) -> Iterator[Record]:
+    """Fold comment/blank lines into the next entry's `comments`."""
+    pending = []
+    for rec in records:
+        if rec.kind in (COMMENT, BLANK):
+            pending.append(rec.text)
+            continue
+        rec.comments = pending + rec.comments
+        pending = []
+        yield rec
+    if pending:
+        tail = Record(0, "", BLANK)
+        tail.comments = pending
+        yield tail
+
+
+_FIELD = "\x1f"
+_COMMENT_SEP = "\x1e"
+
+
+def _comment_records(comments: List[str]) -> Iterator[Record]:
+    for c in comments:
+        yield Record(0, c, COMMENT if c else BLANK)
+
+
+def sort(tmp_dir: Optional[str] = None) -> Stage:
+    """Sort entries (external sort); comments stay attached to the entry below them."""
+    def stage(records):
+        attached = _attach_comments(records)
+        first = next(attached, None)
+        if first is None:
+            return
+        # The leading comment block stays at the top of the file
+        top, first.comments = first.comments, []
+        yield from _comment_records(top)
+
+        trailing = []
+
+        def encode(recs):
+            for rec in recs:
+                if rec.kind == BLANK and not rec.text:
+                    trailing.extend(rec.comments)
+                    continue
+                yield _FIELD.join((rec.text, rec.kind, str(rec.line_no), ",".join(rec.issues),
+                                   _COMMENT_SEP.join(rec.comments)))
+
+        for line in listdiff.iter_sorted(encode(_chain_one(first, attached)),
+                                         tmp_dir=tmp_dir, prepare=None):
+            text, kind, line_no, issues, comments = line.split(_FIELD)
+            rec = Record(int(line_no), text, kind)
+            rec.issues = issues.split(",") if issues else []
+            yield from _comment_records(comments.split(_COMMENT_SEP) if comments else [])
+            yield rec
+        yield from _comment_records(trailing)
+    return stage
+
+
+def _chain_one(first, rest):
+    yield first
+    yield from rest
+
+
+def dedupe(assume_sorted: bool = False) -> Stage:
+    """Drop repeated entries. With assume_sorted only neighbours are compared."""
+    def stage(records):
+        prev = None
+        seen = set()
+        for rec in records:
+            if rec.kind in (DOMAIN, IP, INVALID):
+                if assume_sorted:
+                    if rec.text == prev:
+                        continue
+                    prev = rec.text
+                else:
+                    key = hashlib.blake2b(rec.text.encode("utf-8"), digest_size=8).digest()
+                    if key in seen:
+                        continue
+                    seen.add(key)
+            yield rec
+    return stage
+
+
+def default_stages(fix: bool = True, sort_entries: bool = False, unique: bool = True,
+                   keep_comments: bool = True, allow_tlds=None, deny_tlds=None,
+                   tmp_dir: Optional[str] = None) -> List[Stage]:
+    stages = [normalize(), validate()] if fix else [validate()]
+    if fix:
+        stages.append(drop_invalid())
+    if not keep_comments:
+        stages.append(strip_comments())
+    if allow_tlds or deny_tlds:
+        stages.append(filter_tlds(allow_tlds, deny_tlds))
+    if sort_entries:
+        stages.append(sort(tmp_dir))
+    if unique:
+        stages.append(dedupe(assume_sorted=sort_entries))
+    return stages
+
+
+# ----- running -----
+
+class LintReport:
+    MAX_SAMPLES = 200
+
+    def __init__(self):
+        self.lines_in = 0
+        self.lines_out = 0
+        self.entries_out = 0
+        self.invalid = 0
+        self.issues: Dict[str, int] = {}
+        self.samples: List[tuple] = []  # (line_no, text, issues)
+
+    def summary(self) -> str:
+        parts = [f"{k}: {v}" for k, v in sorted(self.issues.items(), key=lambda kv: -kv[1])]
+        return f"строк {self.lines_in} → {self.lines_out}, некорректных {self.invalid}" + \
+            (f" ({', '.join(parts)})" if parts else "")
+
+
+def run(source, stages: List[Stage], report: Optional[LintReport] = None) -> Iterator[str]:
+    """Run source through stages, yielding output lines and filling report."""
+    report = report if report is not None else LintReport()
+
+    def counted(records):
+        for rec in records:
+            report.lines_in += 1
+            yield rec
+
+    def observed(records):
+        for rec in records:
+            if rec.issues:
+                for issue in rec.issues:
+                    report.issues[issue] = report.issues.get(issue, 0) + 1
+                if len(report.samples) < report.MAX_SAMPLES:
+                    report.samples.append((rec.line_no, rec.text, list(rec.issues)))
+            if rec.kind == INVALID:
+                report.invalid += 1
+            yield rec
+
+    stream = counted(read_records(source))
+    observing = False
+    for stage in stages:
+        stream = stage(stream)
+        if getattr(stage, "observe_after", False) and not observing:
+            stream = observed(stream)
+            observing = True
+    if not observing:
+        stream = observed(stream)
+
+    for rec in stream:
+        report.lines_out += 1
+        if rec.kind in (DOMAIN, IP, INVALID):
+            report.entries_out += 1
+        yield rec.text
+
+
+def lint(source, stages: Optional[List[Stage]] = None) -> LintReport:
+    """Check a list without writing anything."""
+    report = LintReport()
+    for _ in run(source, stages if stages is not None else [normalize(), validate()], report):
+        pass
+    return report
+
+
+@metrics.timed("lists.lint_file")
+def lint_file(path: Union[str, Path], out_path: Union[str, Path, None] = None,
+              stages: Optional[List[Stage]] = None) -> LintReport:
+    """Transform a list file; out_path defaults to rewriting it in place."""
+    out_path = Path(out_path or path)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    report = LintReport()
+    with open(tmp, "w", encoding="utf-8", newline="\n") as out:
+        for line in run(path, stages if stages is not None else default_stages(), report):
+            out.write(line + "\n")
+    os.replace(tmp, out_path)
+    return report
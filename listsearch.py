@@ -0,0 +1,193 @@
+"""
+Search index over all list files.
+
+Each file gets its own index so a change re-indexes only that file:
+  - exact:     entry -> line numbers
+  - labels:    inverted index of DNS labels, used for domain-suffix queries
+               ("google.com" finds "www.google.com" but not "notgoogle.com")
+  - suffix array over the file's entries for substring queries
+Regex queries scan the entries of every file.
+"""
+
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import metrics
+
+EXACT = "exact"
+SUFFIX = "suffix"
+SUBSTRING = "substring"
+REGEX = "regex"
+
+SEP = "\n"
+KEY = 32  # suffix sort window, chars
+
+
+def _bound(text: str, sa, q: str, lo: int, hi: int, depth: int = 0, upper: bool = False) -> int:
+    """First k in [lo, hi) whose suffix at sa[k] + depth starts with something >= q (> q if upper)."""
+    # Slices are len(q) long: O(|q| log n), and unlike bisect's key= it works before Python 3.10
+    m = len(q)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        p = sa[mid] + depth
+        head = text[p:p + m]
+        if head < q or (upper and head == q):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class FileIndex:
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+        st = path.stat()
+        self.signature = (st.st_mtime_ns, st.st_size)
+
+        self.entries: List[str] = []
+        self.line_numbers = array("i")
+        self.exact: Dict[str, List[int]] = {}
+        self.labels: Dict[str, List[int]] = {}
+
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line_no, raw in enumerate(f, 1):
+                entry = raw.strip().lower()
+                if not entry or entry.startswith("#"):
+                    continue
+                idx = len(self.entries)
+                self.entries.append(entry)
+                self.line_numbers.append(line_no)
+                self.exact.setdefault(entry, []).append(idx)
+                for label in set(entry.split(".")):
+                    self.labels.setdefault(label, []).append(idx)
+
+        self.text = SEP.join(self.entries) + SEP
+        self.starts = array("i")
+        pos = 0
+        for e in self.entries:
+            self.starts.append(pos)
+            pos += len(e) + 1
+        self.sa = self._build_suffix_array()
+
+    def _build_suffix_array(self) -> array:
+        # Suffixes are sorted on KEY-char windows. Only suffixes still inside
+        # their entry after a whole window can tie on it; each such group is
+        # sorted again on the next window, so keys never grow past KEY chars
+        # however long the entries are. Suffixes tying up to SEP keep any
+        # order: a query has no SEP, so it compares the same with all of them.
+        text = self.text
+        positions = [i for i, ch in enumerate(text) if ch != SEP]
+        long = [start + k for start, e in zip(self.starts, self.entries) for k in range(len(e) - KEY + 1)]
+        pending = [(0, len(positions), 0, long)]
+        while pending:
+            lo, hi, depth, candidates = pending.pop()
+            run = positions[lo:hi]
+            run.sort(key=lambda i: text[i + depth:i + depth + KEY])
+            positions[lo:hi] = run
+            windows = Counter(text[i + depth:i + depth + KEY] for i in (run if candidates is None else candidates))
+            for window, n in windows.items():
+                if n > 1 and SEP not in window:
+                    start = _bound(text, positions, window, lo, hi, depth)
+                    pending.append((start, start + n, depth + KEY, None))
+        return array("i", positions)
+
+    def _entry_at(self, pos: int) -> int:
+        return bisect_right(self.starts, pos) - 1
+
+    def find_exact(self, q: str) -> List[int]:
+        return self.exact.get(q, [])
+
+    def find_suffix(self, q: str) -> List[int]:
+        q = q.lstrip("*.")
+        labels = q.split(".")
+        candidates = None
+        for label in labels:
+            posting = self.labels.get(label)
+            if posting is None:
+                return []
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+        dotted = "." + q
+        return [i for i in candidates
+                if self.entries[i] == q or self.entries[i].endswith(dotted)]
+
+    def find_substring(self, q: str) -> List[int]:
+        if not q or SEP in q:
+            return []
+        sa = self.sa
+        lo = _bound(self.text, sa, q, 0, len(sa))
+        hi = _bound(self.text, sa, q, lo, len(sa), upper=True)
+        return sorted({self._entry_at(sa[k]) for k in range(lo, hi)})
+
+    def find_regex(self, pattern: "re.Pattern") -> List[int]:
+        return [i for i, e in enumerate(self.entries) if pattern.search(e)]
+
+
+class SearchIndex:
+    def __init__(self, lists_dir: Path):
+        self.lists_dir = lists_dir
+        self.files: Dict[str, FileIndex] = {}
+        self._lock = threading.Lock()
+
+    @metrics.timed("lists.index_build")
+    def build(self):
+        files = {}
+        if self.lists_dir.exists():
+            for p in sorted(self.lists_dir.glob("*.txt")):
+                try:
+                    files[p.name] = FileIndex(p)
+                except OSError:
+                    pass
+        with self._lock:
+            self.files = files
+
+    @metrics.timed("lists.index_update")
+    def update_file(self, name: str):
+        """Re-index one file after it was added, modified or removed."""
+        path = self.lists_dir / name
+        try:
+            st = path.stat()
+        except OSError:
+            with self._lock:
+                self.files.pop(name, None)
+            return
+        current = self.files.get(name)
+        if current and current.signature == (st.st_mtime_ns, st.st_size):
+            return
+        index = FileIndex(path)
+        with self._lock:
+            self.files[name] = index
+
+    def search(self, query: str, mode: str = SUBSTRING,
+               limit: int = 1000) -> List[Tuple[str, int, str]]:
+        """Return (file name, line number, entry) for matches in all files."""
+        query = query.strip()
+        if not query:
+            return []
+        if mode == REGEX:
+            pattern = re.compile(query, re.IGNORECASE)
+        else:
+            query = query.lower()
+        results = []
+        with self._lock:
+            files = list(self.files.values())
+        for fi in files:
+            if mode == EXACT:
+                hits = fi.find_exact(query)
+            elif mode == SUFFIX:
+                hits = fi.find_suffix(query)
+            elif mode == REGEX:
+                hits = fi.find_regex(pattern)
+            else:
+                hits = fi.find_substring(query)
+            for i in hits:
+                results.append((fi.name, fi.line_numbers[i], fi.entries[i]))
+                if len(results) >= limit:
+                    return results
+        return results
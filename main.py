@@ -7,10 +7,7 @@ import os
 import sys
 import subprocess
 import threading
-import socket
 import time
-import requests
-import zipfile
 import shutil
 import ctypes
 import re
@@ -20,31 +17,13 @@ import logging
 import traceback
 from pathlib import Path
 
-# Setup simple file logging for startup debugging
-# log_file = Path(__file__).parent / "startup.log"
-# logging.basicConfig(
-#     filename=str(log_file),
-#     level=logging.DEBUG,
-#     format='%(asctime)s - %(levelname)s - %(name)s - %(message)s'
-# )
-
-# def handle_exception(exc_type, exc_value, exc_traceback):
-#     if issubclass(exc_type, KeyboardInterrupt):
-#         sys.__excepthook__(exc_type, exc_value, exc_traceback)
-#         return
-#     logging.critical("Uncaught exception", exc_info=(exc_type, exc_value, exc_traceback))
-
-# sys.excepthook = handle_exception
-
-# logging.info("ZapretGUI starting...")
-
-from typing import Optional, Tuple, Dict
-from packaging import version
-
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
+from PyQt6.QtCore import (Qt, QThread, pyqtSignal, QTimer, QObject, QFileSystemWatcher,
+                          QAbstractListModel, QModelIndex)
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout,
-                              QStackedWidget, QFileDialog, QMessageBox)
-from PyQt6.QtGui import QIcon
+                              QStackedWidget, QFileDialog, QMessageBox, QListWidgetItem,
+                              QTableWidgetItem)
+from PyQt6.QtGui import QIcon, QTextCursor, QColor, QPainter, QPen, QPolygonF
+from PyQt6.QtCore import QPointF
 
 from qfluentwidgets import (NavigationInterface, NavigationItemPosition,
                             FluentWindow, SubtitleLabel, BodyLabel,
@@ -52,33 +31,31 @@ from qfluentwidgets import (NavigationInterface, NavigationItemPosition,
                             TextEdit, LineEdit, ComboBox, SwitchButton,
                             CardWidget, IconWidget, ProgressBar, InfoBar,
                             InfoBarPosition, setTheme, Theme, FluentIcon,
-                            NavigationAvatarWidget, isDarkTheme)
-
-# Constants
-GITHUB_REPO = "Flowseal/zapret-discord-youtube"
-GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
-GITHUB_RELEASES_URL = f"https://github.com/{GITHUB_REPO}/releases/latest"
-GUI_VERSION = "2.0.0"
-APP_NAME = f"ZapretGUI v{GUI_VERSION}"
-
-INSTALL_DIR_NAME = "zapret-gui"
-CONFIG_FILE = "zapret_gui_config.json"
-
-
-def get_base_install_dir() -> Path:
-    return Path.home() / INSTALL_DIR_NAME
-
-def get_zapret_dir() -> Path:
-    return get_base_install_dir() / "zapret"
-
-def get_app_dir() -> Path:
-    return get_base_install_dir() / "app"
-
-def is_admin() -> bool:
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except:
-        return False
+                            NavigationAvatarWidget, isDarkTheme, ListView, ListWidget, TableWidget)
+
+from core import (GITHUB_RELEASES_URL, get_base_install_dir, get_zapret_dir, get_app_dir,
+                  is_admin, check_domain, http_get, Config, Installer, ServiceManager)
+from watcher import ZapretWatcher, STRATEGY, LIST, TOGGLE, MODIFIED
+from snapshots import SnapshotStore, SnapshotScheduler
+from ipc import ControlClient, ControlServer, InstanceLock
+import applog
+import health
+import history
+import importers
+import listdiff
+import listsearch
+import metrics
+import necessity
+import procout
+import scancache
+import listlint
+import strategy
+import subscriptions
+import supervisor
+import tuner
+import uistate
+
+log = logging.getLogger("main")
 
 def request_admin_restart() -> bool:
     """Show notification that admin rights are needed. Returns False always."""
@@ -101,318 +78,6 @@ def show_admin_required(parent):
     )
 
 
-class Config:
-    def __init__(self, app_dir: Path):
-        self.config_path = app_dir / CONFIG_FILE
-        self.data = {"theme": "dark", "check_updates": True}
-        self.load()
-
-    def load(self):
-        try:
-            if self.config_path.exists():
-                with open(self.config_path, "r") as f:
-                    self.data.update(json.load(f))
-        except:
-            pass
-
-    def save(self):
-        try:
-            self.config_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.config_path, "w") as f:
-                json.dump(self.data, f, indent=2)
-        except:
-            pass
-
-    def get(self, key, default=None):
-        return self.data.get(key, default)
-
-    def set(self, key, value):
-        self.data[key] = value
-        self.save()
-
-
-class Installer:
-    def __init__(self):
-        self.base_dir = get_base_install_dir()
-        self.zapret_dir = get_zapret_dir()
-        self.app_dir = get_app_dir()
-        self.bin_dir = self.zapret_dir / "bin"
-        self.lists_dir = self.zapret_dir / "lists"
-        self.service_bat = self.zapret_dir / "service.bat"
-
-    def check_installed(self) -> bool:
-        return self.bin_dir.exists() and self.service_bat.exists()
-
-    def get_local_version(self) -> Optional[str]:
-        if not self.service_bat.exists():
-            return None
-        try:
-            with open(self.service_bat, "r", encoding="utf-8", errors="ignore") as f:
-                match = re.search(r'set\s+"LOCAL_VERSION=([^"]+)"', f.read())
-                if match:
-                    return match.group(1)
-        except:
-            pass
-        return None
-
-    def get_latest_tag(self) -> Optional[str]:
-        headers = {"User-Agent": APP_NAME}
-        # Try API first
-        try:
-            response = requests.get(GITHUB_API_URL, headers=headers, timeout=5)
-            if response.status_code == 200:
-                tag = response.json()["tag_name"]
-                print(f"API found tag: {tag}")
-                return tag
-        except Exception as e:
-            print(f"API check failed: {e}")
-            pass
-            
-        # Fallback to web (follows redirects)
-        try:
-            # Added headers because GitHub blocks requests without User-Agent
-            response = requests.get(GITHUB_RELEASES_URL, headers=headers, timeout=10)
-            # URL should be .../releases/tag/v1.9.2
-            if "/releases/tag/" in response.url:
-                tag = response.url.split("/")[-1]
-                print(f"Web found tag: {tag}")
-                return tag
-        except Exception as e:
-            print(f"Web check failed: {e}")
-            pass
-            
-        return None
-
-    def check_updates(self) -> Tuple[bool, str]:
-        latest = self.get_latest_tag()
-        if not latest:
-            return False, ""
-            
-        local = self.get_local_version()
-        if not local:
-            return True, latest
-            
-        try:
-            return version.parse(latest.lstrip('v')) > version.parse(local.lstrip('v')), latest
-        except:
-            return True, latest
-
-    def _get_release_urls(self, tag: str) -> list[str]:
-        """Return list of possible download URLs in order of preference"""
-        # 1. Binary release (zip) - matches user's rar pattern but zip
-        # 2. Source code (zip) - fallback
-        return [
-            f"https://github.com/{GITHUB_REPO}/releases/download/{tag}/zapret-discord-youtube-{tag}.zip",
-            f"https://github.com/{GITHUB_REPO}/archive/refs/tags/{tag}.zip"
-        ]
-
-    def download_and_install(self, progress_callback, reset: bool = False) -> bool:
-        try:
-            self.base_dir.mkdir(parents=True, exist_ok=True)
-            self.zapret_dir.mkdir(parents=True, exist_ok=True)
-            self.app_dir.mkdir(parents=True, exist_ok=True)
-
-            if reset and self.zapret_dir.exists():
-                progress_callback("Удаление старых файлов...", 10)
-                try:
-                    for item in self.zapret_dir.iterdir():
-                        if item.is_dir():
-                            shutil.rmtree(item)
-                        else:
-                            item.unlink()
-                except Exception as e:
-                    print(f"Error cleaning dir: {e}")
-
-            progress_callback("Получение информации о релизе...", 20)
-            tag = self.get_latest_tag()
-            if not tag:
-                progress_callback("Ошибка: Не удалось найти релиз (проверьте интернет)", 0)
-                return False
-
-            progress_callback(f"Скачивание версии {tag}...", 30)
-            headers = {"User-Agent": APP_NAME}
-            
-            # Try URLs in order
-            urls = self._get_release_urls(tag)
-            success = False
-            temp_zip = self.base_dir / "zapret_download.zip"
-
-            for url in urls:
-                try:
-                    print(f"Trying url: {url}")
-                    r = requests.get(url, headers=headers, stream=True, timeout=120)
-                    if r.status_code == 200:
-                        with open(temp_zip, "wb") as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                        success = True
-                        break
-                    else:
-                        print(f"URL failed with status {r.status_code}: {url}")
-                except Exception as e:
-                    print(f"URL download error: {e}")
-            
-            if not success:
-               progress_callback("Ошибка: Не удалось скачать файл релиза (404/Connection Error)", 0)
-               return False
-
-            progress_callback("Распаковка...", 60)
-            extract_dir = self.base_dir / "temp_extract"
-            if extract_dir.exists():
-                shutil.rmtree(extract_dir)
-            extract_dir.mkdir()
-
-            try:
-                with zipfile.ZipFile(temp_zip, 'r') as z:
-                    z.extractall(extract_dir)
-            except zipfile.BadZipFile:
-                 progress_callback("Ошибка: Скачанный файл поврежден или не является zip архивом", 0)
-                 return False
-
-            contents = list(extract_dir.iterdir())
-            source_dir = contents[0] if len(contents) == 1 and contents[0].is_dir() else extract_dir
-
-            progress_callback("Установка файлов...", 80)
-            for item in source_dir.iterdir():
-                if item.name in ["gui", ".git", ".github"]:
-                    continue
-                dest = self.zapret_dir / item.name
-                if dest.exists():
-                    if dest.is_dir():
-                        shutil.rmtree(dest)
-                    else:
-                        dest.unlink()
-                shutil.move(str(item), str(dest))
-
-            shutil.rmtree(extract_dir)
-            if temp_zip.exists():
-                temp_zip.unlink()
-
-            progress_callback("Готово!", 100)
-            return True
-        except Exception as e:
-            progress_callback(f"Ошибка: {str(e)[:50]}", 0)
-            return False
-
-
-class ServiceManager:
-    @staticmethod
-    def stop_service():
-        subprocess.run("net stop zapret", shell=True, capture_output=True,
-                      creationflags=subprocess.CREATE_NO_WINDOW)
-        subprocess.run("taskkill /F /IM winws.exe", shell=True, capture_output=True,
-                      creationflags=subprocess.CREATE_NO_WINDOW)
-        time.sleep(0.5)
-
-    @staticmethod
-    def remove_service():
-        ServiceManager.stop_service()
-        subprocess.run("sc delete zapret", shell=True, capture_output=True,
-                      creationflags=subprocess.CREATE_NO_WINDOW)
-        subprocess.run("sc delete WinDivert", shell=True, capture_output=True,
-                      creationflags=subprocess.CREATE_NO_WINDOW)
-        subprocess.run("sc delete WinDivert14", shell=True, capture_output=True,
-                      creationflags=subprocess.CREATE_NO_WINDOW)
-
-    @staticmethod
-    def install_service(strategy_path: Path, app_dir: Path) -> Tuple[bool, str]:
-        try:
-            with open(strategy_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-
-            game_filter_file = app_dir / "utils" / "game_filter.enabled"
-            game_filter = "1024-65535" if game_filter_file.exists() else "12"
-
-            lines = content.split('\n')
-            args_parts = []
-            capturing = False
-
-            for line in lines:
-                line = line.strip()
-                if 'winws.exe' in line.lower():
-                    capturing = True
-                    idx = line.lower().find('winws.exe')
-                    rest = line[idx + len('winws.exe'):]
-                    rest = rest.lstrip('"').strip()
-                    if rest and rest != '^':
-                        args_parts.append(rest.rstrip('^').strip())
-                elif capturing:
-                    if line.startswith('start ') or line.startswith('::') or line.startswith('rem ') or not line:
-                        break
-                    args_parts.append(line.rstrip('^').strip())
-
-            args = ' '.join(args_parts)
-            bin_path = str(app_dir / "bin")
-            lists_path = str(app_dir / "lists")
-
-            args = args.replace('%BIN%', bin_path + '\\')
-            args = args.replace('%LISTS%', lists_path + '\\')
-            args = args.replace('%~dp0', str(app_dir) + '\\')
-            args = args.replace('%GameFilter%', game_filter)
-            args = args.replace('^!', '!')
-            args = re.sub(r'\s+', ' ', args)
-
-            winws_path = app_dir / "bin" / "winws.exe"
-            ServiceManager.remove_service()
-            time.sleep(0.5)
-
-            subprocess.run("netsh interface tcp set global timestamps=enabled",
-                          shell=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-            bin_path_quoted = f'"{winws_path}"'
-            cmd = f'sc create zapret binPath= "{bin_path_quoted} {args}" DisplayName= "zapret" start= auto'
-            result = subprocess.run(cmd, shell=True, capture_output=True,
-                                   creationflags=subprocess.CREATE_NO_WINDOW)
-
-            if result.returncode != 0:
-                return False, f"sc create failed"
-
-            subprocess.run('sc description zapret "Zapret DPI bypass"',
-                          shell=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-            subprocess.run("sc start zapret", shell=True, capture_output=True,
-                          creationflags=subprocess.CREATE_NO_WINDOW)
-
-            strat_name = strategy_path.stem
-            subprocess.run(f'reg add "HKLM\\System\\CurrentControlSet\\Services\\zapret" /v zapret-discord-youtube /t REG_SZ /d "{strat_name}" /f',
-                          shell=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-            return True, "Служба установлена"
-        except Exception as e:
-            return False, str(e)
-
-    @staticmethod
-    def get_status() -> Dict[str, Tuple[str, bool]]:
-        res = {}
-        try:
-            o = subprocess.check_output('tasklist /FI "IMAGENAME eq winws.exe"',
-                                       creationflags=subprocess.CREATE_NO_WINDOW).decode('cp866', errors='ignore')
-            res["winws"] = ("РАБОТАЕТ", True) if "winws.exe" in o else ("ОСТАНОВЛЕН", False)
-        except:
-            res["winws"] = ("НЕИЗВЕСТНО", False)
-
-        try:
-            o = subprocess.check_output("sc query zapret",
-                                       creationflags=subprocess.CREATE_NO_WINDOW).decode('cp866', errors='ignore')
-            if "RUNNING" in o:
-                res["zapret"] = ("ЗАПУЩЕНА", True)
-            elif "STOPPED" in o:
-                res["zapret"] = ("ОСТАНОВЛЕНА", False)
-            else:
-                res["zapret"] = ("НЕ УСТАНОВЛЕНА", False)
-        except:
-            res["zapret"] = ("НЕ УСТАНОВЛЕНА", False)
-
-        try:
-            o = subprocess.check_output("sc query WinDivert",
-                                       creationflags=subprocess.CREATE_NO_WINDOW).decode('cp866', errors='ignore')
-            res["windivert"] = ("ЗАГРУЖЕН", True) if "RUNNING" in o else ("ВЫГРУЖЕН", False)
-        except:
-            res["windivert"] = ("НЕ НАЙДЕН", False)
-
-        return res
-
-
 class InstallWorker(QThread):
     progress = pyqtSignal(str, int)
     finished = pyqtSignal(bool)
@@ -430,47 +95,26 @@ class InstallWorker(QThread):
 
 
 class StatusWorker(QThread):
-    result = pyqtSignal(dict, list, list, str)  # status, strategies, lists, version
+    result = pyqtSignal(dict, str)  # status, version
 
-    def __init__(self, zapret_dir, lists_dir):
+    def __init__(self, zapret_dir):
         super().__init__()
         self.zapret_dir = zapret_dir
-        self.lists_dir = lists_dir
 
+    @metrics.timed("status_worker.run")
     def run(self):
         status = ServiceManager.get_status()
-        strategies = []
-        lists = []
         version = "неизвестна"
-        
-        # Find strategy files - look for all .bat files that look like strategies
-        try:
-            if self.zapret_dir.exists():
-                all_bats = list(self.zapret_dir.glob("*.bat"))
-                # Filter out service/utility scripts
-                excluded = {"service.bat", "uninstall.bat", "install.bat", "start.bat", "stop.bat"}
-                strategies = sorted([f.name for f in all_bats 
-                                    if f.name.lower() not in excluded])
-        except Exception as e:
-            print(f"Strategy search error: {e}")
-        
-        # Find list files
-        try:
-            if self.lists_dir.exists():
-                lists = sorted([f.name for f in self.lists_dir.glob("*.txt")])
-        except Exception as e:
-            print(f"Lists search error: {e}")
 
         # Get version
         try:
             # 1. Try to get from GitHub API (Most reliable for "latest release")
             try:
                 if not version or version == "неизвестна":
-                    import requests
                     # Try API first
                     try:
                         headers = {"User-Agent": "ZapretGUI"}
-                        resp = requests.get("https://api.github.com/repos/Flowseal/zapret-discord-youtube/releases/latest", headers=headers, timeout=3)
+                        resp = http_get("https://api.github.com/repos/Flowseal/zapret-discord-youtube/releases/latest", headers=headers, timeout=3)
                         if resp.status_code == 200:
                             data = resp.json()
                             version = data.get("tag_name", "неизвестна")
@@ -480,7 +124,7 @@ class StatusWorker(QThread):
                     # Fallback to web if API failed
                     if not version or version == "неизвестна":
                         try:
-                            resp = requests.get("https://github.com/Flowseal/zapret-discord-youtube/releases/latest", timeout=5)
+                            resp = http_get("https://github.com/Flowseal/zapret-discord-youtube/releases/latest", timeout=5)
                             if "/releases/tag/" in resp.url:
                                 version = resp.url.split("/")[-1]
                         except:
@@ -505,16 +149,730 @@ class StatusWorker(QThread):
         except:
             pass
             
-        self.result.emit(status, strategies, lists, version)
+        self.result.emit(status, version)
+
+
+class WatcherBridge(QObject):
+    """Feeds QFileSystemWatcher notifications into ZapretWatcher.
+
+    Notifications are coalesced for a short moment and only the directory or
+    file that changed is re-stat'ed. Falls back to polling when the native
+    watcher cannot watch the directories.
+    """
+    changed = pyqtSignal(list)  # list of watcher.ChangeEvent
+
+    DEBOUNCE_MS = 150
+    POLL_MS = 2000
+
+    def __init__(self, zapret_dir, parent=None):
+        super().__init__(parent)
+        self.watcher = ZapretWatcher(zapret_dir)
+        self.watcher.scan()
+        self._pending_dirs = set()
+        self._pending_files = set()
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._flush)
+
+        self._fs = QFileSystemWatcher(self)
+        self._fs.directoryChanged.connect(self._on_dir_changed)
+        self._fs.fileChanged.connect(self._on_file_changed)
+
+        dirs = [d for d in self.watcher.watched_dirs() if Path(d).exists()]
+        failed = self._fs.addPaths(dirs) if dirs else []
+        self._fs.addPaths(self.watcher.watched_files())
+
+        self._poll_timer = None
+        if not dirs or len(failed) == len(dirs):
+            self._poll_timer = QTimer(self)
+            self._poll_timer.setInterval(self.POLL_MS)
+            self._poll_timer.timeout.connect(lambda: self._emit(self.watcher.check()))
+            self._poll_timer.start()
+
+    def _on_dir_changed(self, path):
+        self._pending_dirs.add(path)
+        self._debounce.start()
+
+    def _on_file_changed(self, path):
+        self._pending_files.add(path)
+        self._debounce.start()
+
+    def _flush(self):
+        events = []
+        checked_kinds = set()
+        for d in self._pending_dirs:
+            kind = self.watcher.kind_for_dir(Path(d))
+            # A change in the root can be lists/ or utils/ appearing or being replaced
+            for k in (list(self.watcher.dirs) if kind == STRATEGY else [kind] if kind else []):
+                if k not in checked_kinds:
+                    checked_kinds.add(k)
+                    events.extend(self.watcher.check(k))
+        for f in self._pending_files:
+            if self.watcher.kind_for_dir(Path(f).parent) not in checked_kinds:
+                events.extend(self.watcher.check_file(Path(f)))
+        self._pending_dirs.clear()
+        self._pending_files.clear()
+
+        # Editors often replace files atomically, and an update replaces lists/, which
+        # drops them from the watch; directories created after startup aren't watched yet
+        watched = set(self._fs.files()) | set(self._fs.directories())
+        missing = [p for p in self.watcher.watched_dirs() + self.watcher.watched_files()
+                   if p not in watched and Path(p).exists()]
+        if missing:
+            self._fs.addPaths(missing)
+        self._emit(events)
+
+    def _emit(self, events):
+        if events:
+            self.changed.emit(events)
+
+    def stop(self):
+        if self._poll_timer:
+            self._poll_timer.stop()
+        paths = self._fs.files() + self._fs.directories()
+        if paths:
+            self._fs.removePaths(paths)
+
+
+class ControlBridge(QObject):
+    """Exposes the running window over ipc.ControlServer.
+
+    Requests arrive on server threads; anything that touches widgets or the
+    watcher is run on the GUI thread through a queued signal and waited for.
+    The bridge outlives windows recreated after install or reset.
+    """
+    _invoke = pyqtSignal(object)
+
+    GUI_TIMEOUT = 10
+
+    def __init__(self, app_dir, parent=None):
+        super().__init__(parent)
+        self.window = None
+        self.last_status = None
+        self.last_version = None
+        self.updated = None
+        self._invoke.connect(self._run, Qt.ConnectionType.QueuedConnection)
+        self.server = ControlServer(app_dir, {
+            "show": lambda: self._on_gui(self._show),
+            "refresh": lambda: self._on_gui(self._refresh),
+            "status": self._status,
+            "strategies": lambda: self._on_gui(lambda: self._watcher_names("strategies")),
+            "lists": lambda: self._on_gui(lambda: self._watcher_names("lists")),
+            "search": self._search,
+            "metrics": self._metrics,
+        })
+
+    def start(self):
+        self.server.start()
+
+    def stop(self):
+        self.server.stop()
+
+    def attach(self, window):
+        self.window = window
+
+    def _run(self, job):
+        job()
+
+    def _on_gui(self, func):
+        done = threading.Event()
+        box = {}
+
+        def job():
+            try:
+                box["result"] = func()
+            except Exception as e:
+                box["error"] = e
+            finally:
+                done.set()
+
+        self._invoke.emit(job)
+        if not done.wait(self.GUI_TIMEOUT):
+            raise TimeoutError("GUI thread did not respond")
+        if "error" in box:
+            raise box["error"]
+        return box.get("result")
+
+    def _show(self):
+        self.window.showNormal()
+        self.window.raise_()
+        self.window.activateWindow()
+        return True
+
+    def _refresh(self):
+        if hasattr(self.window, 'status_page'):
+            self.window._refresh_data()
+        return True
+
+    def _watcher_names(self, what):
+        fs_watcher = getattr(self.window, 'fs_watcher', None)
+        return getattr(fs_watcher.watcher, what)() if fs_watcher else []
+
+    def _status(self):
+        status = self.last_status if self.last_status is not None else ServiceManager.get_status()
+        return {
+            "installed": self.window is not None and hasattr(self.window, 'status_page'),
+            "version": self.last_version,
+            "admin": bool(is_admin()),
+            "status": ServiceManager.status_json(status),
+            "updated": self.updated,
+        }
+
+    def _search(self, query, mode=listsearch.SUBSTRING, limit=1000):
+        index = getattr(self.window, 'search_index', None)
+        if index is None:
+            return []
+        return index.search(query, mode, limit)
+
+    def _metrics(self, prometheus=False):
+        return metrics.REGISTRY.render_prometheus() if prometheus else metrics.REGISTRY.snapshot()
+
+    def publish_status(self, status, version):
+        self.last_status = status
+        self.last_version = version
+        self.updated = time.time()
+        self.server.publish("status", {"version": version, "status": ServiceManager.status_json(status)})
+
+    def publish_fs(self, events):
+        self.server.publish("fs", [{"kind": e.kind, "action": e.action, "name": e.name} for e in events])
+
+
+class SupervisorBridge(QObject):
+    """Runs winws.exe under a supervisor.Supervisor and re-emits its callbacks as signals."""
+    sampled = pyqtSignal(object)     # supervisor.Point
+    event = pyqtSignal(str, dict)    # kind, info
+    switched = pyqtSignal(str, object, str)  # strategy, gap in seconds or None, error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.supervisor = None
+        self.strategy_name = None
+        self.output = procout.LineRing()  # winws console output, kept across restarts
+        self._lock = threading.Lock()
+
+    def switch(self, path, zapret_dir):
+        """Check the strategy in the background, then move winws over to it in one step.
+
+        Nothing is stopped when the check fails; the result arrives as switched.
+        """
+        threading.Thread(target=self.switch_now, args=(path, zapret_dir), daemon=True).start()
+
+    def switch_now(self, path, zapret_dir) -> bool:
+        """Blocking switch() for callers already off the GUI thread; True when winws started."""
+        prepared = strategy.prepare(path, zapret_dir)
+        if not prepared.ok:
+            self.switched.emit(prepared.name, None, "; ".join(prepared.problems))
+            return False
+        with self._lock:
+            self.strategy_name = prepared.name
+            self.output.append(f"[supervisor] {prepared.name}: {prepared.cmdline}")
+            if self.supervisor is None:
+                self.supervisor = supervisor.Supervisor(
+                    prepared.cmdline, zapret_dir / "bin", on_event=self._on_event,
+                    on_sample=self.sampled.emit, output=self.output)
+            gap = self.supervisor.switch(prepared.cmdline)
+        if gap is not None:
+            metrics.observe("winws.switch_gap", gap)
+        self.switched.emit(prepared.name, gap, "")
+        return True
+
+    def active_strategy(self):
+        """Name of the strategy winws runs under the supervisor, or None."""
+        return self.strategy_name if self.supervisor else None
+
+    def stop(self):
+        with self._lock:
+            sup, self.supervisor = self.supervisor, None
+        if sup:
+            sup.stop()
+            self.event.emit(supervisor.STOPPED, {"strategy": self.strategy_name})
+
+    def _on_event(self, kind, info):
+        log.info("winws %s: %s", kind, info)
+        self.event.emit(kind, dict(info, strategy=self.strategy_name))
+
+
+class DiffWorker(QThread):
+    done = pyqtSignal(object, str)  # DiffResult or merge stats, error
+
+    def __init__(self, old, new, base=None, out_path=None):
+        super().__init__()
+        self.old = old
+        self.new = new
+        self.base = base
+        self.out_path = out_path
+
+    def run(self):
+        try:
+            if self.base is not None:
+                stats = listdiff.merge3(self.base, self.old, self.new, self.out_path)
+                self.done.emit(stats, "")
+            else:
+                self.done.emit(listdiff.diff(self.old, self.new), "")
+        except Exception as e:
+            self.done.emit(None, str(e))
+
+
+class LintWorker(QThread):
+    done = pyqtSignal(object, str)  # (report, fixed text) or None, error
+
+    def __init__(self, lines):
+        super().__init__()
+        self.lines = lines
+
+    def run(self):
+        try:
+            report = listlint.LintReport()
+            fixed = "\n".join(listlint.run(self.lines, listlint.default_stages(), report)) + "\n"
+            self.done.emit((report, fixed), "")
+        except Exception as e:
+            self.done.emit(None, str(e))
+
+
+class NecessityWorker(QThread):
+    progress = pyqtSignal(str)
+    done = pyqtSignal(object, str)  # necessity.Report or None, error
+
+    def __init__(self, lines, bypass, report_path):
+        super().__init__()
+        self.lines = lines
+        self.bypass = bypass
+        self.report_path = report_path
+
+    def run(self):
+        try:
+            domains = necessity.list_domains(self.lines)
+            step = max(1, len(domains) // 100)
+            titles = {"direct": "без обхода", "bypass": "с обходом"}
+
+            def on_progress(phase, done, total):
+                if done % step == 0 or done == total:
+                    self.progress.emit(f"Проверка {titles[phase]}: {done} / {total}")
+
+            report = necessity.analyze(domains, tuner.https_reachable, self.bypass, progress=on_progress)
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                json.dump(report.to_json(), f, ensure_ascii=False, indent=1)
+            self.done.emit(report, "")
+        except Exception as e:
+            self.done.emit(None, str(e))
+
+
+class LineViewModel(QAbstractListModel):
+    """Reads rows from a listdiff.LineView on demand."""
+
+    def __init__(self, view=None, parent=None):
+        super().__init__(parent)
+        self.view = view
+
+    def set_view(self, view):
+        self.beginResetModel()
+        self.view = view
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self.view) if self.view is not None and not parent.isValid() else 0
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self.view.line(index.row())
+        return None
+
+
+class RingModel(QAbstractListModel):
+    """Virtualized rows polled from a ring buffer.
+
+    Records are tuples starting with a growing sequence number. The model
+    keeps at most `capacity` of them, like the ring it mirrors; rows are the
+    records passing _matches(), trimmed from the front as records age out.
+    """
+
+    def __init__(self, capacity, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.records = []
+        self.rows = []
+
+    def _matches(self, rec):
+        return True
+
+    def _format(self, rec):
+        raise NotImplementedError
+
+    def _color(self, rec):
+        return None
+
+    def append(self, records):
+        self.records.extend(records)
+        overflow = len(self.records) - self.capacity
+        if overflow > 0:
+            del self.records[:overflow]
+            oldest = self.records[0][0]
+            stale = 0
+            while stale < len(self.rows) and self.rows[stale][0] < oldest:
+                stale += 1
+            if stale:
+                self.beginRemoveRows(QModelIndex(), 0, stale - 1)
+                del self.rows[:stale]
+                self.endRemoveRows()
+        new = [r for r in records if self._matches(r)]
+        if new:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            self.rows.extend(new)
+            self.endInsertRows()
+
+    def refilter(self):
+        self.beginResetModel()
+        self.rows = [r for r in self.records if self._matches(r)]
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.records = []
+        self.rows = []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        rec = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._format(rec)
+        if role == Qt.ItemDataRole.ForegroundRole:
+            color = self._color(rec)
+            return QColor(color) if color else None
+        return None
+
+
+class ConsoleModel(RingModel):
+    """procout.LineRing lines, optionally filtered by a search string."""
+
+    def __init__(self, parent=None):
+        super().__init__(procout.CAPACITY, parent)
+        self.text = ""
+
+    def _matches(self, rec):
+        return not self.text or self.text in rec[2].lower()
+
+    def _format(self, rec):
+        return rec[2]
+
+    def _color(self, rec):
+        return "#4cc2ff" if rec[2].startswith("[supervisor]") else None
+
+    def set_filter(self, text):
+        self.text = text.strip().lower()
+        self.refilter()
+
+
+class DiffWindow(QWidget):
+    """Removed/added/common views of a list diff."""
+    add_requested = pyqtSignal(list)
+
+    VIEWS = [(listdiff.ADDED, "Только во втором"), (listdiff.REMOVED, "Только в текущем"),
+             (listdiff.COMMON, "Общие")]
+
+    def __init__(self, result, title, parent=None):
+        super().__init__(parent, Qt.WindowType.Window)
+        self.result = result
+        self.setWindowTitle(title)
+        self.resize(600, 700)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+
+        counts = result.counts()
+        layout.addWidget(SubtitleLabel(title))
+        layout.addWidget(BodyLabel(
+            f"Новых: {counts[listdiff.ADDED]}   Отсутствуют во втором: {counts[listdiff.REMOVED]}   "
+            f"Общих: {counts[listdiff.COMMON]}"))
+
+        self.view_combo = ComboBox()
+        for key, label in self.VIEWS:
+            self.view_combo.addItem(f"{label} ({counts[key]})", key)
+        self.view_combo.currentIndexChanged.connect(self._on_view_changed)
+        layout.addWidget(self.view_combo)
+
+        self.model = LineViewModel(result[listdiff.ADDED], self)
+        self.list_view = ListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.model)
+        layout.addWidget(self.list_view)
+
+        self.add_btn = PrimaryPushButton("📥 Добавить новые в список")
+        self.add_btn.clicked.connect(lambda: self.add_requested.emit(list(result[listdiff.ADDED])))
+        self.add_btn.setEnabled(counts[listdiff.ADDED] > 0)
+        layout.addWidget(self.add_btn)
+
+    def _on_view_changed(self, idx):
+        self.model.set_view(self.result[self.view_combo.itemData(idx)])
+
+    def closeEvent(self, event):
+        self.model.set_view(None)
+        self.result.close()
+        super().closeEvent(event)
+
+
+class ExtractWorker(QThread):
+    done = pyqtSignal(object, object, str)  # importers.Ranking, new (host, count) pairs, error
+
+    def __init__(self, path, kind, existing):
+        super().__init__()
+        self.path = path
+        self.kind = kind
+        self.existing = existing
+
+    def run(self):
+        try:
+            ranking = importers.rank(self.path, self.kind)
+            self.done.emit(ranking, importers.new_hosts(ranking, self.existing), "")
+        except Exception as e:
+            self.done.emit(None, None, str(e))
+
+
+class ImportWorker(QThread):
+    done = pyqtSignal(object, object, str)  # importers.Stats, new entries, error
+
+    def __init__(self, path, kind, existing):
+        super().__init__()
+        self.path = path
+        self.kind = kind
+        self.existing = existing
+
+    def run(self):
+        try:
+            stats = importers.Stats(self.kind)
+            to_add = list(listdiff.new_entries(self.existing, importers.parse(self.path, self.kind, stats)))
+            self.done.emit(stats, to_add, "")
+        except Exception as e:
+            self.done.emit(None, None, str(e))
+
+
+class HostPickWindow(QWidget):
+    """Hostnames found in a capture or log, most frequent first, to pick for the list."""
+    add_requested = pyqtSignal(list)
+    MAX_ROWS = 5000
+
+    def __init__(self, ranking, hosts, title, parent=None):
+        super().__init__(parent, Qt.WindowType.Window)
+        self.setWindowTitle(title)
+        self.resize(600, 700)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+        layout.addWidget(SubtitleLabel(title))
+        info = BodyLabel(f"{ranking.summary()}\nНе покрыто списком: {len(hosts)}"
+                         + (f", показаны первые {self.MAX_ROWS}" if len(hosts) > self.MAX_ROWS else ""))
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        self.filter = LineEdit()
+        self.filter.setPlaceholderText("Фильтр...")
+        self.filter.textChanged.connect(self._apply_filter)
+        layout.addWidget(self.filter)
+
+        self.list = ListWidget()
+        for host, count in hosts[:self.MAX_ROWS]:
+            item = QListWidgetItem(f"{host}  ({count})")
+            item.setData(Qt.ItemDataRole.UserRole, host)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            self.list.addItem(item)
+        layout.addWidget(self.list)
+
+        row = QHBoxLayout()
+        all_btn = PushButton("Отметить видимые")
+        all_btn.clicked.connect(lambda: self._check_visible(Qt.CheckState.Checked))
+        row.addWidget(all_btn)
+        none_btn = PushButton("Снять отметки")
+        none_btn.clicked.connect(lambda: self._check_visible(Qt.CheckState.Unchecked))
+        row.addWidget(none_btn)
+        row.addStretch()
+        add_btn = PrimaryPushButton("📥 Добавить отмеченные")
+        add_btn.clicked.connect(self._add)
+        row.addWidget(add_btn)
+        layout.addLayout(row)
+
+    def _items(self):
+        return (self.list.item(i) for i in range(self.list.count()))
+
+    def _apply_filter(self, text):
+        text = text.strip().lower()
+        for item in self._items():
+            item.setHidden(bool(text) and text not in item.data(Qt.ItemDataRole.UserRole))
+
+    def _check_visible(self, state):
+        for item in self._items():
+            if not item.isHidden():
+                item.setCheckState(state)
+
+    def _add(self):
+        hosts = [item.data(Qt.ItemDataRole.UserRole) for item in self._items()
+                 if item.checkState() == Qt.CheckState.Checked]
+        if hosts:
+            self.add_requested.emit(hosts)
+            self.close()
+
+
+class SubscriptionWorker(QThread):
+    done = pyqtSignal(object, str)  # result of the call, error
+
+    def __init__(self, func, *args):
+        super().__init__()
+        self.func = func
+        self.args = args
+
+    def run(self):
+        try:
+            self.done.emit(self.func(*self.args), "")
+        except Exception as e:
+            self.done.emit(None, str(e))
+
+
+class SubscriptionsWindow(QWidget):
+    """Subscriptions of one list: add by URL, remove, fetch now."""
+    COLUMNS = ["Адрес", "Формат", "Записей", "Проверено", "Состояние"]
+
+    def __init__(self, subs, list_name, parent=None):
+        super().__init__(parent, Qt.WindowType.Window)
+        self.subs = subs
+        self.list_name = list_name
+        self._worker = None
+        self.setWindowTitle(f"Подписки — {list_name}")
+        self.resize(820, 480)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+        layout.addWidget(SubtitleLabel(f"Подписки — {list_name}"))
+        hint = BodyLabel("Списки по ссылкам проверяются раз в несколько часов и добавляются в этот файл. "
+                         "При отписке удаляются только записи, которых нет в других подписках и "
+                         "которые не были в списке раньше.")
+        hint.setWordWrap(True)
+        hint.setStyleSheet("color: #888;")
+        layout.addWidget(hint)
+
+        self.table = TableWidget()
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(TableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(TableWidget.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table, 1)
+
+        row = QHBoxLayout()
+        self.url_edit = LineEdit()
+        self.url_edit.setPlaceholderText("https://... (обычный список, hosts, AdBlock, dnsmasq, CSV; .gz/.zip)")
+        self.url_edit.returnPressed.connect(self._subscribe)
+        row.addWidget(self.url_edit, 1)
+        self.add_btn = PrimaryPushButton("➕ Подписаться")
+        self.add_btn.clicked.connect(self._subscribe)
+        row.addWidget(self.add_btn)
+        layout.addLayout(row)
+
+        row = QHBoxLayout()
+        self.update_btn = PushButton("🔄 Обновить сейчас")
+        self.update_btn.clicked.connect(self._update_now)
+        row.addWidget(self.update_btn)
+        self.remove_btn = PushButton("🗑 Отписаться")
+        self.remove_btn.clicked.connect(self._unsubscribe)
+        row.addWidget(self.remove_btn)
+        row.addStretch()
+        layout.addLayout(row)
+
+        self.refresh_table()
+
+    @staticmethod
+    def _state(sub):
+        if sub["error"]:
+            return f"Ошибка: {sub['error']}"
+        if sub["status"] is None:
+            return "Ещё не загружена"
+        if sub["changed"]:
+            return f"Изменена {time.strftime('%d.%m %H:%M', time.localtime(sub['changed']))}"
+        return "Без изменений"
+
+    def refresh_table(self):
+        self._rows = self.subs.subscriptions(self.list_name)
+        self.table.setRowCount(len(self._rows))
+        for i, sub in enumerate(self._rows):
+            checked = time.strftime("%d.%m %H:%M", time.localtime(sub["checked"])) if sub["checked"] else "—"
+            cells = [sub["url"], sub["format"] or "авто", str(sub["entries"]), checked, self._state(sub)]
+            for col, text in enumerate(cells):
+                self.table.setItem(i, col, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+    def _run(self, func, *args):
+        for btn in (self.add_btn, self.update_btn, self.remove_btn):
+            btn.setEnabled(False)
+        self._worker = SubscriptionWorker(func, *args)
+        self._worker.done.connect(self._on_done)
+        self._worker.start()
+
+    def _on_done(self, results, error):
+        for btn in (self.add_btn, self.update_btn, self.remove_btn):
+            btn.setEnabled(True)
+        self.refresh_table()
+        if error:
+            InfoBar.error("Ошибка", error, parent=self)
+            return
+        if isinstance(results, dict):
+            results = [results]
+        added = sum(r["added"] for r in results)
+        removed = sum(r["removed"] for r in results)
+        InfoBar.success("Подписки", f"Добавлено {added}, удалено {removed}", parent=self,
+                        position=InfoBarPosition.TOP_RIGHT, duration=3000)
+
+    def _subscribe(self):
+        url = self.url_edit.text().strip()
+        if not url:
+            return
+        try:
+            sub = self.subs.add(self.list_name, url)
+        except ValueError as e:
+            InfoBar.error("Ошибка", str(e), parent=self)
+            return
+        self.url_edit.clear()
+        self.refresh_table()
+        self._run(self.subs.refresh, [sub["id"]], True)
+
+    def _update_now(self):
+        self._run(self.subs.refresh, [s["id"] for s in self._rows])
+
+    def _unsubscribe(self):
+        row = self.table.currentRow()
+        if row < 0 or row >= len(self._rows):
+            return
+        sub = self._rows[row]
+        reply = QMessageBox.question(self, "Отписаться",
+                                     f"Отписаться от {sub['url']}?\n"
+                                     "Записи, которые есть только в этой подписке, будут удалены из списка.")
+        if reply == QMessageBox.StandardButton.Yes:
+            self._run(self.subs.remove, sub["id"])
 
 
 # ========== UI Pages ==========
 
 class ListsPage(QWidget):
+    subscriptions_updated = pyqtSignal(list)  # merge results, emitted from the refresh thread
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.lists_dir = None
         self.current_file = "list-general.txt"
+        self._loaded_text = ""
+        self.snapshots = None
+        self.search_index = None
+        self.bypass = None          # callable(on) that stops/restarts winws, set by the window
+        self.bypass_active = None   # callable() -> running strategy or None
+        self.subscriptions = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -556,6 +914,33 @@ class ListsPage(QWidget):
         self.import_btn.clicked.connect(self._import_list)
         btn_row.addWidget(self.import_btn)
 
+        self.diff_btn = PushButton("🔀 Сравнить")
+        self.diff_btn.setStyleSheet("padding: 8px 16px;")
+        self.diff_btn.clicked.connect(self._diff_list)
+        btn_row.addWidget(self.diff_btn)
+
+        self.merge_btn = PushButton("🔗 Слияние")
+        self.merge_btn.setStyleSheet("padding: 8px 16px;")
+        self.merge_btn.clicked.connect(self._merge_list)
+        btn_row.addWidget(self.merge_btn)
+
+        self.lint_btn = PushButton("🧹 Проверить")
+        self.lint_btn.setStyleSheet("padding: 8px 16px;")
+        self.lint_btn.clicked.connect(self._lint_list)
+        btn_row.addWidget(self.lint_btn)
+
+        self.analyze_btn = PushButton("🔬 Анализ")
+        self.analyze_btn.setToolTip("Проверить, каким доменам списка действительно нужен обход")
+        self.analyze_btn.setStyleSheet("padding: 8px 16px;")
+        self.analyze_btn.clicked.connect(self._analyze_list)
+        btn_row.addWidget(self.analyze_btn)
+
+        self.subs_btn = PushButton("🔔 Подписки")
+        self.subs_btn.setToolTip("Списки по ссылкам, которые обновляются и добавляются в этот файл")
+        self.subs_btn.setStyleSheet("padding: 8px 16px;")
+        self.subs_btn.clicked.connect(self._open_subscriptions)
+        btn_row.addWidget(self.subs_btn)
+
         self.save_btn = PrimaryPushButton("💾 Сохранить")
         self.save_btn.setStyleSheet("padding: 8px 16px; background-color: #107c10;")
         self.save_btn.clicked.connect(self._save_list)
@@ -570,6 +955,33 @@ class ListsPage(QWidget):
 
         layout.addLayout(btn_row)
 
+        # Search across all lists
+        search_row = QHBoxLayout()
+        self.search_input = LineEdit()
+        self.search_input.setPlaceholderText("Поиск домена во всех списках...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(lambda: self._search_timer.start())
+        search_row.addWidget(self.search_input)
+
+        self.search_mode = ComboBox()
+        for mode, label in ((listsearch.SUBSTRING, "Подстрока"), (listsearch.SUFFIX, "Домен и поддомены"),
+                            (listsearch.EXACT, "Точно"), (listsearch.REGEX, "Regex")):
+            self.search_mode.addItem(label, mode)
+        self.search_mode.currentIndexChanged.connect(lambda: self._run_search())
+        search_row.addWidget(self.search_mode)
+        layout.addLayout(search_row)
+
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(200)
+        self._search_timer.timeout.connect(self._run_search)
+
+        self.search_results = ListWidget()
+        self.search_results.setMaximumHeight(180)
+        self.search_results.itemClicked.connect(self._on_search_result_clicked)
+        self.search_results.hide()
+        layout.addWidget(self.search_results)
+
         # Editor
         self.editor = TextEdit()
         self.editor.setPlaceholderText("Один домен на строку...\n\nПример:\ndiscord.com\nyoutube.com")
@@ -597,6 +1009,68 @@ class ListsPage(QWidget):
     def set_lists_dir(self, path):
         self.lists_dir = path
 
+    def set_snapshots(self, scheduler):
+        self.snapshots = scheduler
+
+    def set_search_index(self, index):
+        self.search_index = index
+
+    def set_subscriptions(self, subs):
+        self.subscriptions = subs
+        self.subscriptions_updated.connect(self._on_subscriptions_updated)
+
+    def _open_subscriptions(self):
+        if not self.subscriptions:
+            return
+        self._subs_window = SubscriptionsWindow(self.subscriptions, self.current_file, self)
+        self._subs_window.show()
+
+    def _on_subscriptions_updated(self, results):
+        text = ", ".join(f"{r['list']}: +{r['added']} −{r['removed']}" for r in results)
+        InfoBar.info("Подписки обновлены", text, parent=self, position=InfoBarPosition.TOP_RIGHT, duration=4000)
+
+    SEARCH_LIMIT = 500
+
+    def _run_search(self):
+        self.search_results.clear()
+        query = self.search_input.text().strip()
+        if not query or not self.search_index:
+            self.search_results.hide()
+            return
+        mode = self.search_mode.itemData(self.search_mode.currentIndex())
+        try:
+            hits = self.search_index.search(query, mode, limit=self.SEARCH_LIMIT)
+        except re.error as e:
+            self.search_results.addItem(f"Ошибка в выражении: {e}")
+            self.search_results.show()
+            return
+        if not hits:
+            self.search_results.addItem("Ничего не найдено")
+        for name, line_no, entry in hits:
+            item = QListWidgetItem(f"{entry}    —    {name}:{line_no}")
+            item.setData(Qt.ItemDataRole.UserRole, (name, line_no))
+            self.search_results.addItem(item)
+        if len(hits) >= self.SEARCH_LIMIT:
+            self.search_results.addItem(f"Показаны первые {self.SEARCH_LIMIT} совпадений")
+        self.search_results.show()
+
+    def _on_search_result_clicked(self, item):
+        target = item.data(Qt.ItemDataRole.UserRole)
+        if target:
+            self.goto_line(*target)
+
+    def goto_line(self, filename, line_no):
+        if filename != self.current_file:
+            self.file_combo.setCurrentText(filename)
+        block = self.editor.document().findBlockByLineNumber(line_no - 1)
+        if not block.isValid():
+            return
+        cursor = QTextCursor(block)
+        cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock, QTextCursor.MoveMode.KeepAnchor)
+        self.editor.setTextCursor(cursor)
+        self.editor.ensureCursorVisible()
+        self.editor.setFocus()
+
     def update_lists(self, lists):
         current = self.file_combo.currentText()
         self.file_combo.clear()
@@ -613,41 +1087,293 @@ class ListsPage(QWidget):
         path = self.lists_dir / filename
         if path.exists():
             try:
-                self.editor.setPlainText(path.read_text(encoding="utf-8", errors="ignore"))
+                with metrics.span("lists.load"):
+                    self._loaded_text = path.read_text(encoding="utf-8", errors="ignore")
+                    self.editor.setPlainText(self._loaded_text)
             except:
                 pass
 
+    def on_file_changed(self, filename):
+        """Called when a list file was modified by another program."""
+        if filename != self.current_file or not self.lists_dir:
+            return
+        try:
+            text = (self.lists_dir / filename).read_text(encoding="utf-8", errors="ignore")
+        except:
+            return
+        current = self.editor.toPlainText()
+        if text == current:
+            self._loaded_text = text
+            return
+        if current == self._loaded_text:
+            # No unsaved edits - reload in place, keeping the scroll position
+            scroll = self.editor.verticalScrollBar().value()
+            self._loaded_text = text
+            self.editor.setPlainText(text)
+            self.editor.verticalScrollBar().setValue(scroll)
+        else:
+            InfoBar.warning("Файл изменён извне", f"{filename} изменён другой программой. "
+                            "Сохранение перезапишет эти изменения.", parent=self,
+                            position=InfoBarPosition.TOP_RIGHT, duration=5000)
+
     def _save_list(self):
         if not self.lists_dir:
             return
         try:
             path = self.lists_dir / self.current_file
-            path.write_text(self.editor.toPlainText(), encoding="utf-8")
+            text = self.editor.toPlainText()
+            if self.snapshots:
+                self.snapshots.snapshot_before(f"save {self.current_file}")
+            with metrics.span("lists.save"):
+                path.write_text(text, encoding="utf-8")
+            self._loaded_text = text
             InfoBar.success("Сохранено", f"{self.current_file}", parent=self,
                            position=InfoBarPosition.TOP_RIGHT, duration=2000)
         except Exception as e:
             InfoBar.error("Ошибка", str(e), parent=self)
 
     def _import_list(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Импорт списка", "",
-                                               "Text Files (*.txt);;All Files (*)")
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Импорт списка", "",
+            "Списки, HAR, логи (*.txt *.har *.log *.conf *.hosts *.csv *.gz *.zip);;"
+            "Text Files (*.txt);;All Files (*)")
         if not path:
             return
         try:
-            new = set(l.strip().lower() for l in Path(path).read_text(errors='ignore').split('\n')
-                     if l.strip() and not l.startswith('#'))
-            current = set(l.strip().lower() for l in self.editor.toPlainText().split('\n')
-                         if l.strip())
-            to_add = new - current
-            if to_add:
-                txt = self.editor.toPlainText().rstrip() + '\n' + '\n'.join(to_add) + '\n'
-                self.editor.setPlainText(txt)
-                InfoBar.success("Импорт", f"Добавлено {len(to_add)} доменов", parent=self,
-                               position=InfoBarPosition.TOP_RIGHT, duration=2000)
-            else:
-                InfoBar.info("Импорт", "Все домены уже есть", parent=self)
+            kind = importers.sniff(path)
         except Exception as e:
             InfoBar.error("Ошибка", str(e), parent=self)
+            return
+        self._set_busy(True)
+        self.import_btn.setEnabled(False)
+        existing = self.editor.toPlainText().split('\n')
+        if importers.FORMATS[kind].ranked:
+            # Captures and logs: extract hostnames off the GUI thread and let the user pick
+            self._extract_worker = ExtractWorker(path, kind, existing)
+            self._extract_worker.done.connect(lambda r, h, err: self._on_extract_done(r, h, err, Path(path).name))
+            self._extract_worker.start()
+        else:
+            # Lists of any format: only valid, normalized entries make it in
+            self._import_worker = ImportWorker(path, kind, existing)
+            self._import_worker.done.connect(self._on_import_done)
+            self._import_worker.start()
+
+    def _on_import_done(self, stats, to_add, error):
+        self._set_busy(False)
+        self.import_btn.setEnabled(True)
+        if stats is None:
+            InfoBar.error("Ошибка", error, parent=self)
+            return
+        self._append_entries(to_add)
+        if stats.skipped:
+            InfoBar.warning("Импорт", f"Пропущено строк: {stats.skipped} ({stats.summary()})", parent=self,
+                            position=InfoBarPosition.TOP_RIGHT, duration=4000)
+
+    def _on_extract_done(self, ranking, hosts, error, name):
+        self._set_busy(False)
+        self.import_btn.setEnabled(True)
+        if ranking is None:
+            InfoBar.error("Ошибка", error, parent=self)
+            return
+        if not hosts:
+            InfoBar.info("Импорт", f"Новых доменов нет ({ranking.summary()})", parent=self)
+            return
+        self._pick_window = HostPickWindow(ranking, hosts, f"Импорт из {name}", self)
+        self._pick_window.add_requested.connect(self._append_entries)
+        self._pick_window.show()
+
+    def _append_entries(self, to_add):
+        if to_add:
+            txt = self.editor.toPlainText().rstrip() + '\n' + '\n'.join(to_add) + '\n'
+            self.editor.setPlainText(txt)
+            InfoBar.success("Импорт", f"Добавлено {len(to_add)} доменов", parent=self,
+                           position=InfoBarPosition.TOP_RIGHT, duration=2000)
+        else:
+            InfoBar.info("Импорт", "Все домены уже есть", parent=self)
+
+    def _pick_list_file(self, title):
+        start = str(self.lists_dir) if self.lists_dir else ""
+        path, _ = QFileDialog.getOpenFileName(self, title, start,
+                                               "Text Files (*.txt);;All Files (*)")
+        return path
+
+    def _set_busy(self, busy):
+        self.diff_btn.setEnabled(not busy)
+        self.merge_btn.setEnabled(not busy)
+        self.lint_btn.setEnabled(not busy)
+        self.analyze_btn.setEnabled(not busy)
+
+    def _lint_list(self):
+        self._set_busy(True)
+        self._lint_worker = LintWorker(self.editor.toPlainText().split('\n'))
+        self._lint_worker.done.connect(self._on_lint_done)
+        self._lint_worker.start()
+
+    def _on_lint_done(self, result, error):
+        self._set_busy(False)
+        if result is None:
+            InfoBar.error("Ошибка", error, parent=self)
+            return
+        report, fixed = result
+        if not report.issues and fixed == self.editor.toPlainText().rstrip('\n') + '\n':
+            InfoBar.success("Проверка", "Проблем не найдено", parent=self,
+                            position=InfoBarPosition.TOP_RIGHT, duration=2000)
+            return
+        samples = "\n".join(f"{line_no}: {text} — {', '.join(issues)}"
+                            for line_no, text, issues in report.samples[:15])
+        reply = QMessageBox.question(
+            self, "Проверка списка",
+            f"{report.summary()}\n\n{samples}\n\n"
+            "Исправить? Записи будут нормализованы, дубликаты и некорректные строки удалены."
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.editor.setPlainText(fixed)
+
+    def _analyze_list(self):
+        if not (self.bypass and self.bypass_active and self.bypass_active()):
+            InfoBar.warning("Анализ", "Сначала запустите стратегию на странице «Стратегии» "
+                            "(с правами администратора)", parent=self, position=InfoBarPosition.TOP_RIGHT,
+                            duration=4000)
+            return
+        lines = self.editor.toPlainText().split('\n')
+        count = len(necessity.list_domains(lines))
+        reply = QMessageBox.question(
+            self, "Анализ списка",
+            f"Каждый из {count} доменов будет проверен без обхода и с ним. На время первой проверки "
+            f"(около {count * 2 / 20 / 60 + 0.5:.0f} мин) winws.exe будет остановлен. Продолжить?"
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        self._set_busy(True)
+        self._necessity_worker = NecessityWorker(lines, self.bypass, get_app_dir() / "necessity_report.json")
+        self._necessity_worker.progress.connect(self.stats_label.setText)
+        self._necessity_worker.done.connect(self._on_analyze_done)
+        self._necessity_worker.start()
+
+    def _on_analyze_done(self, report, error):
+        self._set_busy(False)
+        self._update_stats()
+        if report is None:
+            InfoBar.error("Ошибка", error, parent=self)
+            return
+        prune = sorted(report.prune_set())
+        if not prune:
+            InfoBar.success("Анализ", report.summary(), parent=self,
+                            position=InfoBarPosition.TOP_RIGHT, duration=6000)
+            return
+        sample = "\n".join(prune[:15]) + (f"\n… и ещё {len(prune) - 15}" if len(prune) > 15 else "")
+        reply = QMessageBox.question(
+            self, "Анализ списка",
+            f"{report.summary()}\n\nДоступны без обхода:\n{sample}\n\n"
+            f"Удалить эти {len(prune)} записей? Домены YouTube и Discord не удаляются; "
+            f"полный отчёт — app/necessity_report.json."
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            kept, removed = necessity.prune_lines(self.editor.toPlainText().split('\n'), set(prune))
+            self.editor.setPlainText('\n'.join(kept))
+            InfoBar.success("Анализ", f"Удалено строк: {removed}. Сохраните список", parent=self,
+                            position=InfoBarPosition.TOP_RIGHT, duration=4000)
+
+    def _diff_list(self):
+        path = self._pick_list_file("Сравнить с файлом")
+        if not path:
+            return
+        self._set_busy(True)
+        self._diff_worker = DiffWorker(self.editor.toPlainText().split('\n'), path)
+        self._diff_worker.done.connect(lambda res, err: self._on_diff_done(res, err, Path(path).name))
+        self._diff_worker.start()
+
+    def _on_diff_done(self, result, error, other_name):
+        self._set_busy(False)
+        if result is None:
+            InfoBar.error("Ошибка", error, parent=self)
+            return
+        self._diff_window = DiffWindow(result, f"{self.current_file} ↔ {other_name}", self)
+        self._diff_window.add_requested.connect(self._append_entries)
+        self._diff_window.show()
+
+    def _merge_list(self):
+        base = self._pick_list_file("Базовая версия (общий предок)")
+        if not base:
+            return
+        upstream = self._pick_list_file("Внешняя версия (upstream)")
+        if not upstream:
+            return
+        import tempfile
+        fd, out_path = tempfile.mkstemp(suffix=".txt")
+        os.close(fd)
+        self._set_busy(True)
+        self._diff_worker = DiffWorker(self.editor.toPlainText().split('\n'), upstream,
+                                       base=base, out_path=out_path)
+        self._diff_worker.done.connect(lambda res, err: self._on_merge_done(res, err, out_path))
+        self._diff_worker.start()
+
+    def _on_merge_done(self, stats, error, out_path):
+        self._set_busy(False)
+        try:
+            if stats is None:
+                InfoBar.error("Ошибка", error, parent=self)
+                return
+            # Keep the leading comment block of the local file
+            header = []
+            for line in self.editor.toPlainText().split('\n'):
+                if not line.startswith('#'):
+                    break
+                header.append(line)
+            merged = Path(out_path).read_text(encoding="utf-8")
+            self.editor.setPlainText('\n'.join(header + [merged]) if header else merged)
+            InfoBar.success(
+                "Слияние",
+                f"Итого {stats['kept']}: +{stats['added_local']} локальных, +{stats['added_upstream']} внешних, "
+                f"−{stats['removed_local'] + stats['removed_upstream']} удалённых. Проверьте и сохраните.",
+                parent=self, position=InfoBarPosition.TOP_RIGHT, duration=5000)
+        finally:
+            try:
+                os.unlink(out_path)
+            except OSError:
+                pass
+
+
+class TuneWorker(QThread):
+    progress = pyqtSignal(str)
+    done = pyqtSignal(str, str)  # written strategy path, error
+
+    def __init__(self, zapret_dir, strategy_path, history=None, version=None):
+        super().__init__()
+        self.zapret_dir = zapret_dir
+        self.strategy_path = strategy_path
+        self.history = history
+        self.version = version
+
+    def run(self):
+        try:
+            base = strategy.Strategy.from_file(self.strategy_path)
+            # Only tune the TLS profiles; UDP/discord profiles keep their settings
+            blocks = [i for i in base.desync_blocks()
+                      if "443" in (base.get(i, "filter-tcp") or "")] or None
+            space = tuner.ParamSpace(blocks=blocks)
+
+            def check(domain):
+                t = time.time()
+                ok = tuner.https_reachable(domain)
+                if self.history:
+                    self.history.record("tune", domain, ok, base.name, self.version,
+                                        https_ms=(time.time() - t) * 1000 if ok else None)
+                return ok
+
+            prober = tuner.LiveProber(self.zapret_dir, check=check)
+
+            def on_round(round_no, left, best):
+                self.progress.emit(f"Раунд {round_no}: осталось {left}, лучший {best.score:.0%}, "
+                                   f"проверок {prober.trials_used}")
+
+            result = tuner.successive_halving(base, space, prober, progress=on_round)
+            path = tuner.write_strategy(result, base, self.zapret_dir)
+            self.progress.emit(f"Лучший вариант: {result.best.score:.0%} успешных соединений "
+                               f"({result.trials_used} проверок)")
+            self.done.emit(str(path), "")
+        except Exception as e:
+            self.done.emit("", str(e))
 
 
 class StrategiesPage(QWidget):
@@ -658,6 +1384,11 @@ class StrategiesPage(QWidget):
         self.zapret_dir = None
         self.strategies = []
         self.is_running = False
+        self.winws = None
+        self.scan_cache = None
+        self.history = None
+        self.probe_context = None
+        self.hold_health = None  # hold_health(reason, held): no failover while winws is stopped on purpose
         self._setup_ui()
 
     def _setup_ui(self):
@@ -700,7 +1431,11 @@ class StrategiesPage(QWidget):
         # Dropdown
         self.strat_combo = ComboBox()
         self.strat_combo.setMinimumWidth(300)
+        self.strat_combo.currentIndexChanged.connect(self.show_strategy_info)
         strat_layout.addWidget(self.strat_combo)
+        self.strat_info = BodyLabel("")
+        self.strat_info.setStyleSheet("color: #888;")
+        strat_layout.addWidget(self.strat_info)
 
         # Run button
         self.run_btn = PrimaryPushButton("▶ Запустить")
@@ -710,31 +1445,145 @@ class StrategiesPage(QWidget):
 
         layout.addWidget(strat_card)
 
-        layout.addStretch()
+        # Parameter search card
+        tune_card = CardWidget()
+        tune_layout = QHBoxLayout(tune_card)
+        tune_layout.setContentsMargins(20, 15, 20, 15)
+
+        tune_text = QVBoxLayout()
+        tune_text.addWidget(SubtitleLabel("Подбор параметров"))
+        self.tune_label = BodyLabel("Перебирает параметры выбранной стратегии и сохраняет лучший вариант")
+        self.tune_label.setStyleSheet("color: #888;")
+        tune_text.addWidget(self.tune_label)
+        tune_layout.addLayout(tune_text)
+        tune_layout.addStretch()
+
+        self.tune_btn = PushButton("🔍 Подобрать")
+        self.tune_btn.clicked.connect(self._tune_selected_strategy)
+        tune_layout.addWidget(self.tune_btn)
+
+        layout.addWidget(tune_card)
+
+        # winws output (supervised runs only)
+        console_card = CardWidget()
+        console_layout = QVBoxLayout(console_card)
+        console_layout.setContentsMargins(20, 15, 20, 15)
+
+        console_row = QHBoxLayout()
+        console_row.addWidget(SubtitleLabel("Вывод winws"))
+        self.console_search = LineEdit()
+        self.console_search.setPlaceholderText("Поиск...")
+        self.console_search.setClearButtonEnabled(True)
+        self.console_search.textChanged.connect(self._filter_console)
+        console_row.addWidget(self.console_search, 1)
+        self.console_follow = ToggleButton("Следить")
+        self.console_follow.setChecked(True)
+        console_row.addWidget(self.console_follow)
+        export_btn = PushButton("Экспорт")
+        export_btn.clicked.connect(self._export_console)
+        console_row.addWidget(export_btn)
+        clear_btn = PushButton("Очистить")
+        clear_btn.clicked.connect(self._clear_console)
+        console_row.addWidget(clear_btn)
+        console_layout.addLayout(console_row)
+
+        self.console_model = ConsoleModel(self)
+        self.console_view = ListView()
+        self.console_view.setModel(self.console_model)
+        self.console_view.setUniformItemSizes(True)
+        self.console_view.setStyleSheet("font-family: Consolas, monospace;")
+        console_layout.addWidget(self.console_view, 1)
+        self.console_info = BodyLabel("")
+        self.console_info.setStyleSheet("color: #888;")
+        console_layout.addWidget(self.console_info)
+
+        layout.addWidget(console_card, 1)
+
+        self._console_seq = 0
+        self._console_timer = QTimer(self)
+        self._console_timer.setInterval(250)
+        self._console_timer.timeout.connect(self._poll_console)
 
 
     def set_zapret_dir(self, path):
         self.zapret_dir = path
 
-    def update_status(self, status: dict):
+    def set_supervisor(self, bridge):
+        self.winws = bridge
+        bridge.switched.connect(self._on_switched)
+        self._console_timer.start()
+
+    def _on_switched(self, name, gap, error):
+        if error:
+            InfoBar.error("Стратегия не запущена", f"{name}: {error}", parent=self,
+                          position=InfoBarPosition.TOP_RIGHT, duration=5000)
+        elif gap is None:
+            InfoBar.warning("Запущено", f"{name}: winws не сообщил о запуске, проверьте консоль",
+                            parent=self, position=InfoBarPosition.TOP_RIGHT, duration=4000)
+        else:
+            InfoBar.success("Запущено", f"{name}: переключение за {gap * 1000:.0f} мс", parent=self,
+                            position=InfoBarPosition.TOP_RIGHT, duration=2000)
+        self.refresh_requested.emit()
+
+    def _poll_console(self):
+        ring = self.winws.output
+        lines = ring.since(self._console_seq, limit=procout.CAPACITY)
+        if not lines:
+            return
+        self._console_seq = lines[-1][0]
+        self.console_model.append(lines)
+        if self.console_follow.isChecked() and self.isVisible():
+            self.console_view.scrollToBottom()
+        self.console_info.setText(f"Строк: {len(self.console_model.records)}"
+                                  + (f", вытеснено из буфера: {ring.dropped}" if ring.dropped else ""))
+
+    def _filter_console(self, text):
+        self.console_model.set_filter(text)
+        if self.console_follow.isChecked():
+            self.console_view.scrollToBottom()
+
+    def _export_console(self):
+        if not self.winws:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт вывода", str(Path.home() / "winws.log"),
+                                              "Text (*.log *.txt)")
+        if not path:
+            return
+        try:
+            count = self.winws.output.export(Path(path))
+            InfoBar.success("Экспорт", f"{count} строк", parent=self, duration=2000)
+        except Exception as e:
+            InfoBar.error("Ошибка", str(e), parent=self)
+
+    def _clear_console(self):
+        if self.winws:
+            self.winws.output.clear()
+        self.console_model.clear()
+        self.console_info.setText("")
+
+    def update_status(self, status: dict, stale: bool = False):
         winws_status = status.get("winws", ("НЕИЗВЕСТНО", False))
         text, running = winws_status
         self.is_running = running
+        suffix = " (обновляется…)" if stale else ""
 
         if running:
-            self.status_label.setText("Запущен и работает")
-            self.status_label.setStyleSheet("color: #6ccb5f;")
-            self.status_indicator.setStyleSheet("font-size: 24px; color: #6ccb5f;")
+            color = "#888" if stale else "#6ccb5f"
+            self.status_label.setText("Запущен и работает" + suffix)
+            self.status_label.setStyleSheet(f"color: {color};")
+            self.status_indicator.setStyleSheet(f"font-size: 24px; color: {color};")
             self.stop_btn.setEnabled(True)
             self.stop_btn.setStyleSheet("background-color: #c42b1c;")
         else:
-            self.status_label.setText("Не запущен")
-            self.status_label.setStyleSheet("color: #c42b1c;")
-            self.status_indicator.setStyleSheet("font-size: 24px; color: #c42b1c;")
+            color = "#888" if stale else "#c42b1c"
+            self.status_label.setText("Не запущен" + suffix)
+            self.status_label.setStyleSheet(f"color: {color};")
+            self.status_indicator.setStyleSheet(f"font-size: 24px; color: {color};")
             self.stop_btn.setEnabled(False)
             self.stop_btn.setStyleSheet("background-color: #555;")
 
     def update_strategies(self, strategies):
+        current = self.selected_strategy()
         self.strategies = strategies
         self.strat_combo.clear()
         
@@ -746,6 +1595,25 @@ class StrategiesPage(QWidget):
         self.run_btn.setEnabled(True)
         for name in strategies:
             self.strat_combo.addItem(name.replace(".bat", ""), name)
+        self.select_strategy(current)
+
+    def selected_strategy(self):
+        idx = self.strat_combo.currentIndex()
+        return self.strategies[idx] if 0 <= idx < len(self.strategies) else None
+
+    def select_strategy(self, name):
+        if name in self.strategies:
+            self.strat_combo.setCurrentIndex(self.strategies.index(name))
+
+    def show_strategy_info(self, *_):
+        name = self.selected_strategy()
+        meta = self.scan_cache.meta(self.zapret_dir / name) if name and self.scan_cache else None
+        if not meta:
+            self.strat_info.setText("")
+        elif "summary" in meta:
+            self.strat_info.setText(meta["summary"])
+        else:
+            self.strat_info.setText(f"Не разобрана: {meta.get('error', '')}")
 
     def _run_selected_strategy(self):
         if not self.strategies:
@@ -764,6 +1632,10 @@ class StrategiesPage(QWidget):
         if not p.exists():
             InfoBar.error("Ошибка", f"Файл не найден: {name}", parent=self)
             return
+        if is_admin() and self.winws:
+            # Supervised hot switch: restarted on crash, gap reported in _on_switched
+            self.winws.switch(p, self.zapret_dir)
+            return
         if is_admin():
             subprocess.Popen(str(p), cwd=str(self.zapret_dir),
                            creationflags=subprocess.CREATE_NEW_CONSOLE, shell=True)
@@ -775,22 +1647,69 @@ class StrategiesPage(QWidget):
         QTimer.singleShot(2000, lambda: self.refresh_requested.emit())
 
     def _stop_winws(self):
+        if self.winws:
+            self.winws.stop()
         subprocess.run("taskkill /F /IM winws.exe", shell=True,
                       creationflags=subprocess.CREATE_NO_WINDOW)
         InfoBar.success("Остановлено", "winws.exe", parent=self,
                        position=InfoBarPosition.TOP_RIGHT, duration=2000)
         self.refresh_requested.emit()
 
+    def _tune_selected_strategy(self):
+        idx = self.strat_combo.currentIndex()
+        if not self.zapret_dir or idx < 0 or idx >= len(self.strategies):
+            return
+        if not is_admin():
+            show_admin_required(self)
+            return
+        reply = QMessageBox.question(
+            self, "Подбор параметров",
+            "winws.exe будет остановлен, затем варианты стратегии будут по очереди запускаться "
+            "и проверяться. Это займёт несколько минут. Продолжить?"
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        # The supervisor would restart a killed winws in the middle of the probes,
+        # and the health monitor would fail over to another strategy
+        if self.hold_health:
+            self.hold_health("tune", True)
+        if self.winws:
+            self.winws.stop()
+        subprocess.run("taskkill /F /IM winws.exe", shell=True, capture_output=True,
+                      creationflags=subprocess.CREATE_NO_WINDOW)
+        self.tune_btn.setEnabled(False)
+        version = self.probe_context()[1] if self.probe_context else None
+        self._tune_worker = TuneWorker(self.zapret_dir, self.zapret_dir / self.strategies[idx],
+                                       self.history, version)
+        self._tune_worker.progress.connect(self.tune_label.setText)
+        self._tune_worker.done.connect(self._on_tune_done)
+        self._tune_worker.start()
+
+    def _on_tune_done(self, path, error):
+        self.tune_btn.setEnabled(True)
+        if self.hold_health:
+            self.hold_health("tune", False)
+        if error:
+            InfoBar.error("Ошибка", error, parent=self)
+        else:
+            InfoBar.success("Готово", f"Сохранено: {Path(path).name}", parent=self,
+                           position=InfoBarPosition.TOP_RIGHT, duration=4000)
+        self.refresh_requested.emit()
+
 
 class AutorunPage(QWidget):
     refresh_requested = pyqtSignal()
     _install_done = pyqtSignal(bool, str)  # Internal signal for thread completion
+    _action_done = pyqtSignal(bool, str, str)  # ok, title, message
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.zapret_dir = None
         self.strategies = []
+        self.winws = None
+        self.hold_health = None
         self._install_done.connect(self._on_install_done)
+        self._action_done.connect(self._on_action_done)
         self._setup_ui()
 
     def _setup_ui(self):
@@ -850,6 +1769,9 @@ class AutorunPage(QWidget):
     def set_zapret_dir(self, path):
         self.zapret_dir = path
 
+    def set_supervisor(self, bridge):
+        self.winws = bridge
+
     def update_strategies(self, strategies):
         self.strategies = strategies
         current = self.strat_combo.currentText()
@@ -868,8 +1790,13 @@ class AutorunPage(QWidget):
 
         self.install_btn.setEnabled(False)
         self.install_btn.setText("Установка...")
+        if self.hold_health:
+            self.hold_health("install", True)
 
         def do_install():
+            # The service's winws replaces the supervised one, which would be restarted otherwise
+            if self.winws:
+                self.winws.stop()
             strat_path = self.zapret_dir / strat
             success, msg = ServiceManager.install_service(strat_path, self.zapret_dir)
             self._install_done.emit(success, msg)
@@ -879,6 +1806,8 @@ class AutorunPage(QWidget):
 
     def _on_install_done(self, success, msg):
         self.install_btn.setEnabled(True)
+        if self.hold_health:
+            self.hold_health("install", False)
         self.install_btn.setText("⚡ Установить службу")
         if success:
             InfoBar.success("Успешно", "Служба установлена и запущена", parent=self,
@@ -889,13 +1818,25 @@ class AutorunPage(QWidget):
         self.refresh_requested.emit()
 
     def _stop_service(self):
-        ServiceManager.stop_service()
-        InfoBar.success("Остановлено", "Служба остановлена", parent=self, duration=2000)
-        self.refresh_requested.emit()
+        # Transitions wait for the SCM state (up to scm.STOP_TIMEOUT), so keep them off the GUI thread
+        def do_stop():
+            ok = ServiceManager.stop_service()
+            self._action_done.emit(ok, "Остановлено", "Служба остановлена" if ok else "Служба не остановилась")
+
+        threading.Thread(target=do_stop, daemon=True).start()
 
     def _remove_service(self):
-        ServiceManager.remove_service()
-        InfoBar.success("Удалено", "Служба удалена", parent=self, duration=2000)
+        def do_remove():
+            ok = ServiceManager.remove_service()
+            self._action_done.emit(ok, "Удалено", "Служба удалена" if ok else "Служба не удалилась")
+
+        threading.Thread(target=do_remove, daemon=True).start()
+
+    def _on_action_done(self, ok, title, msg):
+        if ok:
+            InfoBar.success(title, msg, parent=self, duration=2000)
+        else:
+            InfoBar.error("Ошибка", msg, parent=self, duration=4000)
         self.refresh_requested.emit()
 
 
@@ -907,6 +1848,7 @@ class OptionsPage(QWidget):
         self.lists_dir = None
         self.game_filter_enabled = False
         self.ipset_status = "any"
+        self.snapshots = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -989,13 +1931,19 @@ class OptionsPage(QWidget):
         self.zapret_dir = zapret_dir
         self.utils_dir = utils_dir
         self.lists_dir = lists_dir
-        self._load_state()
+        self.reload_state()
 
-    def _load_state(self):
+    def set_snapshots(self, scheduler):
+        self.snapshots = scheduler
+
+    def reload_state(self):
         if self.utils_dir:
             gf = self.utils_dir / "game_filter.enabled"
             self.game_filter_enabled = gf.exists()
+            # Don't re-run the toggle handler when the state comes from disk
+            self.gf_switch.blockSignals(True)
             self.gf_switch.setChecked(self.game_filter_enabled)
+            self.gf_switch.blockSignals(False)
 
         if self.lists_dir:
             ipset_file = self.lists_dir / "ipset-all.txt"
@@ -1059,8 +2007,10 @@ class OptionsPage(QWidget):
         def do_update():
             try:
                 url = "https://raw.githubusercontent.com/Flowseal/zapret-discord-youtube/refs/heads/main/.service/ipset-service.txt"
-                r = requests.get(url, timeout=15)
+                r = http_get(url, timeout=15)
                 r.raise_for_status()
+                if self.snapshots:
+                    self.snapshots.snapshot_before("update ipset-all.txt")
                 (self.lists_dir / "ipset-all.txt").write_text(r.text)
                 self.ipset_status = "loaded"
                 QTimer.singleShot(0, lambda: self.ipset_label.setText("Текущий режим: LOADED"))
@@ -1080,7 +2030,7 @@ class OptionsPage(QWidget):
         def do_update():
             try:
                 url = "https://raw.githubusercontent.com/Flowseal/zapret-discord-youtube/refs/heads/main/.service/discord-hosts.txt"
-                r = requests.get(url, timeout=15)
+                r = http_get(url, timeout=15)
                 r.raise_for_status()
 
                 hosts_path = Path(os.environ.get('SystemRoot', 'C:\\Windows')) / "System32" / "drivers" / "etc" / "hosts"
@@ -1102,33 +2052,48 @@ class OptionsPage(QWidget):
 
 class TestWorker(QThread):
     result = pyqtSignal(str)
-    
-    def __init__(self, domain):
+    history_ready = pyqtSignal(object, object)  # daily buckets, per-strategy totals
+
+    def __init__(self, domain, history=None, strategy=None, version=None):
         super().__init__()
         self.domain = domain
-        
+        self.history = history
+        self.strategy = strategy
+        self.version = version
+
     def run(self):
+        res = check_domain(self.domain)
+        if self.history:
+            try:
+                self.history.record_check("test", self.domain, res, self.strategy, self.version)
+                since = time.time() - TestPage.HISTORY_DAYS * history.DAY
+                self.history_ready.emit(self.history.series(self.domain, history.DAY, since),
+                                        self.history.summary(self.domain, since))
+            except Exception as e:
+                log.error("History error: %s", e)
         results = []
-        try:
-            t = time.time()
-            ip = socket.gethostbyname(self.domain)
-            results.append(f"✓ DNS: {ip} ({int((time.time()-t)*1000)}ms)")
-        except Exception as e:
-            results.append(f"✗ DNS: {e}")
+        dns = res["dns"]
+        if dns["ok"]:
+            results.append(f"✓ DNS: {dns['ip']} ({dns['ms']}ms)")
+        else:
+            results.append(f"✗ DNS: {dns['error']}")
 
-        try:
-            t = time.time()
-            r = requests.get(f"https://{self.domain}", timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-            results.append(f"✓ HTTPS: {r.status_code} ({int((time.time()-t)*1000)}ms)")
-        except Exception as e:
-            results.append(f"✗ HTTPS: {e}")
+        https = res["https"]
+        if https["ok"]:
+            results.append(f"✓ HTTPS: {https['status']} ({https['ms']}ms)")
+        else:
+            results.append(f"✗ HTTPS: {https['error']}")
             
         self.result.emit("\n".join(results))
 
 class TestPage(QWidget):
+    HISTORY_DAYS = 30
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.worker = None
+        self.history = None
+        self.probe_context = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -1155,6 +2120,23 @@ class TestPage(QWidget):
         self.results.setPlaceholderText("Результаты проверки появятся здесь...")
         layout.addWidget(self.results)
 
+        # History of the checked domain
+        history_card = CardWidget()
+        history_layout = QVBoxLayout(history_card)
+        history_layout.setContentsMargins(20, 15, 20, 15)
+        history_layout.addWidget(SubtitleLabel(f"История за {self.HISTORY_DAYS} дней"))
+        self.history_chart = Sparkline("#0078d4", capacity=self.HISTORY_DAYS)
+        history_layout.addWidget(self.history_chart)
+        self.history_label = BodyLabel("Медиана времени HTTPS по дням; проверки сохраняются автоматически")
+        self.history_label.setStyleSheet("color: #888;")
+        self.history_label.setWordWrap(True)
+        history_layout.addWidget(self.history_label)
+        layout.addWidget(history_card)
+
+    def set_history(self, store, context):
+        self.history = store
+        self.probe_context = context
+
     def _run_test(self):
         domain = self.input.text().strip().replace("https://", "").replace("http://", "").split("/")[0]
         if not domain:
@@ -1165,24 +2147,77 @@ class TestPage(QWidget):
         self.results.append(f"Проверка {domain}...\n")
         self.test_btn.setEnabled(False)
         
-        self.worker = TestWorker(domain)
+        strat, version = self.probe_context() if self.probe_context else (None, None)
+        self.worker = TestWorker(domain, self.history, strat, version)
         self.worker.result.connect(self._on_result)
+        self.worker.history_ready.connect(self._on_history)
         self.worker.finished.connect(self._on_finished)
         self.worker.start()
         
     def _on_result(self, text):
         self.results.append(text)
+
+    def _on_history(self, buckets, strategies):
+        self.history_chart.clear()
+        for b in buckets:
+            self.history_chart.add(b["p50"] or 0)
+        count = sum(b["count"] for b in buckets)
+        ok = sum(b["ok"] for b in buckets)
+        lines = [f"Проверок: {count}, успешных: {ok / count:.0%}" if count else "Проверок нет"]
+        for t in strategies:
+            median = f", {t['p50']:.0f} мс" if t["p50"] is not None else ""
+            lines.append(f"{t['strategy'] or 'без стратегии'}: {t['ok'] / t['count']:.0%} из {t['count']}{median}")
+        self.history_label.setText("\n".join(lines))
         
     def _on_finished(self):
         self.test_btn.setEnabled(True)
 
 
+class Sparkline(QWidget):
+    """Minimal line graph of the last `capacity` values."""
+
+    def __init__(self, color, capacity=300, parent=None):
+        super().__init__(parent)
+        self.color = QColor(color)
+        self.values = []
+        self.capacity = capacity
+        self.setMinimumHeight(50)
+
+    def add(self, value):
+        self.values.append(value)
+        if len(self.values) > self.capacity:
+            del self.values[0]
+        self.update()
+
+    def clear(self):
+        self.values = []
+        self.update()
+
+    def paintEvent(self, event):
+        if len(self.values) < 2:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QPen(self.color, 1.5))
+        w, h = self.width(), self.height() - 2
+        top = max(self.values) or 1
+        step = w / (self.capacity - 1)
+        x0 = w - step * (len(self.values) - 1)
+        painter.drawPolyline(QPolygonF([QPointF(x0 + i * step, 1 + h - v / top * h)
+                                        for i, v in enumerate(self.values)]))
+        painter.end()
+
+
 class StatusPage(QWidget):
     refresh_requested = pyqtSignal()
     update_zapret_requested = pyqtSignal()
+    health_toggled = pyqtSignal(bool)
+    health_event = pyqtSignal(str, dict)  # emitted from the health monitor thread
+    HEALTH_LOG_LINES = 6
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.winws = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -1190,6 +2225,11 @@ class StatusPage(QWidget):
         layout.setContentsMargins(20, 20, 20, 20)
         layout.setSpacing(10)
 
+        self.stale_label = BodyLabel("")
+        self.stale_label.setStyleSheet("color: #888;")
+        self.stale_label.hide()
+        layout.addWidget(self.stale_label)
+
         # Status cards
         self.status_widgets = {}
 
@@ -1260,6 +2300,48 @@ class StatusPage(QWidget):
 
         layout.addWidget(card3)
 
+        # winws.exe resources (only when started from the GUI)
+        res_card = CardWidget()
+        res_layout = QVBoxLayout(res_card)
+        res_layout.setContentsMargins(20, 15, 20, 15)
+        res_header = QHBoxLayout()
+        res_header.addWidget(SubtitleLabel("Ресурсы winws.exe"))
+        res_header.addStretch()
+        self.res_label = BodyLabel("не запущен из приложения")
+        res_header.addWidget(self.res_label)
+        res_layout.addLayout(res_header)
+        graphs = QHBoxLayout()
+        self.cpu_graph = Sparkline("#4cc2ff")
+        self.rss_graph = Sparkline("#6ccb5f")
+        graphs.addWidget(self.cpu_graph)
+        graphs.addWidget(self.rss_graph)
+        res_layout.addLayout(graphs)
+        self.res_events = BodyLabel("")
+        res_layout.addWidget(self.res_events)
+        layout.addWidget(res_card)
+
+        # Background health checks with failover
+        health_card = CardWidget()
+        health_layout = QVBoxLayout(health_card)
+        health_layout.setContentsMargins(20, 15, 20, 15)
+        health_header = QHBoxLayout()
+        health_header.addWidget(SubtitleLabel("Контроль работы"))
+        health_header.addStretch()
+        self.health_switch = SwitchButton()
+        self.health_switch.checkedChanged.connect(self.health_toggled.emit)
+        health_header.addWidget(self.health_switch)
+        health_layout.addLayout(health_header)
+        self.health_label = BodyLabel("")
+        self.health_label.setStyleSheet("color: #888;")
+        self.health_label.setWordWrap(True)
+        health_layout.addWidget(self.health_label)
+        self.health_log = BodyLabel("")
+        self.health_log.setWordWrap(True)
+        health_layout.addWidget(self.health_log)
+        layout.addWidget(health_card)
+        self._health_lines = []
+        self.health_event.connect(self.on_health_event)
+
         # Version info card
         ver_card = CardWidget()
         ver_layout = QHBoxLayout(ver_card)
@@ -1324,15 +2406,73 @@ class StatusPage(QWidget):
     def set_version(self, version: str):
         self.version_label.setText(f"v{version}")
 
-    def update_status(self, status: dict):
+    def add_sample(self, point):
+        self.cpu_graph.add(point.cpu)
+        self.rss_graph.add(point.rss / 2**20)
+        self.res_label.setText(f"CPU {point.cpu:.1f}%  ·  RAM {point.rss / 2**20:.1f} MB  ·  "
+                               f"дескрипторов {point.handles}")
+
+    def on_supervisor_event(self, kind, info):
+        name = info.get("strategy") or ""
+        if kind == supervisor.STARTED:
+            self.cpu_graph.clear()
+            self.rss_graph.clear()
+            text = f"{name}: запущен (pid {info.get('pid')})"
+            if info.get("restarts"):
+                text += f", перезапусков: {info['restarts']}"
+        elif kind == supervisor.EXITED:
+            text = f"{name}: завершился с кодом {info.get('code')}, перезапуск через {info.get('retry_in', 0):.0f} с"
+        elif kind == supervisor.GAVE_UP:
+            text = f"{name}: перезапуски прекращены"
+        elif kind == supervisor.SWITCHED:
+            gap = info.get("gap_ms")
+            text = f"{name}: переключение за {gap} мс" if gap is not None else f"{name}: нет отметки о запуске"
+        else:
+            text = ""
+            self.res_label.setText("не запущен из приложения")
+        self.res_events.setText(text)
+
+    def set_health(self, enabled, monitor=None):
+        self.health_switch.blockSignals(True)
+        self.health_switch.setChecked(enabled)
+        self.health_switch.blockSignals(False)
+        if monitor:
+            self.health_label.setText(
+                f"Проверка {', '.join(monitor.domains)} каждые {monitor.interval / 60:.0f} мин; "
+                f"при успехе ниже {monitor.threshold:.0%} — переключение на следующую стратегию "
+                f"(только для winws, запущенного из приложения)")
+            for kind, info in monitor.log:
+                self.on_health_event(kind, info)
+        else:
+            self.health_label.setText("Выключен")
+
+    def on_health_event(self, kind, info):
+        stamp = time.strftime("%H:%M", time.localtime(info.get("t", time.time())))
+        self._health_lines.append(f"{stamp}  {health.describe(kind, info)}")
+        del self._health_lines[:-self.HEALTH_LOG_LINES]
+        self.health_log.setText("\n".join(reversed(self._health_lines)))
+
+    def set_stale(self, text):
+        """Show that the page displays last session's data (None once it is fresh)."""
+        self.stale_label.setText(text or "")
+        self.stale_label.setVisible(bool(text))
+
+    def update_status(self, status: dict, stale: bool = False):
         for key, (text, running) in status.items():
             if key in self.status_widgets:
-                color = "#6ccb5f" if running else "#c42b1c"
+                color = "#888" if stale else "#6ccb5f" if running else "#c42b1c"
                 icon = "✓" if running else "✗"
                 self.status_widgets[key].setText(f"{icon} {text}")
                 self.status_widgets[key].setStyleSheet(f"color: {color};")
 
+    def set_supervisor(self, bridge):
+        self.winws = bridge
+        bridge.sampled.connect(self.add_sample)
+        bridge.event.connect(self.on_supervisor_event)
+
     def _stop_winws(self):
+        if self.winws:
+            self.winws.stop()
         subprocess.run("taskkill /F /IM winws.exe", shell=True, creationflags=subprocess.CREATE_NO_WINDOW)
         self.refresh_requested.emit()
 
@@ -1340,16 +2480,20 @@ class StatusPage(QWidget):
         if not is_admin():
             request_admin_restart()
             return
-        ServiceManager.stop_service()
-        self.refresh_requested.emit()
+        self._in_background(ServiceManager.stop_service)
 
     def _remove_service(self):
         if not is_admin():
             request_admin_restart()
             return
-        subprocess.run("net stop zapret", shell=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        subprocess.run("sc delete zapret", shell=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        self.refresh_requested.emit()
+        self._in_background(ServiceManager.remove_service)
+
+    def _in_background(self, action):
+        def run():
+            action()
+            self.refresh_requested.emit()
+
+        threading.Thread(target=run, daemon=True).start()
 
     def _remove_windivert(self):
         if not is_admin():
@@ -1361,6 +2505,224 @@ class StatusPage(QWidget):
         self.refresh_requested.emit()
 
 
+class DiagnosticsPage(QWidget):
+    COLUMNS = ["Операция", "Метки", "Вызовов", "Ошибок", "Всего, мс", "Среднее", "p50", "p95", "Макс"]
+    REFRESH_MS = 2000
+
+    def __init__(self, config, parent=None):
+        super().__init__(parent)
+        self.config = config
+        self.app_dir = get_app_dir()
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        self._setup_ui()
+
+    def _setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+
+        card = CardWidget()
+        card_layout = QVBoxLayout(card)
+        card_layout.setContentsMargins(20, 15, 20, 15)
+        card_layout.addWidget(SubtitleLabel("Диагностика"))
+        card_layout.addWidget(BodyLabel("Время операций со службой, установщиком, списками и сетью. "
+                                        "Записи пишутся в app/metrics.jsonl"))
+
+        row = QHBoxLayout()
+        row.addWidget(BodyLabel("Сбор метрик"))
+        self.metrics_switch = SwitchButton()
+        self.metrics_switch.setChecked(metrics.is_enabled())
+        self.metrics_switch.checkedChanged.connect(self._on_metrics_toggled)
+        row.addWidget(self.metrics_switch)
+        row.addSpacing(20)
+
+        port = self.config.get("metrics_port", 9464)
+        row.addWidget(BodyLabel(f"Prometheus (127.0.0.1:{port}/metrics)"))
+        self.prom_switch = SwitchButton()
+        self.prom_switch.setChecked(self.config.get("metrics_prometheus", False))
+        self.prom_switch.checkedChanged.connect(self._on_prometheus_toggled)
+        row.addWidget(self.prom_switch)
+        row.addStretch()
+
+        export_btn = PushButton("Экспорт JSONL")
+        export_btn.clicked.connect(self._export)
+        row.addWidget(export_btn)
+
+        reset_btn = PushButton("Сбросить")
+        reset_btn.clicked.connect(self._reset)
+        row.addWidget(reset_btn)
+        card_layout.addLayout(row)
+        layout.addWidget(card)
+
+        self.table = TableWidget()
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(TableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table, 1)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self._timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._timer.stop()
+
+    def refresh(self):
+        rows = metrics.REGISTRY.snapshot()
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            labels = ", ".join(f"{k}={v}" for k, v in row["labels"].items())
+            if "count" in row:
+                cells = [row["name"], labels, str(row["count"]), str(row["errors"]),
+                         f"{row['total_ms']:.0f}", f"{row['mean_ms']:.1f}", f"{row['p50_ms']:.1f}",
+                         f"{row['p95_ms']:.1f}", f"{row['max_ms']:.1f}"]
+            else:
+                cells = [row["name"], labels, f"{row['value']:g}"] + [""] * 6
+            for col, text in enumerate(cells):
+                self.table.setItem(i, col, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+    def _on_metrics_toggled(self, checked):
+        self.config.set("metrics", checked)
+        if checked:
+            metrics.enable(self.app_dir / "metrics.jsonl")
+        else:
+            metrics.disable()
+
+    def _on_prometheus_toggled(self, checked):
+        self.config.set("metrics_prometheus", checked)
+        try:
+            if checked:
+                metrics.serve_prometheus(self.config.get("metrics_port", 9464))
+            else:
+                metrics.stop_prometheus()
+        except OSError as e:
+            InfoBar.error("Ошибка", f"Не удалось открыть порт: {e}", parent=self)
+
+    def _export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт метрик", str(Path.home() / "zapret-metrics.jsonl"),
+                                              "JSON Lines (*.jsonl)")
+        if not path:
+            return
+        try:
+            metrics.REGISTRY.export_jsonl(Path(path))
+            InfoBar.success("Экспорт", path, parent=self, duration=2000)
+        except Exception as e:
+            InfoBar.error("Ошибка", str(e), parent=self)
+
+    def _reset(self):
+        metrics.REGISTRY.reset()
+        self.refresh()
+
+
+class LogModel(RingModel):
+    """applog.RingBuffer records matching a level/text filter."""
+
+    COLORS = {logging.WARNING: "#d29922", logging.ERROR: "#f85149", logging.CRITICAL: "#f85149"}
+
+    def __init__(self, parent=None):
+        super().__init__(applog.RING_SIZE, parent)
+        self.min_level = logging.DEBUG
+        self.text = ""
+
+    def _matches(self, rec):
+        return rec[2] >= self.min_level and (not self.text or self.text in rec[4].lower()
+                                             or self.text in rec[3].lower())
+
+    def _format(self, rec):
+        _, created, levelno, name, message = rec
+        return f"{time.strftime('%H:%M:%S', time.localtime(created))} " \
+               f"{logging.getLevelName(levelno):<7} {name}: {message}"
+
+    def _color(self, rec):
+        return self.COLORS.get(rec[2])
+
+    def set_filter(self, min_level, text):
+        self.min_level = min_level
+        self.text = text.strip().lower()
+        self.refilter()
+
+
+class LogPage(QWidget):
+    LEVELS = [("Все", logging.DEBUG), ("Info", logging.INFO), ("Предупреждения", logging.WARNING),
+              ("Ошибки", logging.ERROR)]
+    POLL_MS = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.app_dir = get_app_dir()
+        self._last_seq = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.POLL_MS)
+        self._timer.timeout.connect(self._poll)
+        self._setup_ui()
+        self._timer.start()
+
+    def _setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+
+        row = QHBoxLayout()
+        self.level_combo = ComboBox()
+        self.level_combo.addItems([name for name, _ in self.LEVELS])
+        self.level_combo.currentIndexChanged.connect(self._apply_filter)
+        row.addWidget(self.level_combo)
+
+        self.filter_edit = LineEdit()
+        self.filter_edit.setPlaceholderText("Фильтр...")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self._apply_filter)
+        row.addWidget(self.filter_edit, 1)
+
+        self.follow_btn = ToggleButton("Следить")
+        self.follow_btn.setChecked(True)
+        row.addWidget(self.follow_btn)
+
+        folder_btn = PushButton("📂 Папка логов")
+        folder_btn.clicked.connect(self._open_folder)
+        row.addWidget(folder_btn)
+        layout.addLayout(row)
+
+        self.model = LogModel(self)
+        self.view = ListView()
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        layout.addWidget(self.view, 1)
+
+        self.info_label = BodyLabel("")
+        layout.addWidget(self.info_label)
+
+    def _poll(self):
+        if applog.ring is None:
+            return
+        records = applog.ring.since(self._last_seq)
+        if records:
+            self._last_seq = records[-1][0]
+            self.model.append(records)
+            if self.follow_btn.isChecked() and self.isVisible():
+                self.view.scrollToBottom()
+        dropped = applog.dropped()
+        self.info_label.setText(f"Записей: {self.model.rowCount()}"
+                                + (f", потеряно при перегрузке: {dropped}" if dropped else ""))
+
+    def _apply_filter(self, *_):
+        level = self.LEVELS[max(0, self.level_combo.currentIndex())][1]
+        self.model.set_filter(level, self.filter_edit.text())
+        if self.follow_btn.isChecked():
+            self.view.scrollToBottom()
+
+    def _open_folder(self):
+        folder = applog.log_dir(self.app_dir)
+        folder.mkdir(parents=True, exist_ok=True)
+        os.startfile(str(folder))
+
+
 class SettingsPage(QWidget):
     theme_changed = pyqtSignal(str)
     reset_requested = pyqtSignal()
@@ -1372,6 +2734,7 @@ class SettingsPage(QWidget):
         self.app_dir = get_app_dir()
         self.backup_dir = self.app_dir / "lists_backup"
         self.lists_dir = get_zapret_dir() / "lists"
+        self.snapshots = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -1428,7 +2791,11 @@ class SettingsPage(QWidget):
         backup_layout.setContentsMargins(20, 15, 20, 15)
 
         backup_layout.addWidget(SubtitleLabel("Резервная копия списков"))
-        backup_layout.addWidget(BodyLabel("Сохраняет списки в отдельную папку (app/lists_backup)"))
+        backup_layout.addWidget(BodyLabel("Снимки списков (app/lists_backup). Создаются также перед каждым сохранением и обновлением"))
+
+        self.snapshot_combo = ComboBox()
+        self.snapshot_combo.setMinimumWidth(400)
+        backup_layout.addWidget(self.snapshot_combo)
 
         backup_row = QHBoxLayout()
         
@@ -1439,6 +2806,10 @@ class SettingsPage(QWidget):
         restore_btn = PushButton("📥 Восстановить списки")
         restore_btn.clicked.connect(self._restore_lists)
         backup_row.addWidget(restore_btn)
+
+        diff_btn = PushButton("🔍 Сравнить с текущими")
+        diff_btn.clicked.connect(self._diff_snapshot)
+        backup_row.addWidget(diff_btn)
         
         backup_layout.addLayout(backup_row)
 
@@ -1470,33 +2841,74 @@ class SettingsPage(QWidget):
     def _open_folder(self):
         os.startfile(str(self.base_dir))
 
+    def set_snapshots(self, scheduler):
+        self.snapshots = scheduler
+        store = scheduler.store
+        # Import backups made by older versions (flat copies of *.txt)
+        if not store.list_snapshots() and list(self.backup_dir.glob("*.txt")):
+            store.snapshot(self.backup_dir, reason="legacy")
+        self._reload_snapshots()
+
+    def _reload_snapshots(self):
+        self.snapshot_combo.clear()
+        if not self.snapshots:
+            return
+        for m in self.snapshots.store.list_snapshots():
+            label = f"{m['created'].replace('T', ' ')} — {m['reason']} ({len(m['files'])} файлов)"
+            self.snapshot_combo.addItem(label, m["id"])
+
+    def _selected_snapshot(self):
+        idx = self.snapshot_combo.currentIndex()
+        if idx < 0:
+            InfoBar.warning("Предупреждение", "Резервных копий нет", parent=self)
+            return None
+        return self.snapshot_combo.itemData(idx)
+
     def _backup_lists(self):
         try:
             if not self.lists_dir.exists():
                 InfoBar.warning("Предупреждение", "Папка lists не найдена", parent=self)
                 return
-            self.backup_dir.mkdir(parents=True, exist_ok=True)
-            count = 0
-            for f in self.lists_dir.glob("*.txt"):
-                shutil.copy(f, self.backup_dir / f.name)
-                count += 1
-            InfoBar.success("Успех", f"Сохранено {count} файлов в {self.backup_dir}", parent=self)
+            latest = self.snapshots.store.latest()
+            manifest = self.snapshots.store.snapshot(self.lists_dir, reason="manual")
+            if latest and manifest["id"] == latest["id"]:
+                InfoBar.info("Без изменений", "Списки не менялись с последней копии", parent=self)
+            else:
+                InfoBar.success("Успех", f"Сохранено {len(manifest['files'])} файлов", parent=self)
+            self._reload_snapshots()
         except Exception as e:
             InfoBar.error("Ошибка", str(e), parent=self)
 
     def _restore_lists(self):
         try:
-            if not self.backup_dir.exists():
-                InfoBar.warning("Предупреждение", "Папка резервных копий не найдена", parent=self)
+            snapshot_id = self._selected_snapshot()
+            if not snapshot_id:
                 return
             if not self.lists_dir.exists():
                 InfoBar.warning("Предупреждение", "Папка lists не найдена", parent=self)
                 return
-            count = 0
-            for f in self.backup_dir.glob("*.txt"):
-                shutil.copy(f, self.lists_dir / f.name)
-                count += 1
+            # Keep the current state restorable too
+            self.snapshots.snapshot_before("before restore")
+            count = self.snapshots.store.restore(snapshot_id, self.lists_dir)
             InfoBar.success("Успех", f"Восстановлено {count} файлов", parent=self)
+            self._reload_snapshots()
+        except Exception as e:
+            InfoBar.error("Ошибка", str(e), parent=self)
+
+    def _diff_snapshot(self):
+        try:
+            snapshot_id = self._selected_snapshot()
+            if not snapshot_id:
+                return
+            d = self.snapshots.store.diff(snapshot_id, source_dir=self.lists_dir)
+            if not any(d.values()):
+                InfoBar.info("Сравнение", "Списки совпадают с копией", parent=self)
+                return
+            parts = []
+            for key, title in (("changed", "Изменены"), ("added", "Новые"), ("removed", "Удалены")):
+                if d[key]:
+                    parts.append(f"{title}: " + ", ".join(d[key]))
+            QMessageBox.information(self, "Сравнение с копией", "\n\n".join(parts))
         except Exception as e:
             InfoBar.error("Ошибка", str(e), parent=self)
 
@@ -1509,9 +2921,14 @@ class SettingsPage(QWidget):
 # ========== Main Window ==========
 
 class ZapretWindow(FluentWindow):
-    def __init__(self):
+    def __init__(self, control=None):
         super().__init__()
 
+        # Local control server (second launch, CLI)
+        self.control = control
+        if control:
+            control.attach(self)
+
         # Paths
         self.base_dir = get_base_install_dir()
         self.zapret_dir = get_zapret_dir()
@@ -1524,6 +2941,15 @@ class ZapretWindow(FluentWindow):
         self.config = Config(self.app_dir)
         self.installer = Installer()
 
+        # Metrics (no-op unless enabled on the diagnostics page)
+        if self.config.get("metrics", False):
+            metrics.enable(self.app_dir / "metrics.jsonl")
+        if self.config.get("metrics_prometheus", False):
+            try:
+                metrics.serve_prometheus(self.config.get("metrics_port", 9464))
+            except OSError as e:
+                log.error("Prometheus endpoint error: %s", e)
+
         # Apply theme
         theme = Theme.DARK if self.config.get("theme", "dark") == "dark" else Theme.LIGHT
         setTheme(theme)
@@ -1586,7 +3012,7 @@ class ZapretWindow(FluentWindow):
         if success:
             # Recreate window with main UI
             self.close()
-            self.new_window = ZapretWindow()
+            self.new_window = ZapretWindow(self.control)
             self.new_window.show()
         else:
             self.install_btn.setEnabled(True)
@@ -1597,8 +3023,10 @@ class ZapretWindow(FluentWindow):
         self.lists_page = ListsPage()
         self.lists_page.set_lists_dir(self.lists_dir)
 
+        self.scan_cache = scancache.ScanCache.load(self.app_dir / scancache.FILE)
         self.strategies_page = StrategiesPage()
         self.strategies_page.set_zapret_dir(self.zapret_dir)
+        self.strategies_page.scan_cache = self.scan_cache
         self.strategies_page.refresh_requested.connect(self._refresh_data)
 
         self.autorun_page = AutorunPage()
@@ -1614,6 +3042,9 @@ class ZapretWindow(FluentWindow):
         self.status_page.refresh_requested.connect(self._refresh_data)
         self.status_page.update_zapret_requested.connect(self._check_updates_manual)
 
+        self.diagnostics_page = DiagnosticsPage(self.config)
+        self.log_page = LogPage()
+
         self.settings_page = SettingsPage(self.config)
         self.settings_page.theme_changed.connect(self._on_theme_change)
         self.settings_page.reset_requested.connect(self._on_reset)
@@ -1625,6 +3056,8 @@ class ZapretWindow(FluentWindow):
         self.options_page.setObjectName("optionsPage")
         self.test_page.setObjectName("testPage")
         self.status_page.setObjectName("statusPage")
+        self.diagnostics_page.setObjectName("diagnosticsPage")
+        self.log_page.setObjectName("logPage")
         self.settings_page.setObjectName("settingsPage")
 
         # Add navigation
@@ -1634,10 +3067,74 @@ class ZapretWindow(FluentWindow):
         self.addSubInterface(self.options_page, FluentIcon.APPLICATION, "Опции")
         self.addSubInterface(self.test_page, FluentIcon.WIFI, "Тест")
         self.addSubInterface(self.status_page, FluentIcon.INFO, "Статус")
+        self.addSubInterface(self.diagnostics_page, FluentIcon.SPEED_HIGH, "Диагностика")
+        self.addSubInterface(self.log_page, FluentIcon.HISTORY, "Журнал")
 
         self.addSubInterface(self.settings_page, FluentIcon.SETTING, "Настройки",
                             position=NavigationItemPosition.BOTTOM)
 
+        # winws.exe started from the Strategies page runs supervised
+        self.winws = SupervisorBridge(self)
+        self.strategies_page.set_supervisor(self.winws)
+        self.autorun_page.set_supervisor(self.winws)
+        self.status_page.set_supervisor(self.winws)
+        self.winws.event.connect(lambda kind, info: self._refresh_data())
+
+        # Snapshots of lists before saves/updates, plus periodic ones
+        self.snapshots = SnapshotScheduler(SnapshotStore(self.app_dir / "lists_backup"), self.lists_dir)
+        self.snapshots.start()
+        self.lists_page.set_snapshots(self.snapshots)
+
+        # Global search index, built off the GUI thread
+        self.search_index = listsearch.SearchIndex(self.lists_dir)
+        self.lists_page.set_search_index(self.search_index)
+        threading.Thread(target=self.search_index.build, daemon=True).start()
+        self.options_page.set_snapshots(self.snapshots)
+        self.settings_page.set_snapshots(self.snapshots)
+
+        # Subscribed lists, fetched with conditional requests on their own thread
+        self.subscriptions = subscriptions.Subscriptions(
+            self.app_dir / subscriptions.DIR, self.lists_dir,
+            interval=self.config.get("subscriptions_interval", 6 * 3600),
+            before_write=self.snapshots.snapshot_before, on_update=self.lists_page.subscriptions_updated.emit)
+        self.lists_page.set_subscriptions(self.subscriptions)
+        self.subscriptions.start()
+
+        # Connectivity history; rollups and retention run hourly, off the GUI thread
+        try:
+            self.history = history.History(self.app_dir / history.FILE)
+        except Exception as e:
+            log.error("History unavailable: %s", e)
+            self.history = None
+        self.test_page.set_history(self.history, self._probe_context)
+        self.strategies_page.history = self.history
+        self.strategies_page.probe_context = self._probe_context
+        self._history_timer = QTimer(self)
+        self._history_timer.setInterval(history.HOUR * 1000)
+        self._history_timer.timeout.connect(self._maintain_history)
+        self._history_timer.start()
+        self._maintain_history()
+
+        # Canary checks of the running strategy, failing over along the history ranking
+        self.health = None
+        self._health_holds = set()
+        self.status_page.health_toggled.connect(self._on_health_toggled)
+        self._setup_health(self.config.get("health_checks", True))
+        self.strategies_page.hold_health = self._hold_health
+        self.autorun_page.hold_health = self._hold_health
+        self.lists_page.bypass = self._analysis_bypass
+        self.lists_page.bypass_active = self.winws.active_strategy
+        self._bypass_strategy = None
+
+        # Last session's state is shown right away, marked stale; the watcher scan
+        # (after the first frame) and StatusWorker replace it with fresh data
+        self._ui_state = uistate.load(self.app_dir)
+        self._fresh_status = None  # (status, version, time) once StatusWorker reported
+        self._save_state_on_close = True
+        if self._ui_state:
+            self._apply_ui_state(self._ui_state)
+        QTimer.singleShot(0, self._start_watcher)
+
         # Initial data load
         self._refresh_data()
 
@@ -1646,31 +3143,199 @@ class ZapretWindow(FluentWindow):
             import threading
             threading.Thread(target=self._check_updates, daemon=True).start()
 
+    def _start_watcher(self):
+        # Strategies and lists come from the watcher, status from StatusWorker
+        self.fs_watcher = WatcherBridge(self.zapret_dir, self)
+        self.fs_watcher.changed.connect(self._on_fs_changed)
+        self._update_strategies(self.fs_watcher.watcher.strategies())
+        self.lists_page.update_lists(self.fs_watcher.watcher.lists())
+
+    def _apply_ui_state(self, state):
+        self._update_strategies(state.get("strategies", []))
+        self.strategies_page.select_strategy(state.get("strategy"))
+        if state.get("autorun_strategy"):
+            self.autorun_page.strat_combo.setCurrentText(state["autorun_strategy"])
+        self.lists_page.update_lists(state.get("lists", []))
+        if state.get("list"):
+            self.lists_page.file_combo.setCurrentText(state["list"])
+        if state.get("status"):
+            self.status_page.update_status(state["status"], stale=True)
+            self.strategies_page.update_status(state["status"], stale=True)
+            self.status_page.set_stale(f"Данные {uistate.age_text(state.get('status_at', 0))}, обновляются…")
+        if state.get("version"):
+            self.status_page.set_version(state["version"])
+        page = self.findChild(QWidget, state.get("page") or "")
+        if page is not None and page is not self.settings_page:
+            self.switchTo(page)
+
+    def _save_ui_state(self):
+        previous = self._ui_state or {}
+        if self._fresh_status:
+            status, version, status_at = self._fresh_status
+        else:
+            status, version, status_at = (previous.get("status"), previous.get("version"),
+                                          previous.get("status_at", 0))
+        watcher = getattr(self, 'fs_watcher', None)
+        current = self.stackedWidget.currentWidget()
+        uistate.save(self.app_dir, {
+            "status": status, "version": version, "status_at": status_at,
+            "strategies": watcher.watcher.strategies() if watcher else previous.get("strategies", []),
+            "lists": watcher.watcher.lists() if watcher else previous.get("lists", []),
+            "page": current.objectName() if current is not None else None,
+            "strategy": self.strategies_page.selected_strategy(),
+            "autorun_strategy": self.autorun_page.strat_combo.currentText(),
+            "list": self.lists_page.current_file,
+        })
+
+    def _probe_context(self):
+        """(active strategy, zapret version) that probes are tagged with."""
+        strat = self.winws.active_strategy() if self.winws else None
+        if self._fresh_status:
+            version = self._fresh_status[1]
+        else:
+            version = (self._ui_state or {}).get("version")
+        return strat, version
+
+    def _on_health_toggled(self, enabled):
+        self.config.set("health_checks", enabled)
+        self._setup_health(enabled)
+
+    def _setup_health(self, enabled):
+        if self.health:
+            self.health.stop()
+            self.health = None
+        if enabled:
+            self.health = health.HealthMonitor(
+                tuner.https_reachable, self._health_launch, self.winws.active_strategy, self._health_rank,
+                interval=self.config.get("health_interval", 300),
+                threshold=self.config.get("health_threshold", 0.5),
+                on_event=self.status_page.health_event.emit, record=self._health_record)
+            self.health.paused = bool(self._health_holds)
+            self.health.start()
+        self.status_page.set_health(enabled, self.health)
+
+    def _analysis_bypass(self, on):
+        """Stop or restore the supervised winws for a necessity analysis (worker thread)."""
+        if not on:
+            self._bypass_strategy = self.winws.active_strategy()
+            self._hold_health("analysis", True)
+            self.winws.stop()
+            return
+        if self._bypass_strategy:
+            self.winws.switch_now(self.zapret_dir / f"{self._bypass_strategy}.bat", self.zapret_dir)
+        self._hold_health("analysis", False)
+
+    def _hold_health(self, reason, held):
+        """Pause the health monitor while anything (tuning, service install, analysis) stops winws."""
+        if held:
+            self._health_holds.add(reason)
+        else:
+            self._health_holds.discard(reason)
+        if self.health:
+            self.health.paused = bool(self._health_holds)
+
+    def _health_launch(self, name):
+        # Runs on the monitor thread; failover needs the rights winws itself needs
+        if not is_admin():
+            return False
+        return self.winws.switch_now(self.zapret_dir / f"{name}.bat", self.zapret_dir)
+
+    def _health_rank(self):
+        names = [n[:-4] for n in self.fs_watcher.watcher.strategies()] if getattr(self, 'fs_watcher', None) else []
+        if not self.history:
+            return names
+        return health.rank_strategies(self.history, self.health.domains, names,
+                                      time.time() - 14 * history.DAY)
+
+    def _health_record(self, domain, ok, ms, strat):
+        if self.history:
+            self.history.record("canary", domain, ok, strat, self._probe_context()[1], https_ms=ms)
+
+    def _maintain_history(self):
+        if self.history:
+            threading.Thread(target=self.history.maintain, daemon=True).start()
+
+    def closeEvent(self, event):
+        if getattr(self, '_save_state_on_close', False):
+            self._save_ui_state()
+        if getattr(self, 'scan_cache', None):
+            self.scan_cache.save(self.app_dir / scancache.FILE)
+        if getattr(self, 'health', None):
+            self.health.stop()
+        if getattr(self, 'subscriptions', None):
+            self.subscriptions.stop()
+        if getattr(self, 'history', None):
+            self.history.close()
+        super().closeEvent(event)
+
     def _refresh_data(self):
         # Store worker as instance attribute to prevent garbage collection
-        self._status_worker = StatusWorker(self.zapret_dir, self.lists_dir)
+        self._status_worker = StatusWorker(self.zapret_dir)
         self._status_worker.result.connect(self._on_data_loaded)
         self._status_worker.start()
 
-    def _on_data_loaded(self, status, strategies, lists, version):
+    def _on_data_loaded(self, status, version):
+        self._fresh_status = (status, version, time.time())
         # Update all pages with new data
         if hasattr(self, 'status_page'):
             self.status_page.update_status(status)
             self.status_page.set_version(version)
+            self.status_page.set_stale(None)
         if hasattr(self, 'strategies_page'):
             self.strategies_page.update_status(status)
-            self.strategies_page.update_strategies(strategies)
-        if hasattr(self, 'autorun_page'):
-            self.autorun_page.update_strategies(strategies)
-        if hasattr(self, 'lists_page'):
-            self.lists_page.update_lists(lists)
+        if self.control:
+            self.control.publish_status(status, version)
+
+    def _update_strategies(self, strategies):
+        self.strategies_page.update_strategies(strategies)
+        self.autorun_page.update_strategies(strategies)
+
+    def _on_fs_changed(self, events):
+        watcher = self.fs_watcher.watcher
+        if self.control:
+            self.control.publish_fs(events)
+        kinds_added_removed = {e.kind for e in events if e.action != MODIFIED}
+        if STRATEGY in kinds_added_removed:
+            self._update_strategies(watcher.strategies())
+        elif any(e.kind == STRATEGY for e in events):
+            self.strategies_page.show_strategy_info()
+        if LIST in kinds_added_removed:
+            self.lists_page.update_lists(watcher.lists())
+
+        changed_lists = [e.name for e in events if e.kind == LIST]
+        if changed_lists:
+            def reindex():
+                for name in changed_lists:
+                    try:
+                        self.search_index.update_file(name)
+                    except Exception as ex:
+                        log.error("Search index error: %s", ex)
+            threading.Thread(target=reindex, daemon=True).start()
+
+        reload_options = False
+        for e in events:
+            if e.kind == LIST and e.action == MODIFIED:
+                self.lists_page.on_file_changed(e.name)
+            if e.kind == TOGGLE or (e.kind == LIST and e.name == "ipset-all.txt"):
+                reload_options = True
+        if reload_options:
+            self.options_page.reload_state()
 
     def _on_theme_change(self, theme_name):
         theme = Theme.DARK if theme_name == "dark" else Theme.LIGHT
         setTheme(theme)
 
     def _on_reset(self):
+        if hasattr(self, 'winws'):
+            self.winws.stop()
+        if hasattr(self, 'fs_watcher'):
+            self.fs_watcher.stop()
+        if hasattr(self, 'snapshots'):
+            self.snapshots.snapshot_before("reset")
+            self.snapshots.stop()
         ServiceManager.remove_service()
+        self._save_state_on_close = False
+        uistate.clear(self.app_dir)
         # Clear zapret dir
         if self.zapret_dir.exists():
             try:
@@ -1679,7 +3344,7 @@ class ZapretWindow(FluentWindow):
                 pass
         # Restart with install
         self.close()
-        self.new_window = ZapretWindow()
+        self.new_window = ZapretWindow(self.control)
         self.new_window.show()
 
     def _check_updates(self):
@@ -1755,11 +3420,42 @@ def run_as_admin():
         return True
 
 
+def show_running_instance(app_dir) -> bool:
+    """Ask an already running instance to show its window."""
+    client = ControlClient.connect(app_dir)
+    if not client:
+        return False
+    try:
+        if sys.platform == "win32":
+            # Let the running instance take the foreground we currently own
+            ctypes.windll.user32.AllowSetForegroundWindow(-1)  # ASFW_ANY
+        client.call("show")
+        return True
+    except Exception:
+        return False
+    finally:
+        client.close()
+
+
 def main():
+    # A second launch just brings the running window forward
+    app_dir = get_app_dir()
+    if show_running_instance(app_dir):
+        sys.exit(0)
+
     # Check admin rights and restart if needed
     if not is_admin():
         run_as_admin()
         sys.exit(0)  # Always exit, either new admin process started or user cancelled
+
+    instance_lock = InstanceLock(app_dir)
+    if not instance_lock.acquire():
+        # Running elevated; the unelevated attempt above may not reach it
+        show_running_instance(app_dir)
+        sys.exit(0)
+
+    applog.setup(app_dir)
+    log.info("Zapret GUI starting")
     
     # Disable QFluentWidgets animations for better performance
     os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "1"
@@ -1781,11 +3477,24 @@ def main():
         try:
             check_and_install_self()
         except Exception as e:
-            print(f"Self-install error: {e}")
+            log.exception("Self-install error: %s", e)
+
+    control = ControlBridge(app_dir)
+    try:
+        control.start()
+    except Exception as e:
+        log.error("Control server error: %s", e)
+        control = None
 
-    window = ZapretWindow()
+    window = ZapretWindow(control)
     window.show()
-    sys.exit(app.exec())
+    code = app.exec()
+    metrics.REGISTRY.flush()
+    if control:
+        control.stop()
+    instance_lock.release()
+    applog.shutdown()
+    sys.exit(code)
 
 def create_shortcut(target_path: Path):
     """Create shortcut using PowerShell to avoid win32com dependency"""
@@ -0,0 +1,367 @@
+"""
+In-process metrics: counters, histograms and spans.
+
+    import metrics
+
+    with metrics.span("service.install", strategy=name):
+        ...
+
+    @metrics.timed("installer.download")
+    def download(...): ...
+
+    metrics.count("http.requests", host="api.github.com")
+
+Everything is a no-op until metrics.enable() is called: span() hands back a
+shared null context manager and count()/observe() return after one flag
+check, so the instrumentation can stay in hot paths.
+
+Spans record their duration (seconds) in a histogram of the same name and
+count failures in "<name>.errors". Recent spans are kept for the diagnostics
+page and can be appended to a JSONL file; render_prometheus() produces the
+text exposition format, which PrometheusServer serves on /metrics.
+"""
+
+import bisect
+import functools
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+RECENT_SPANS = 500
+FLUSH_INTERVAL = 5.0
+
+_enabled = False
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets, interpolating linearly inside the bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                value = lower + (upper - lower) * (rank - seen) / c
+                return min(max(value, self.min), self.max)
+            seen += c
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self._jsonl: Optional[Path] = None
+        self._pending: List[dict] = []
+        self._flusher = None
+
+    def count(self, name: str, value: float = 1, labels: Optional[dict] = None):
+        key = _key(name, labels or {})
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None):
+        key = _key(name, labels or {})
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def record_span(self, name: str, labels: dict, start: float, duration: float, error: Optional[str]):
+        key = _key(name, labels)
+        record = {"ts": round(start, 6), "span": name, "ms": round(duration * 1000, 3)}
+        if labels:
+            record["labels"] = dict(key[1])
+        if error:
+            record["error"] = error
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(duration)
+            if error:
+                err_key = (name + ".errors", key[1])
+                self.counters[err_key] = self.counters.get(err_key, 0) + 1
+            self.recent.append(record)
+            if self._jsonl is not None:
+                self._pending.append(record)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.recent.clear()
+
+    # ----- export -----
+
+    def set_jsonl(self, path: Optional[Path]):
+        """Append every finished span to path, written every FLUSH_INTERVAL seconds."""
+        self.flush()
+        self._jsonl = path
+        if path is not None and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            path = self._jsonl
+        if pending and path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for record in pending:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def snapshot(self) -> List[dict]:
+        """One row per histogram with its summary statistics, for display."""
+        with self._lock:
+            rows = []
+            for (name, labels), hist in sorted(self.histograms.items()):
+                rows.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": hist.count,
+                    "errors": int(self.counters.get((name + ".errors", labels), 0)),
+                    "total_ms": hist.sum * 1000,
+                    "mean_ms": hist.mean * 1000,
+                    "p50_ms": hist.quantile(0.5) * 1000,
+                    "p95_ms": hist.quantile(0.95) * 1000,
+                    "max_ms": hist.max * 1000,
+                })
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())
+                        if not name.endswith(".errors")]
+        return rows + counters
+
+    def export_jsonl(self, path: Path):
+        """Write the current snapshot, one JSON object per metric."""
+        with open(path, "w", encoding="utf-8") as f:
+            ts = time.time()
+            for row in self.snapshot():
+                f.write(json.dumps(dict(row, ts=ts), ensure_ascii=False) + "\n")
+
+    def render_prometheus(self) -> str:
+        def metric_name(name):
+            return "zapret_" + "".join(c if c.isalnum() else "_" for c in name)
+
+        def esc(v):
+            return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def fmt_labels(labels, extra=None):
+            items = list(labels) + ([extra] if extra else [])
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                m = metric_name(name) + "_total"
+                if m not in typed:
+                    typed.add(m)
+                    lines.append(f"# TYPE {m} counter")
+                lines.append(f"{m}{fmt_labels(labels)} {value:g}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                m = metric_name(name) + "_seconds"
+                if m not in typed:
+                    typed.add(m)
+                    lines.append(f"# TYPE {m} histogram")
+                cumulative = 0
+                for bound, c in zip(BUCKETS, hist.counts):
+                    cumulative += c
+                    lines.append(f"{m}_bucket{fmt_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+                lines.append(f"{m}_bucket{fmt_labels(labels, ('le', '+Inf'))} {hist.count}")
+                lines.append(f"{m}_sum{fmt_labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{m}_count{fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ----- module-level API -----
+
+def enable(jsonl_path: Optional[Path] = None):
+    global _enabled
+    _enabled = True
+    REGISTRY.set_jsonl(jsonl_path)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    REGISTRY.set_jsonl(None)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def count(name: str, value: float = 1, **labels):
+    if _enabled:
+        REGISTRY.count(name, value, labels)
+
+
+def observe(name: str, value: float, **labels):
+    if _enabled:
+        REGISTRY.observe(name, value, labels)
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.record_span(self.name, self.labels, self.start, time.perf_counter() - self.t0,
+                             exc_type.__name__ if exc_type else None)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **labels):
+    return _Span(name, labels) if _enabled else _NULL_SPAN
+
+
+def timed(name: str):
+    """Decorator: run the function inside span(name)."""
+    def wrap(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+# ----- Prometheus endpoint -----
+
+_prometheus = None
+
+class PrometheusServer:
+    """Serves render_prometheus() on http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, port: int = 9464, host: str = "127.0.0.1", registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def serve_prometheus(port: int = 9464) -> "PrometheusServer":
+    """Start (or keep) the process-wide /metrics endpoint."""
+    global _prometheus
+    if _prometheus is None or _prometheus.port != port:
+        stop_prometheus()
+        server = PrometheusServer(port)
+        server.start()
+        _prometheus = server
+    return _prometheus
+
+
+def stop_prometheus():
+    global _prometheus
+    if _prometheus is not None:
+        _prometheus.stop()
+        _prometheus = None
@@ -0,0 +1,228 @@
+"""
+Necessity analysis: which list entries actually need the bypass.
+
+Every domain is checked twice, once with winws stopped and once with it
+running, and put into one of three classes:
+
+    fixed          blocked without the bypass, reachable with it (keep)
+    not_fixed      unreachable either way: dead, or needs another strategy
+    never_blocked  reachable without the bypass (prune candidate)
+
+The first phase checks every domain; the second only the ones that failed,
+so the bypass is toggled exactly twice. Checks run on a thread pool behind
+a token-bucket rate limit, and a domain counts as reachable after any of
+`attempts` successful checks, so a single lost handshake doesn't make it
+look blocked.
+
+Only a TLS handshake is checked: throttled (rather than blocked) hosts look
+reachable, which is why the domains the bypass exists for (PROTECTED and
+their subdomains) are never suggested for pruning.
+
+analyze() returns a Report (the dry run); prune_lines() applies it.
+SimulatedNetwork stands in for the network in the bench.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import listlint
+import metrics
+
+FIXED = "fixed"
+NOT_FIXED = "not_fixed"
+NEVER_BLOCKED = "never_blocked"
+
+PROTECTED = ("youtube.com", "googlevideo.com", "ytimg.com", "ggpht.com",
+             "discord.com", "discord.gg", "discordapp.com", "discordapp.net", "discord.media")
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_protected(domain: str, protected: Iterable[str] = PROTECTED) -> bool:
+    return any(domain == p or domain.endswith("." + p) for p in protected)
+
+
+def list_domains(lines: Iterable[str]) -> List[str]:
+    """Normalized, valid, unique hostnames of a list in file order (IPs and comments skipped)."""
+    seen = set()
+    out = []
+    stages = [listlint.normalize(), listlint.validate(), listlint.drop_invalid(), listlint.strip_comments()]
+    stream = listlint.read_records(lines)
+    for stage in stages:
+        stream = stage(stream)
+    for rec in stream:
+        if rec.kind == listlint.DOMAIN and rec.text not in seen:
+            seen.add(rec.text)
+            out.append(rec.text)
+    return out
+
+
+def probe_all(domains: List[str], check: Callable[[str], bool], workers: int = 32, rate: float = 20.0,
+              attempts: int = 2, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, bool]:
+    """Reachability of every domain, checked concurrently under a rate limit."""
+    limiter = RateLimiter(rate)
+    done = [0]
+    lock = threading.Lock()
+
+    def one(domain):
+        ok = False
+        for _ in range(attempts):
+            limiter.acquire()
+            try:
+                ok = bool(check(domain))
+            except Exception:
+                ok = False
+            if ok:
+                break
+        with lock:
+            done[0] += 1
+            if progress:
+                progress(done[0], len(domains))
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(domains, pool.map(one, domains)))
+
+
+class Report:
+    def __init__(self, classes: Dict[str, str], protected: Set[str], seconds: float, checks: int):
+        self.classes = classes
+        self.protected = protected
+        self.seconds = seconds
+        self.checks = checks
+
+    def domains(self, kind: str) -> List[str]:
+        return [d for d, c in self.classes.items() if c == kind]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {FIXED: 0, NOT_FIXED: 0, NEVER_BLOCKED: 0}
+        for c in self.classes.values():
+            counts[c] += 1
+        return counts
+
+    def prune_set(self, include_not_fixed: bool = False) -> Set[str]:
+        kinds = {NEVER_BLOCKED, NOT_FIXED} if include_not_fixed else {NEVER_BLOCKED}
+        return {d for d, c in self.classes.items() if c in kinds and d not in self.protected}
+
+    def summary(self) -> str:
+        c = self.counts()
+        return (f"Проверено {len(self.classes)} доменов за {self.seconds:.0f} с: "
+                f"нужен обход — {c[FIXED]}, недоступны в обоих режимах — {c[NOT_FIXED]}, "
+                f"доступны без обхода — {c[NEVER_BLOCKED]}")
+
+    def to_json(self) -> dict:
+        return {"counts": self.counts(), "seconds": round(self.seconds, 1), "checks": self.checks,
+                "prune": sorted(self.prune_set()), "protected": sorted(self.protected),
+                "classes": self.classes}
+
+
+def analyze(domains: List[str], check: Callable[[str], bool], bypass: Callable[[bool], None],
+            workers: int = 32, rate: float = 20.0, attempts: int = 2,
+            protected: Iterable[str] = PROTECTED,
+            progress: Optional[Callable[[str, int, int], None]] = None) -> Report:
+    """Check domains without, then with the bypass; the bypass is left on."""
+    t0 = time.monotonic()
+    checks = [0]
+    lock = threading.Lock()
+
+    def counted(domain):
+        with lock:
+            checks[0] += 1
+        return check(domain)
+
+    def phase(name):
+        return (lambda done, total: progress(name, done, total)) if progress else None
+
+    with metrics.span("necessity.analyze"):
+        try:
+            bypass(False)
+            direct = probe_all(domains, counted, workers, rate, attempts, phase("direct"))
+            blocked = [d for d in domains if not direct[d]]
+        finally:
+            bypass(True)
+        bypassed = probe_all(blocked, counted, workers, rate, attempts, phase("bypass"))
+
+    classes = {}
+    for d in domains:
+        if direct[d]:
+            classes[d] = NEVER_BLOCKED
+        else:
+            classes[d] = FIXED if bypassed[d] else NOT_FIXED
+    protected = {d for d in domains if is_protected(d, protected)}
+    return Report(classes, protected, time.monotonic() - t0, checks[0])
+
+
+def prune_lines(lines: List[str], remove: Set[str]) -> Tuple[List[str], int]:
+    """Drop the lines whose entry (normalized as in list_domains) is in `remove`."""
+    drop = {rec.line_no for rec in listlint.normalize()(listlint.read_records(lines))
+            if rec.kind == listlint.DOMAIN and rec.text in remove}
+    return [line for i, line in enumerate(lines, 1) if i not in drop], len(drop)
+
+
+class SimulatedNetwork:
+    """Offline model of a censored network.
+
+    `blocked` hosts fail without the bypass; of those, `unfixable` ones fail
+    with it too; `dead` hosts never answer. Every check takes `latency`
+    seconds and fails at random with probability `loss`.
+    """
+
+    def __init__(self, blocked: Set[str], unfixable: Set[str] = frozenset(), dead: Set[str] = frozenset(),
+                 latency: float = 0.05, loss: float = 0.02, seed: int = 0):
+        self.blocked = set(blocked)
+        self.unfixable = set(unfixable)
+        self.dead = set(dead)
+        self.latency = latency
+        self.loss = loss
+        self.bypass_on = True
+        self.toggles = 0
+        self.checks = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def set_bypass(self, on: bool):
+        self.toggles += 1
+        self.bypass_on = on
+
+    def check(self, domain: str) -> bool:
+        with self._lock:
+            self.checks += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            lost = self.rnd.random() < self.loss
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if lost or domain in self.dead:
+            return False
+        if domain in self.blocked:
+            return self.bypass_on and domain not in self.unfixable
+        return True
@@ -0,0 +1,275 @@
+"""
+Port interval sets and a filter compiler for winws arguments.
+
+PortSet keeps ports as sorted, disjoint, non-adjacent intervals, so every
+set has exactly one shortest spelling ("80,443-444,1024-65535").
+
+compile_strategy() reads the --wf-tcp/--wf-udp capture filters and the
+--filter-tcp/--filter-udp port filters of every profile (with %GameFilter%
+resolved) and rewrites them to the smallest equivalent form. It relies on
+two winws rules:
+
+- profiles are tried left to right and the first match wins, so ports of a
+  profile that an earlier profile with the same hostlist/ipset/l3/l7
+  conditions already covers never reach it;
+- a profile with only --filter-tcp does not match UDP and vice versa, one
+  without either matches everything.
+
+From that it drops shadowed ports (and profiles left with none), trims
+profile filters to what WinDivert captures, and shrinks the capture filters
+to the ports some desync profile can act on. Less captured traffic means
+less work in WinDivert and winws.
+
+The Game Filter "off" value (port 12) is a placeholder and resolves to no
+ports at all.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from strategy import GAME_FILTER_OFF, Option, Strategy
+
+MAX_PORT = 65535
+TCP = "tcp"
+UDP = "udp"
+PROTOCOLS = (TCP, UDP)
+
+Interval = Tuple[int, int]
+
+
+class PortSet:
+    __slots__ = ("intervals",)
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        merged: List[List[int]] = []
+        for lo, hi in sorted(intervals):
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        self.intervals: Tuple[Interval, ...] = tuple((lo, hi) for lo, hi in merged)
+
+    @classmethod
+    def parse(cls, spec: str, game_filter: Optional["PortSet"] = None) -> "PortSet":
+        """Parse "80,443,1000-2000"; %GameFilter% expands to game_filter. Raises ValueError."""
+        intervals = []
+        for part in spec.strip('"').split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if part == "%GameFilter%":
+                intervals.extend((game_filter or EMPTY).intervals)
+                continue
+            lo, sep, hi = part.partition("-")
+            lo, hi = int(lo), int(hi) if sep else int(lo)
+            if not 0 <= lo <= hi <= MAX_PORT:
+                raise ValueError(f"bad port range: {part}")
+            intervals.append((lo, hi))
+        return cls(intervals)
+
+    def __or__(self, other: "PortSet") -> "PortSet":
+        return PortSet(self.intervals + other.intervals)
+
+    def __and__(self, other: "PortSet") -> "PortSet":
+        out = []
+        i = j = 0
+        a, b = self.intervals, other.intervals
+        while i < len(a) and j < len(b):
+            lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+            if lo <= hi:
+                out.append((lo, hi))
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return PortSet(out)
+
+    def __sub__(self, other: "PortSet") -> "PortSet":
+        return self & other.complement()
+
+    def complement(self) -> "PortSet":
+        out = []
+        start = 0
+        for lo, hi in self.intervals:
+            if lo > start:
+                out.append((start, lo - 1))
+            start = hi + 1
+        if start <= MAX_PORT:
+            out.append((start, MAX_PORT))
+        return PortSet(out)
+
+    def __contains__(self, port: int) -> bool:
+        return any(lo <= port <= hi for lo, hi in self.intervals)
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PortSet) and self.intervals == other.intervals
+
+    def __hash__(self):
+        return hash(self.intervals)
+
+    def __len__(self) -> int:
+        return sum(hi - lo + 1 for lo, hi in self.intervals)
+
+    def __str__(self) -> str:
+        return ",".join(str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in self.intervals)
+
+    def __repr__(self):
+        return f"PortSet({str(self)!r})"
+
+
+EMPTY = PortSet()
+ALL = PortSet([(0, MAX_PORT)])
+
+
+def game_filter_set(spec: str) -> PortSet:
+    """Ports the Game Filter setting stands for (see strategy.game_filter_ports)."""
+    return EMPTY if spec == GAME_FILTER_OFF else PortSet.parse(spec)
+
+
+# ----- strategy compiler -----
+
+# Profile options besides the port filters that decide whether a packet matches
+_CONDITION_PREFIXES = ("hostlist", "ipset", "filter-l3", "filter-l7", "filter-ssid", "filter-net")
+
+
+def _conditions(block: List[Option]) -> tuple:
+    return tuple(sorted(o for o in block if o[0].startswith(_CONDITION_PREFIXES)))
+
+
+def _is_desync(block: List[Option]) -> bool:
+    return any(name == "dpi-desync" for name, _ in block)
+
+
+class Overlap:
+    """Ports of profile `second` that profile `first` (same conditions) already takes."""
+
+    def __init__(self, first: int, second: int, proto: str, ports: PortSet):
+        self.first = first
+        self.second = second
+        self.proto = proto
+        self.ports = ports
+
+    def to_json(self) -> dict:
+        return {"first": self.first, "second": self.second, "proto": self.proto,
+                "ports": str(self.ports)}
+
+
+class Report:
+    def __init__(self):
+        self.overlaps: List[Overlap] = []
+        self.removed_blocks: List[int] = []
+        self.wf_before: Dict[str, Optional[PortSet]] = {}
+        self.wf_after: Dict[str, Optional[PortSet]] = {}
+        self.args_before = ""
+        self.args_after = ""
+
+    @property
+    def changed(self) -> bool:
+        return self.args_before != self.args_after
+
+    def to_json(self) -> dict:
+        return {
+            "overlaps": [o.to_json() for o in self.overlaps],
+            "removed_blocks": self.removed_blocks,
+            "wf_before": {p: str(s) if s is not None else None for p, s in self.wf_before.items()},
+            "wf_after": {p: str(s) if s is not None else None for p, s in self.wf_after.items()},
+            "args_before": self.args_before,
+            "args_after": self.args_after,
+        }
+
+
+def _block_ports(block: List[Option], game: PortSet) -> Dict[str, Optional[PortSet]]:
+    """Ports per protocol a profile matches; None means "all" (no port filter at all)."""
+    specs = {TCP: None, UDP: None}
+    for name, value in block:
+        if name in ("filter-tcp", "filter-udp") and value is not None:
+            specs[name[-3:]] = value
+    if specs[TCP] is None and specs[UDP] is None:
+        return {TCP: None, UDP: None}
+    return {p: PortSet.parse(specs[p], game) if specs[p] is not None else EMPTY for p in PROTOCOLS}
+
+
+def compile_strategy(strat: Strategy, game_filter: str) -> Tuple[Strategy, Report]:
+    """Return a copy of strat with minimized port filters, and what was changed."""
+    game = game_filter_set(game_filter)
+    report = Report()
+    report.args_before = strat.to_args()
+    result = strat.copy()
+
+    # Capture filters. Other --wf-* options (raw filters, per-direction ports)
+    # make the captured set unknown, and then the capture filters are left alone.
+    wf: Dict[str, Optional[PortSet]] = {TCP: None, UDP: None}
+    custom_wf = False
+    for name, value in strat.global_opts:
+        if name in ("wf-tcp", "wf-udp") and value is not None:
+            wf[name[-3:]] = (wf[name[-3:]] or EMPTY) | PortSet.parse(value, game)
+        else:
+            custom_wf = True
+    if custom_wf:
+        wf = {TCP: None, UDP: None}
+    report.wf_before = dict(wf)
+
+    ports = [_block_ports(b, game) for b in strat.blocks]
+    conditions = [_conditions(b) for b in strat.blocks]
+    final: Dict[int, Dict[str, Optional[PortSet]]] = {}
+    taken_by: Dict[tuple, Dict[str, PortSet]] = {}
+    for i, block in enumerate(strat.blocks):
+        taken = taken_by.setdefault(conditions[i], {TCP: EMPTY, UDP: EMPTY})
+        earlier = [j for j in range(i) if conditions[j] == conditions[i]]
+        for p in PROTOCOLS:
+            own = ports[i][p] if ports[i][p] is not None else ALL
+            shadowed = own & taken[p]
+            if shadowed:
+                first = next(j for j in earlier if ports[j][p] is None or ports[j][p] & shadowed)
+                report.overlaps.append(Overlap(first, i, p, shadowed))
+        if ports[i][TCP] is None:
+            # No port filter: nothing to rewrite, but it takes every port behind it
+            final[i] = ports[i]
+            taken_by[conditions[i]] = {TCP: ALL, UDP: ALL}
+            continue
+        new_ports = {}
+        for p in PROTOCOLS:
+            remaining = ports[i][p] - taken[p]
+            if wf[p] is not None:
+                remaining &= wf[p]
+            new_ports[p] = remaining
+            taken[p] = taken[p] | ports[i][p]
+        if not new_ports[TCP] and not new_ports[UDP]:
+            # The first profile also carries global options (--debug, --ctrack-*), so it stays
+            if i > 0:
+                report.removed_blocks.append(i)
+            else:
+                final[i] = ports[i]
+            continue
+        opts = [o for o in block if o[0] not in ("filter-tcp", "filter-udp")]
+        filters = [(f"filter-{p}", str(new_ports[p])) for p in PROTOCOLS if new_ports[p]]
+        position = next(k for k, o in enumerate(block) if o[0] in ("filter-tcp", "filter-udp"))
+        result.blocks[i] = opts[:position] + filters + opts[position:]
+        final[i] = new_ports
+    result.blocks = [result.blocks[i] for i in sorted(final)]
+
+    # Capture only what some desync profile can act on
+    wf_after = dict(wf)
+    for p in PROTOCOLS:
+        if wf[p] is not None:
+            wanted = EMPTY
+            for i, block_ports in final.items():
+                if _is_desync(strat.blocks[i]):
+                    wanted = wanted | (block_ports[p] if block_ports[p] is not None else ALL)
+            wf_after[p] = wf[p] & wanted
+    # Without any capture filter left winws would refuse to start; keep the original then
+    if not custom_wf and any(wf_after.values()):
+        result.global_opts = [(f"wf-{p}", str(wf_after[p])) for p in PROTOCOLS if wf_after[p]]
+    else:
+        wf_after = dict(wf)
+    report.wf_after = wf_after
+    report.args_after = result.to_args()
+    return result, report
+
+
+def minimize_args(args: str, game_filter: str) -> str:
+    """Smallest equivalent winws arguments (see compile_strategy)."""
+    compiled, _ = compile_strategy(Strategy.from_args("", args), game_filter)
+    return compiled.to_args()
@@ -0,0 +1,116 @@
+"""
+Capture of a child process's console output.
+
+PipeReader drains a pipe on its own thread with large os.read() calls and
+splits the data into lines, so the child never blocks on a full pipe no
+matter how slow the consumer is. Lines go into a LineRing: a bounded buffer
+that drops the oldest lines when full (counting them) instead of pushing
+back on the reader. Consumers poll with since(seq).
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+CAPACITY = 20_000
+MAX_LINE = 4096
+READ_SIZE = 65536
+
+ENCODING = "cp866" if sys.platform == "win32" else "utf-8"
+
+Line = Tuple[int, float, str]  # seq, time, text
+
+
+class LineRing:
+    def __init__(self, capacity: int = CAPACITY):
+        self.lines = deque(maxlen=capacity)
+        self.seq = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def append(self, text: str):
+        self.extend([text])
+
+    def extend(self, texts: List[str]):
+        now = time.time()
+        with self._lock:
+            for text in texts:
+                if len(self.lines) == self.lines.maxlen:
+                    self.dropped += 1
+                self.seq += 1
+                self.lines.append((self.seq, now, text))
+
+    def since(self, seq: int, limit: Optional[int] = None) -> List[Line]:
+        """Lines newer than seq (the oldest ones first, at most `limit`)."""
+        with self._lock:
+            if not self.lines or self.lines[-1][0] <= seq:
+                return []
+            start = max(0, seq - self.lines[0][0] + 1)
+            end = len(self.lines) if limit is None else min(len(self.lines), start + limit)
+            return list(itertools.islice(self.lines, start, end))
+
+    def search(self, text: str) -> List[Line]:
+        needle = text.lower()
+        with self._lock:
+            return [line for line in self.lines if needle in line[2].lower()]
+
+    def export(self, path: Path) -> int:
+        with self._lock:
+            lines = list(self.lines)
+        with open(path, "w", encoding="utf-8") as f:
+            for _, created, text in lines:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))} {text}\n")
+        return len(lines)
+
+    def clear(self):
+        with self._lock:
+            self.lines.clear()
+
+
+class PipeReader:
+    """Reads a binary pipe until EOF on a daemon thread, feeding a LineRing."""
+
+    def __init__(self, stream, ring: LineRing, encoding: str = ENCODING):
+        self.stream = stream
+        self.ring = ring
+        self.encoding = encoding
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        fd = self.stream.fileno()
+        pending = b""
+        try:
+            while True:
+                chunk = os.read(fd, READ_SIZE)
+                if not chunk:
+                    break
+                data = pending + chunk
+                parts = data.split(b"\n")
+                pending = parts.pop()
+                if len(pending) > MAX_LINE:
+                    parts.append(pending)
+                    pending = b""
+                if parts:
+                    self.ring.extend([self._decode(p) for p in parts])
+        except OSError:
+            pass
+        finally:
+            if pending:
+                self.ring.append(self._decode(pending))
+            try:
+                self.stream.close()
+            except OSError:
+                pass
+
+    def _decode(self, raw: bytes) -> str:
+        text = raw.rstrip(b"\r").decode(self.encoding, errors="replace")
+        return text if len(text) <= MAX_LINE else text[:MAX_LINE] + "…"
+
+    def join(self, timeout: Optional[float] = None):
+        self.thread.join(timeout)
@@ -0,0 +1,164 @@
+"""
+Directory listing and per-file metadata cache.
+
+The zapret root and lists directories almost never change, yet callers keep
+asking for their contents and for things derived from each file (line count,
+strategy summary). A listing is remembered together with the directory's
+stat signature and served with a single stat() while that is unchanged;
+file metadata is keyed by the file's own (mtime, size, inode) and computed
+once per version of the file.
+
+Editing a file in place doesn't touch its directory's mtime, so metadata is
+always validated against the file's own stat, never the directory's.
+
+The cache can be saved to and loaded from a JSON file so the CLI, which
+runs in a fresh process every time, doesn't re-parse every strategy.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import metrics
+
+FILE = "scan_cache.json"
+FORMAT = 1
+CHUNK = 1 << 20
+
+Signature = Tuple[int, int, int]
+
+
+def _dir_signature(st: os.stat_result) -> Tuple[int, int]:
+    return st.st_mtime_ns, st.st_ino
+
+
+def _file_signature(st: os.stat_result) -> Signature:
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def count_lines(path: Path) -> int:
+    """Number of lines, counting a final line without a newline."""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return lines + (last != b"\n")
+
+
+def _describe(path: Path, size: int) -> dict:
+    meta = {"size": size, "lines": count_lines(path)}
+    if path.suffix.lower() == ".bat":
+        import strategy
+        try:
+            meta["summary"] = strategy.Strategy.from_file(path).summary()
+        except Exception as e:
+            meta["error"] = str(e)
+    return meta
+
+
+class ScanCache:
+    def __init__(self):
+        # directory -> (signature, sorted names of every regular file)
+        self._listings: Dict[str, Tuple[Tuple[int, int], Tuple[str, ...]]] = {}
+        # file path -> (signature, metadata)
+        self._meta: Dict[str, Tuple[Signature, dict]] = {}
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    def names(self, directory: Path, match: Optional[Callable[[str], bool]] = None) -> Tuple[str, ...]:
+        """Sorted file names in a directory, optionally filtered; () if it doesn't exist."""
+        key = os.fspath(directory)
+        try:
+            sig = _dir_signature(os.stat(key))
+        except OSError:
+            return ()
+        with self._lock:
+            cached = self._listings.get(key)
+        if cached and cached[0] == sig:
+            metrics.count("scancache.hit")
+            names = cached[1]
+        else:
+            metrics.count("scancache.miss")
+            names = []
+            try:
+                with os.scandir(key) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_file():
+                                names.append(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                return ()
+            names = tuple(sorted(names))
+            with self._lock:
+                self._listings[key] = (sig, names)
+                self.dirty = True
+        return tuple(n for n in names if match(n)) if match else names
+
+    def meta(self, path: Path) -> Optional[dict]:
+        """Size, line count and (for .bat) strategy summary; None if the file is gone."""
+        key = os.fspath(path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            with self._lock:
+                if self._meta.pop(key, None):
+                    self.dirty = True
+            return None
+        sig = _file_signature(st)
+        with self._lock:
+            cached = self._meta.get(key)
+        if cached and cached[0] == sig:
+            metrics.count("scancache.hit")
+            return dict(cached[1])
+        metrics.count("scancache.miss")
+        try:
+            meta = _describe(Path(key), st.st_size)
+        except OSError:
+            return None
+        with self._lock:
+            self._meta[key] = (sig, meta)
+            self.dirty = True
+        return dict(meta)
+
+    def save(self, target: Path):
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {
+                "format": FORMAT,
+                "listings": {k: [list(sig), list(names)] for k, (sig, names) in self._listings.items()},
+                "meta": {k: [list(sig), meta] for k, (sig, meta) in self._meta.items()},
+            }
+            self.dirty = False
+        tmp = target.with_name(target.name + ".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, target)
+        except OSError:
+            pass
+
+    @classmethod
+    def load(cls, source: Path) -> "ScanCache":
+        """A cache filled from a saved file; empty when it is missing or unusable."""
+        cache = cls()
+        try:
+            data = json.loads(source.read_text(encoding="utf-8"))
+            if data.get("format") != FORMAT:
+                return cache
+            for k, (sig, names) in data.get("listings", {}).items():
+                cache._listings[k] = (tuple(sig), tuple(names))
+            for k, (sig, meta) in data.get("meta", {}).items():
+                cache._meta[k] = (tuple(sig), meta)
+        except (OSError, ValueError, TypeError, AttributeError):
+            return cls()
+        return cache
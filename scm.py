@@ -0,0 +1,341 @@
+"""
+Windows service transitions for zapret.
+
+Each transition issues its commands and then polls the real state until it
+is reached or a deadline passes; nothing sleeps for a fixed time.
+Independent commands run concurrently. install() records the previous
+service configuration and restores it when the new one cannot be started.
+
+All access to the service control manager goes through a backend:
+ScBackend drives sc.exe/reg.exe/tasklist (argument lists, no shell), and
+FakeScm simulates one in memory with configurable latencies for
+benchmarks (python bench.py service).
+"""
+
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+SERVICE = "zapret"
+DRIVERS = ["WinDivert", "WinDivert14"]
+WINWS = "winws.exe"
+REG_KEY = r"HKLM\System\CurrentControlSet\Services\zapret"
+REG_VALUE = "zapret-discord-youtube"
+DESCRIPTION = "Zapret DPI bypass"
+
+# Service states (sc.exe numeric codes)
+STOPPED = "STOPPED"
+START_PENDING = "START_PENDING"
+STOP_PENDING = "STOP_PENDING"
+RUNNING = "RUNNING"
+_STATE_CODES = {1: STOPPED, 2: START_PENDING, 3: STOP_PENDING, 4: RUNNING}
+
+POLL_INTERVAL = 0.05
+STOP_TIMEOUT = 10.0
+START_TIMEOUT = 10.0
+
+
+class ServiceError(Exception):
+    pass
+
+
+def wait_for(predicate: Callable[[], bool], timeout: float, interval: float = POLL_INTERVAL) -> bool:
+    """Poll predicate until it is true or timeout passes; returns the last result."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if predicate():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+# ----- backends -----
+
+class ScmBackend:
+    def query(self, name: str) -> Optional[str]:
+        """Service state, or None when the service does not exist."""
+        raise NotImplementedError
+
+    def config(self, name: str) -> Optional[dict]:
+        """{"binpath", "start", "display"} or None."""
+        raise NotImplementedError
+
+    def create(self, name: str, binpath: str, display: str, start: str = "auto"):
+        raise NotImplementedError
+
+    def delete(self, name: str):
+        raise NotImplementedError
+
+    def start(self, name: str):
+        raise NotImplementedError
+
+    def stop(self, name: str):
+        raise NotImplementedError
+
+    def describe(self, name: str, text: str):
+        raise NotImplementedError
+
+    def get_value(self, key: str, value: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set_value(self, key: str, value: str, data: str):
+        raise NotImplementedError
+
+    def process_running(self, image: str) -> bool:
+        raise NotImplementedError
+
+    def kill(self, image: str):
+        raise NotImplementedError
+
+    def enable_tcp_timestamps(self):
+        raise NotImplementedError
+
+
+_START_TYPES = {"2": "auto", "3": "demand", "4": "disabled"}
+
+
+class ScBackend(ScmBackend):
+    def _run(self, *args) -> subprocess.CompletedProcess:
+        return subprocess.run(list(args), capture_output=True,
+                              creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+    @staticmethod
+    def _text(result) -> str:
+        return result.stdout.decode("cp866", errors="ignore")
+
+    def query(self, name):
+        result = self._run("sc", "query", name)
+        match = re.search(r"STATE\s*:\s*(\d+)", self._text(result))
+        if not match:
+            return None
+        return _STATE_CODES.get(int(match.group(1)), STOPPED)
+
+    def config(self, name):
+        result = self._run("sc", "qc", name)
+        if result.returncode != 0:
+            return None
+        fields = {}
+        for line in self._text(result).splitlines():
+            key, sep, value = line.partition(":")
+            if sep:
+                fields[key.strip()] = value.strip()
+        start_code = fields.get("START_TYPE", "").split(" ")[0]
+        return {"binpath": fields.get("BINARY_PATH_NAME", ""),
+                "start": _START_TYPES.get(start_code, "auto"),
+                "display": fields.get("DISPLAY_NAME", name)}
+
+    def create(self, name, binpath, display, start="auto"):
+        result = self._run("sc", "create", name, "binPath=", binpath, "DisplayName=", display,
+                           "start=", start)
+        if result.returncode != 0:
+            raise ServiceError(f"sc create failed: {self._text(result).strip()}")
+
+    def delete(self, name):
+        self._run("sc", "delete", name)
+
+    def start(self, name):
+        result = self._run("sc", "start", name)
+        # 1056: already running
+        if result.returncode not in (0, 1056):
+            raise ServiceError(f"sc start failed: {self._text(result).strip()}")
+
+    def stop(self, name):
+        self._run("sc", "stop", name)
+
+    def describe(self, name, text):
+        self._run("sc", "description", name, text)
+
+    def get_value(self, key, value):
+        result = self._run("reg", "query", key, "/v", value)
+        match = re.search(r"REG_SZ\s+(.*)", self._text(result))
+        return match.group(1).strip() if match else None
+
+    def set_value(self, key, value, data):
+        self._run("reg", "add", key, "/v", value, "/t", "REG_SZ", "/d", data, "/f")
+
+    def process_running(self, image):
+        result = self._run("tasklist", "/FI", f"IMAGENAME eq {image}", "/NH")
+        return image.lower() in self._text(result).lower()
+
+    def kill(self, image):
+        self._run("taskkill", "/F", "/IM", image)
+
+    def enable_tcp_timestamps(self):
+        self._run("netsh", "interface", "tcp", "set", "global", "timestamps=enabled")
+
+
+class FakeScm(ScmBackend):
+    """In-memory SCM. Every command costs `latency`; state changes take `transition`."""
+
+    def __init__(self, latency: float = 0.03, transition: float = 0.15, fail_starts: int = 0):
+        self.latency = latency
+        self.transition = transition
+        self.fail_starts = fail_starts  # number of upcoming start() calls that fail
+        self.services: Dict[str, dict] = {}
+        self.values: Dict[Tuple[str, str], str] = {}
+        self.processes: Dict[str, float] = {}  # image -> time it exits (inf while running)
+        self.calls: List[str] = []
+        self._lock = threading.Lock()
+
+    def _cmd(self, name):
+        with self._lock:
+            self.calls.append(name)
+        time.sleep(self.latency)
+
+    def _state(self, svc):
+        target, at = svc["target"], svc["at"]
+        if time.monotonic() >= at:
+            return target
+        return START_PENDING if target == RUNNING else STOP_PENDING
+
+    def query(self, name):
+        self._cmd("query")
+        svc = self.services.get(name)
+        if svc is None or (svc["deleted"] and self._state(svc) == STOPPED):
+            self.services.pop(name, None)
+            return None
+        return self._state(svc)
+
+    def config(self, name):
+        self._cmd("qc")
+        svc = self.services.get(name)
+        return dict(svc["config"]) if svc else None
+
+    def create(self, name, binpath, display, start="auto"):
+        self._cmd("create")
+        if name in self.services:
+            raise ServiceError("sc create failed: service exists")
+        self.services[name] = {"config": {"binpath": binpath, "start": start, "display": display},
+                               "target": STOPPED, "at": 0.0, "deleted": False}
+
+    def delete(self, name):
+        self._cmd("delete")
+        svc = self.services.get(name)
+        if svc:
+            svc["deleted"] = True
+
+    def start(self, name):
+        self._cmd("start")
+        svc = self.services.get(name)
+        if svc is None or self.fail_starts:
+            self.fail_starts = max(0, self.fail_starts - 1)
+            raise ServiceError("sc start failed")
+        svc.update(target=RUNNING, at=time.monotonic() + self.transition)
+        if name == SERVICE:
+            self.processes[WINWS] = float("inf")
+
+    def stop(self, name):
+        self._cmd("stop")
+        svc = self.services.get(name)
+        if svc and svc["target"] != STOPPED:
+            svc.update(target=STOPPED, at=time.monotonic() + self.transition)
+            if name == SERVICE:
+                self.processes[WINWS] = svc["at"]
+
+    def describe(self, name, text):
+        self._cmd("description")
+
+    def get_value(self, key, value):
+        self._cmd("reg query")
+        return self.values.get((key, value))
+
+    def set_value(self, key, value, data):
+        self._cmd("reg add")
+        self.values[(key, value)] = data
+
+    def process_running(self, image):
+        self._cmd("tasklist")
+        return time.monotonic() < self.processes.get(image, 0.0)
+
+    def kill(self, image):
+        self._cmd("taskkill")
+        self.processes.pop(image, None)
+
+    def enable_tcp_timestamps(self):
+        self._cmd("netsh")
+
+
+# ----- transitions -----
+
+def _parallel(*calls: Callable[[], None]):
+    """Run independent calls concurrently, re-raising the first error."""
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        for future in [pool.submit(c) for c in calls]:
+            future.result()
+
+
+def stop(scm: ScmBackend, timeout: float = STOP_TIMEOUT) -> bool:
+    """Stop the service and any winws.exe; True once both are gone."""
+    with metrics.span("service.step", step="stop"):
+        _parallel(lambda: scm.stop(SERVICE), lambda: scm.kill(WINWS))
+        return wait_for(lambda: scm.query(SERVICE) in (None, STOPPED)
+                        and not scm.process_running(WINWS), timeout)
+
+
+def remove(scm: ScmBackend, timeout: float = STOP_TIMEOUT) -> bool:
+    """Stop and delete the service and the WinDivert drivers."""
+    stopped = stop(scm, timeout)
+    with metrics.span("service.step", step="delete"):
+        _parallel(*[lambda n=n: scm.delete(n) for n in [SERVICE] + DRIVERS])
+        # Drivers can stay "marked for deletion" until they stop; only the service must be gone
+        return stopped and wait_for(lambda: scm.query(SERVICE) is None, timeout)
+
+
+def install(scm: ScmBackend, binpath: str, strategy_name: str,
+            timeout: float = START_TIMEOUT) -> Tuple[bool, str]:
+    """Replace the service with one running binpath, rolling back on failure."""
+    with metrics.span("service.step", step="snapshot"):
+        snap = {}
+        _parallel(lambda: snap.update(config=scm.config(SERVICE)),
+                  lambda: snap.update(state=scm.query(SERVICE)),
+                  lambda: snap.update(value=scm.get_value(REG_KEY, REG_VALUE)))
+        previous = snap["config"]
+        previous_running = previous is not None and snap["state"] == RUNNING
+        previous_value = snap["value"] if previous else None
+
+    # Removing the old service and the TCP tweak don't depend on each other
+    with metrics.span("service.step", step="prepare"):
+        results = {}
+        _parallel(lambda: results.update(removed=remove(scm, timeout)),
+                  scm.enable_tcp_timestamps)
+    if not results["removed"]:
+        return False, "Не удалось удалить старую службу"
+
+    try:
+        with metrics.span("service.step", step="create"):
+            scm.create(SERVICE, binpath, "zapret", "auto")
+            _parallel(lambda: scm.describe(SERVICE, DESCRIPTION),
+                      lambda: scm.set_value(REG_KEY, REG_VALUE, strategy_name))
+        with metrics.span("service.step", step="start"):
+            scm.start(SERVICE)
+            if not wait_for(lambda: scm.query(SERVICE) == RUNNING, timeout):
+                raise ServiceError("служба не запустилась за отведённое время")
+        return True, "Служба установлена"
+    except Exception as e:
+        rollback_note = _rollback(scm, previous, previous_running, previous_value, timeout)
+        return False, f"{e}{rollback_note}"
+
+
+def _rollback(scm, previous, was_running, value, timeout) -> str:
+    with metrics.span("service.step", step="rollback"):
+        try:
+            remove(scm, timeout)
+            if previous is None:
+                return ""
+            scm.create(SERVICE, previous["binpath"], previous["display"], previous["start"])
+            calls = [lambda: scm.describe(SERVICE, DESCRIPTION)]
+            if value:
+                calls.append(lambda: scm.set_value(REG_KEY, REG_VALUE, value))
+            _parallel(*calls)
+            if was_running:
+                scm.start(SERVICE)
+                wait_for(lambda: scm.query(SERVICE) == RUNNING, timeout)
+            return "; восстановлена прежняя служба"
+        except Exception as e:
+            return f"; откат не удался: {e}"
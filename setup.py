@@ -1,8 +1,6 @@
 
 import sys
 import os
-import shutil
-import zipfile
 import subprocess
 import traceback
 import time
@@ -11,6 +9,8 @@ from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel,
                            QPushButton, QProgressBar, QMessageBox, QFrame, QCheckBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
 
+import unpack
+
 
 # Constants
 INSTALL_DIR_NAME = "zapret-gui"
@@ -42,16 +42,8 @@ class InstallThread(QThread):
                          creationflags=subprocess.CREATE_NO_WINDOW, capture_output=True)
             time.sleep(1)  # Wait for process to fully terminate
             
-            # Remove existing app dir with retry
-            if app_dir.exists():
-                for attempt in range(3):
-                    try:
-                        shutil.rmtree(app_dir)
-                        break
-                    except PermissionError:
-                        time.sleep(1)
-                        if attempt == 2:
-                            raise
+            # The existing app dir is updated in place (see unpack.install),
+            # which also keeps logs and settings stored next to the exe
             app_dir.mkdir(parents=True, exist_ok=True)
             
             # Create zapret dir
@@ -71,17 +63,14 @@ class InstallThread(QThread):
             if not zip_path.exists():
                 raise FileNotFoundError("app.zip not found in installer")
 
-            with zipfile.ZipFile(zip_path, 'r') as z:
-                # Get total size for progress
-                total_size = sum(info.file_size for info in z.infolist())
-                extracted_size = 0
-                
-                for info in z.infolist():
-                    z.extract(info, app_dir)
-                    extracted_size += info.file_size
-                    # Progress from 30 to 90
-                    pct = 30 + int((extracted_size / total_size) * 60)
-                    self.progress.emit(pct, f"Распаковка: {info.filename}")
+            def report(done, total, name):
+                # Progress from 30 to 90; throttled by unpack, not once per entry
+                pct = 30 + int(done / total * 60) if total else 90
+                self.progress.emit(pct, f"Распаковка: {done >> 20} / {total >> 20} МБ")
+
+            manifest = unpack.load_manifest(zip_path.with_name(unpack.MANIFEST_NAME))
+            stats = unpack.install(zip_path, app_dir, report, manifest)
+            self.progress.emit(90, f"Обновлено файлов: {stats['changed']} из {stats['files']}")
 
             # 3. Create Shortcut (if enabled)
             target_exe = app_dir / "ZapretGUI.exe"
@@ -0,0 +1,276 @@
+"""
+Content-addressed snapshot store for list files.
+
+File contents are stored once per SHA-256 as compressed objects (zstd when
+the zstandard package is available, zlib otherwise); every snapshot is a
+small JSON manifest mapping file names to object hashes. Unchanged files are
+detected by (mtime, size) against the previous manifest and are not even
+re-read, so snapshotting unchanged lists is nearly free.
+
+Layout under the store root:
+    objects/ab/abcdef....zst|.z
+    snapshots/20240101-120000-123456.json
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB_SUFFIX = ".z"
+ZSTD_SUFFIX = ".zst"
+
+
+def _compress(data: bytes) -> tuple:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ZSTD_SUFFIX
+    return zlib.compress(data, 9), ZLIB_SUFFIX
+
+
+def _decompress(data: bytes, suffix: str) -> bytes:
+    if suffix == ZSTD_SUFFIX:
+        if zstandard is None:
+            raise RuntimeError("Для чтения этой копии нужен пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class SnapshotStore:
+    def __init__(self, root: Path, pattern: str = "*.txt"):
+        self.root = root
+        self.pattern = pattern
+        self.objects_dir = root / "objects"
+        self.snapshots_dir = root / "snapshots"
+        self._lock = threading.Lock()
+
+    # ----- objects -----
+
+    def _object_path(self, digest: str) -> Optional[Path]:
+        base = self.objects_dir / digest[:2] / digest
+        for suffix in (ZSTD_SUFFIX, ZLIB_SUFFIX):
+            p = base.with_name(digest + suffix)
+            if p.exists():
+                return p
+        return None
+
+    def _put_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if self._object_path(digest) is None:
+            packed, suffix = _compress(data)
+            obj_dir = self.objects_dir / digest[:2]
+            obj_dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(obj_dir / (digest + suffix), packed)
+        return digest
+
+    def read_object(self, digest: str) -> bytes:
+        p = self._object_path(digest)
+        if p is None:
+            raise FileNotFoundError(f"Объект {digest[:12]} не найден")
+        return _decompress(p.read_bytes(), p.suffix)
+
+    # ----- snapshots -----
+
+    def list_snapshots(self) -> List[dict]:
+        """Manifests, newest first."""
+        result = []
+        if not self.snapshots_dir.exists():
+            return result
+        for p in sorted(self.snapshots_dir.glob("*.json"), reverse=True):
+            try:
+                manifest = json.loads(p.read_text(encoding="utf-8"))
+                manifest["id"] = p.stem
+                result.append(manifest)
+            except:
+                pass
+        return result
+
+    def load(self, snapshot_id: str) -> dict:
+        p = self.snapshots_dir / f"{snapshot_id}.json"
+        manifest = json.loads(p.read_text(encoding="utf-8"))
+        manifest["id"] = snapshot_id
+        return manifest
+
+    def latest(self) -> Optional[dict]:
+        if not self.snapshots_dir.exists():
+            return None
+        ids = sorted(p.stem for p in self.snapshots_dir.glob("*.json"))
+        return self.load(ids[-1]) if ids else None
+
+    @metrics.timed("lists.snapshot")
+    def snapshot(self, source_dir: Path, reason: str = "manual") -> Optional[dict]:
+        """Snapshot all matching files in source_dir.
+
+        Returns the new manifest, or the latest one if nothing changed since.
+        """
+        if not source_dir.exists():
+            return None
+        with self._lock:
+            prev = self.latest()
+            prev_files = prev["files"] if prev else {}
+            files = {}
+            for f in sorted(source_dir.glob(self.pattern)):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                old = prev_files.get(f.name)
+                if old and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+                    files[f.name] = old
+                    continue
+                data = f.read_bytes()
+                files[f.name] = {"hash": self._put_object(data), "size": len(data),
+                                 "mtime_ns": st.st_mtime_ns}
+
+            if prev and {n: e["hash"] for n, e in files.items()} == \
+                    {n: e["hash"] for n, e in prev_files.items()}:
+                return prev
+
+            now = datetime.now()
+            snapshot_id = now.strftime("%Y%m%d-%H%M%S-%f")
+            manifest = {"created": now.isoformat(timespec="seconds"), "reason": reason,
+                        "files": files}
+            self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self.snapshots_dir / f"{snapshot_id}.json",
+                          json.dumps(manifest, indent=1).encode("utf-8"))
+            manifest["id"] = snapshot_id
+            return manifest
+
+    @metrics.timed("lists.restore")
+    def restore(self, snapshot_id: str, dest_dir: Path, names: Optional[List[str]] = None) -> int:
+        """Write files of a snapshot back into dest_dir. Unchanged files are skipped."""
+        manifest = self.load(snapshot_id)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        count = 0
+        for name, entry in manifest["files"].items():
+            if names is not None and name not in names:
+                continue
+            target = dest_dir / name
+            data = self.read_object(entry["hash"])
+            if target.exists() and target.stat().st_size == len(data) and target.read_bytes() == data:
+                continue
+            _write_atomic(target, data)
+            count += 1
+        return count
+
+    def current_state(self, source_dir: Path) -> Dict[str, str]:
+        return {f.name: hashlib.sha256(f.read_bytes()).hexdigest()
+                for f in sorted(source_dir.glob(self.pattern))}
+
+    def diff(self, old_id: str, new_id: Optional[str] = None,
+             source_dir: Optional[Path] = None) -> Dict[str, List[str]]:
+        """Compare two snapshots, or a snapshot with the live source_dir."""
+        old = {n: e["hash"] for n, e in self.load(old_id)["files"].items()}
+        if new_id is not None:
+            new = {n: e["hash"] for n, e in self.load(new_id)["files"].items()}
+        else:
+            new = self.current_state(source_dir)
+        return {
+            "added": sorted(n for n in new if n not in old),
+            "removed": sorted(n for n in old if n not in new),
+            "changed": sorted(n for n in new if n in old and new[n] != old[n]),
+        }
+
+    def prune(self, keep: int = 50) -> int:
+        """Drop old snapshots beyond `keep` and delete unreferenced objects."""
+        with self._lock:
+            snaps = self.list_snapshots()
+            for m in snaps[keep:]:
+                try:
+                    (self.snapshots_dir / f"{m['id']}.json").unlink()
+                except OSError:
+                    pass
+            live = {e["hash"] for m in snaps[:keep] for e in m["files"].values()}
+            removed = 0
+            if self.objects_dir.exists():
+                for p in self.objects_dir.glob("*/*"):
+                    if p.name.split(".")[0] not in live:
+                        p.unlink()
+                        removed += 1
+            return removed
+
+
+class SnapshotScheduler:
+    """Background snapshots of a lists directory.
+
+    request() queues an asynchronous snapshot (requests arriving together are
+    coalesced); snapshot_before() runs one synchronously and is meant to be
+    called right before a file is overwritten. A periodic snapshot is taken
+    every `interval` seconds if anything changed.
+    """
+
+    def __init__(self, store: SnapshotStore, source_dir: Path, interval: float = 15 * 60,
+                 keep: int = 50):
+        self.store = store
+        self.source_dir = source_dir
+        self.interval = interval
+        self.keep = keep
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+
+    def request(self, reason: str = "auto"):
+        self._queue.put(reason)
+
+    def snapshot_before(self, reason: str) -> Optional[dict]:
+        try:
+            return self.store.snapshot(self.source_dir, reason)
+        except Exception as e:
+            log.error("Snapshot error: %s", e)
+            return None
+
+    def _loop(self):
+        last_prune = time.monotonic()
+        while True:
+            try:
+                reason = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                reason = "periodic"
+            if reason is None:
+                return
+            # Coalesce a burst of requests into one snapshot
+            try:
+                while True:
+                    nxt = self._queue.get_nowait()
+                    if nxt is None:
+                        return
+                    reason = nxt
+            except queue.Empty:
+                pass
+            self.snapshot_before(reason)
+            if time.monotonic() - last_prune > 24 * 3600:
+                last_prune = time.monotonic()
+                try:
+                    self.store.prune(self.keep)
+                except Exception as e:
+                    log.error("Snapshot prune error: %s", e)
@@ -0,0 +1,238 @@
+"""
+Parsing of general*.bat strategy files.
+
+A strategy is the winws.exe command line of a .bat file. Options are kept
+in order as (name, value) pairs: global WinDivert options (--wf-*) and a
+list of profiles ("blocks") separated by --new.
+"""
+
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+_OPTION_RE = re.compile(r'--([\w-]+)(?:=("[^"]*"|\S+))?')
+
+Option = Tuple[str, Optional[str]]
+
+# %GameFilter% values; "12" is the placeholder service.bat uses when it is off
+GAME_FILTER_ON = "1024-65535"
+GAME_FILTER_OFF = "12"
+
+# Batch variables that make an option value a path inside the zapret directory
+_PATH_VARS = ("%BIN%", "%LISTS%", "%~dp0")
+
+
+def extract_args(content: str) -> str:
+    """Return the raw winws.exe arguments from the text of a .bat file."""
+    args_parts = []
+    capturing = False
+
+    for line in content.split('\n'):
+        line = line.strip()
+        if 'winws.exe' in line.lower():
+            capturing = True
+            idx = line.lower().find('winws.exe')
+            rest = line[idx + len('winws.exe'):]
+            rest = rest.lstrip('"').strip()
+            if rest and rest != '^':
+                args_parts.append(rest.rstrip('^').strip())
+        elif capturing:
+            if line.startswith('start ') or line.startswith('::') or line.startswith('rem ') or not line:
+                break
+            args_parts.append(line.rstrip('^').strip())
+
+    return ' '.join(args_parts)
+
+
+def expand_args(args: str, zapret_dir: Path, game_filter: str) -> str:
+    """Substitute the batch variables the strategies use."""
+    args = args.replace('%BIN%', str(zapret_dir / "bin") + '\\')
+    args = args.replace('%LISTS%', str(zapret_dir / "lists") + '\\')
+    args = args.replace('%~dp0', str(zapret_dir) + '\\')
+    args = args.replace('%GameFilter%', game_filter)
+    args = args.replace('^!', '!')
+    return re.sub(r'\s+', ' ', args).strip()
+
+
+def winws_cmdline(zapret_dir: Path, args: str, minimize: bool = True) -> str:
+    """Full winws.exe command line for raw strategy arguments.
+
+    With minimize the port filters are first compiled to their smallest
+    equivalent form (see portset).
+    """
+    game_filter = game_filter_ports(zapret_dir)
+    if minimize:
+        import portset
+        try:
+            args = portset.minimize_args(args, game_filter)
+        except ValueError:
+            pass  # a port spec winws will complain about itself
+    expanded = expand_args(args, zapret_dir, game_filter)
+    return f'"{zapret_dir / "bin" / "winws.exe"}" {expanded}'
+
+
+def _resolve_path(value: str, zapret_dir: Path, game_filter: str) -> Path:
+    return Path(expand_args(value.strip('"'), zapret_dir, game_filter).replace("\\", "/"))
+
+
+def game_filter_ports(zapret_dir: Path) -> str:
+    return GAME_FILTER_ON if (zapret_dir / "utils" / "game_filter.enabled").exists() else GAME_FILTER_OFF
+
+
+def parse_options(args: str) -> List[Option]:
+    return [(m.group(1), m.group(2)) for m in _OPTION_RE.finditer(args)]
+
+
+def format_option(opt: Option) -> str:
+    name, value = opt
+    return f"--{name}" if value is None else f"--{name}={value}"
+
+
+class Strategy:
+    def __init__(self, name: str, global_opts: List[Option], blocks: List[List[Option]],
+                 path: Optional[Path] = None):
+        self.name = name
+        self.path = path
+        self.global_opts = global_opts
+        self.blocks = blocks
+
+    @classmethod
+    def from_args(cls, name: str, args: str, path: Optional[Path] = None) -> "Strategy":
+        global_opts = []
+        blocks = [[]]
+        for opt in parse_options(args):
+            if opt[0] == "new":
+                blocks.append([])
+            elif opt[0].startswith("wf-"):
+                global_opts.append(opt)
+            else:
+                blocks[-1].append(opt)
+        return cls(name, global_opts, [b for b in blocks if b], path)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "Strategy":
+        content = path.read_text(encoding="utf-8", errors="ignore")
+        return cls.from_args(path.stem, extract_args(content), path)
+
+    def copy(self, name: Optional[str] = None) -> "Strategy":
+        return Strategy(name or self.name, list(self.global_opts),
+                        [list(b) for b in self.blocks], self.path)
+
+    def get(self, block: int, name: str) -> Optional[str]:
+        for opt_name, value in self.blocks[block]:
+            if opt_name == name:
+                return value
+        return None
+
+    def set(self, block: int, name: str, value: Optional[str]):
+        """Replace an option in a block (appending it if missing); value None removes it."""
+        opts = self.blocks[block]
+        for i, (opt_name, _) in enumerate(opts):
+            if opt_name == name:
+                if value is None:
+                    del opts[i]
+                else:
+                    opts[i] = (name, value)
+                return
+        if value is not None:
+            opts.append((name, value))
+
+    def desync_blocks(self) -> List[int]:
+        """Indexes of profiles that actually apply a DPI desync."""
+        return [i for i, b in enumerate(self.blocks) if any(n == "dpi-desync" for n, _ in b)]
+
+    def to_args(self) -> str:
+        parts = [format_option(o) for o in self.global_opts]
+        for i, block in enumerate(self.blocks):
+            if i:
+                parts.append("--new")
+            parts.extend(format_option(o) for o in block)
+        return " ".join(parts)
+
+    def hostlists(self) -> List[str]:
+        """Raw values of every list file option (hostlist/ipset and their excludes)."""
+        return [v.strip('"') for b in self.blocks for n, v in b
+                if v and (n.startswith("hostlist") or n.startswith("ipset"))]
+
+    def summary(self) -> str:
+        modes = [self.get(i, "dpi-desync") for i in self.desync_blocks()]
+        return f"{len(self.blocks)} профилей, desync: {', '.join(sorted(set(modes))) or '—'}"
+
+    def to_bat(self, template: Optional[str] = None) -> str:
+        """Render as a .bat file, reusing the template's surrounding lines if given."""
+        lines = [format_option(o) for o in self.global_opts]
+        body = " ".join(lines) + " ^\n"
+        body += " --new ^\n".join(" ".join(format_option(o) for o in b) for b in self.blocks)
+        if template is None:
+            return ('@echo off\nchcp 65001 > nul\n:: Generated by Zapret GUI\n\ncd /d "%~dp0"\n'
+                    'set "BIN=%~dp0bin\\"\nset "LISTS=%~dp0lists\\"\n\n'
+                    f'start "zapret: %~n0" /min "%BIN%winws.exe" {body}\n')
+
+        out = []
+        capturing = False
+        for line in template.split('\n'):
+            stripped = line.strip()
+            if not capturing and 'winws.exe' in stripped.lower():
+                capturing = True
+                idx = line.lower().find('winws.exe')
+                head = line[:idx + len('winws.exe')]
+                if line[idx + len('winws.exe'):].startswith('"'):
+                    head += '"'
+                out.append(f"{head} {body}")
+                continue
+            if capturing:
+                if stripped.startswith('start ') or stripped.startswith('::') or \
+                        stripped.startswith('rem ') or not stripped:
+                    capturing = False
+                else:
+                    continue
+            out.append(line)
+        return '\n'.join(out)
+
+
+class Prepared:
+    """A strategy resolved and checked ahead of a switch (see prepare())."""
+
+    def __init__(self, name: str, cmdline: str, files: List[Path], problems: List[str]):
+        self.name = name
+        self.cmdline = cmdline
+        self.files = files
+        self.problems = problems
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def prepare(path: Path, zapret_dir: Path) -> Prepared:
+    """Parse a strategy and check everything winws will need before anything is stopped.
+
+    Every file the arguments reference (host lists, ipsets, fake payloads)
+    must exist and is read once, so the new process finds it in the OS cache.
+    """
+    try:
+        args = extract_args(path.read_text(encoding="utf-8", errors="ignore"))
+    except OSError as e:
+        return Prepared(path.stem, "", [], [str(e)])
+    problems = []
+    if not args:
+        problems.append("в файле нет команды winws.exe")
+    elif not Strategy.from_args(path.stem, args).desync_blocks():
+        problems.append("нет ни одного профиля с --dpi-desync")
+    if not (zapret_dir / "bin" / "winws.exe").exists():
+        problems.append("не найден bin/winws.exe")
+
+    game_filter = game_filter_ports(zapret_dir)
+    files = []
+    for _, value in parse_options(args):
+        if not value or not any(var in value for var in _PATH_VARS):
+            continue
+        f = _resolve_path(value, zapret_dir, game_filter)
+        try:
+            with open(f, "rb") as fh:
+                while fh.read(1 << 20):
+                    pass
+            files.append(f)
+        except OSError:
+            problems.append(f"нет файла {f.name}")
+    return Prepared(path.stem, winws_cmdline(zapret_dir, args) if args else "", files, problems)
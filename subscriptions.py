@@ -0,0 +1,324 @@
+"""
+List subscriptions: lists maintained by other people, kept merged into a
+local list file.
+
+A subscription is a URL attached to one file of the zapret lists directory.
+fetch() downloads it with a conditional request (If-None-Match and
+If-Modified-Since from the previous response), so a source that hasn't
+changed costs one 304 and no parsing. A changed source is parsed with
+importers (any list format, gzip/zip too) into a shard: the sorted, unique
+entries of that one subscription, kept under app/subscriptions/.
+
+merge() folds the shards of a list into the list file. The entries it put
+there are remembered per list (the managed set); an entry the list had
+already is the user's and is never touched. So:
+
+    - an entry every source has dropped is removed from the list; removing
+      a subscription removes exactly the entries no other subscription has
+    - an entry the user deleted by hand stays deleted while it is managed
+    - the user's entries, comments and order stay; new entries are appended
+
+A list file replaced as a whole (a zapret update or reset rewrites the
+lists) has none of the managed entries left; that is not taken for the
+user deleting them, and they are added again. refresh() merges a list when
+a shard changed or the file did since the last merge, so this happens
+without waiting for a source to change.
+
+Subscriptions refreshes due subscriptions on its own thread after start().
+"""
+
+import filecmp
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import importers
+import listdiff
+import listlint
+import metrics
+from core import APP_NAME, http_get
+
+log = logging.getLogger(__name__)
+
+DIR = "subscriptions"
+STATE = "state.json"
+FORMAT = 1
+CHUNK = 1 << 16
+
+
+def subscription_id(list_name: str, url: str) -> str:
+    return hashlib.sha1(f"{list_name}\n{url}".encode("utf-8")).hexdigest()[:12]
+
+
+def _read_set(path: Path) -> Set[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def _write_lines(path: Path, lines: Iterable[str]):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+    os.replace(tmp, path)
+
+
+class Subscriptions:
+    def __init__(self, root: Path, lists_dir: Path, get: Callable = http_get, interval: float = 6 * 3600,
+                 timeout: float = 30, before_write: Optional[Callable[[str], None]] = None,
+                 on_update: Optional[Callable[[List[dict]], None]] = None):
+        self.root = root
+        self.lists_dir = lists_dir
+        self.get = get
+        self.interval = interval
+        self.timeout = timeout
+        self.before_write = before_write  # called with a reason before a list file is rewritten
+        self.on_update = on_update        # called from the thread with refresh() results that changed a list
+        self._subs: Dict[str, dict] = {}
+        self._merged: Dict[str, list] = {}  # list -> file signature after the last merge
+        self._lock = threading.Lock()    # the state (short)
+        self._busy = threading.RLock()   # fetches and list rewrites, one at a time
+        self._thread = None
+        self._stop = threading.Event()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    # ----- state -----
+
+    def _load(self):
+        try:
+            data = json.loads((self.root / STATE).read_text(encoding="utf-8"))
+            if data.get("format") == FORMAT:
+                self._subs = {s["id"]: s for s in data.get("subscriptions", [])}
+                self._merged = dict(data.get("merged", {}))
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            self._subs, self._merged = {}, {}
+
+    def _save(self):
+        target = self.root / STATE
+        tmp = target.with_name(target.name + ".tmp")
+        with self._lock:
+            data = {"format": FORMAT, "subscriptions": [dict(s) for s in self._subs.values()],
+                    "merged": dict(self._merged)}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, target)
+
+    def _shard(self, sub_id: str) -> Path:
+        return self.root / f"{sub_id}.txt"
+
+    def _managed(self, list_name: str) -> Path:
+        return self.root / f"{list_name}.managed"
+
+    def _signature(self, list_name: str) -> Optional[list]:
+        try:
+            st = os.stat(self.lists_dir / list_name)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def subscriptions(self, list_name: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            return [dict(s) for s in self._subs.values() if list_name is None or s["list"] == list_name]
+
+    def add(self, list_name: str, url: str, kind: Optional[str] = None) -> dict:
+        """Register a subscription (fetched by the next refresh); returns it."""
+        if not (self.lists_dir / list_name).exists():
+            raise ValueError(f"Нет списка {list_name}")
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"Нужен http(s) адрес: {url}")
+        if kind is not None and (kind not in importers.FORMATS or importers.FORMATS[kind].ranked):
+            raise ValueError(f"Неизвестный формат списка: {kind}")
+        sub_id = subscription_id(list_name, url)
+        with self._lock:
+            sub = dict(self._subs.setdefault(sub_id, {
+                "id": sub_id, "list": list_name, "url": url, "format": kind, "added": time.time(),
+                "checked": None, "changed": None, "etag": None, "last_modified": None,
+                "status": None, "error": None, "entries": 0, "skipped": 0}))
+        self._save()
+        return sub
+
+    def remove(self, sub_id: str) -> dict:
+        """Drop a subscription and every list entry that only it provided."""
+        with self._busy:
+            with self._lock:
+                sub = self._subs.pop(sub_id, None)
+            if sub is None:
+                raise KeyError(sub_id)
+            self._save()
+            self._shard(sub_id).unlink(missing_ok=True)
+            return self.merge(sub["list"])
+
+    # ----- fetching -----
+
+    def fetch(self, sub_id: str, force: bool = False) -> bool:
+        """Download a subscription if it changed; True when its shard changed."""
+        with self._busy:
+            sub = self._subs[sub_id]
+            shard = self._shard(sub_id)
+            headers = {"User-Agent": APP_NAME}
+            if not force and shard.exists():
+                if sub["etag"]:
+                    headers["If-None-Match"] = sub["etag"]
+                if sub["last_modified"]:
+                    headers["If-Modified-Since"] = sub["last_modified"]
+            sub["checked"] = time.time()
+            try:
+                with metrics.span("subscriptions.fetch"):
+                    changed = self._download(sub, shard, headers)
+                sub["error"] = None
+            except Exception as e:
+                # The old shard stays: a failing source must not empty the list
+                log.warning("Subscription %s failed: %s", sub["url"], e)
+                sub["error"] = str(e)
+                changed = False
+            metrics.count("subscriptions.fetch", status=str(sub["status"]), changed=str(changed).lower())
+            self._save()
+            return changed
+
+    def _download(self, sub: dict, shard: Path, headers: dict) -> bool:
+        response = self.get(sub["url"], headers=headers, stream=True, timeout=self.timeout)
+        try:
+            sub["status"] = response.status_code
+            if response.status_code == 304:
+                return False
+            if response.status_code != 200:
+                raise OSError(f"HTTP {response.status_code}")
+            download = shard.with_suffix(".download")
+            with open(download, "wb") as f:
+                for chunk in response.iter_content(CHUNK):
+                    f.write(chunk)
+        finally:
+            response.close()
+        try:
+            kind = sub["format"] or importers.sniff(download)
+            if importers.FORMATS[kind].ranked:
+                raise ValueError(f"{kind} — не список")
+            stats = importers.Stats(kind)
+            fresh = shard.with_suffix(".new")
+            _write_lines(fresh, listdiff.iter_sorted(importers.parse(download, kind, stats), prepare=None))
+        finally:
+            download.unlink(missing_ok=True)
+        changed = not shard.exists() or not filecmp.cmp(fresh, shard, shallow=False)
+        os.replace(fresh, shard)
+        sub["etag"] = response.headers.get("ETag")
+        sub["last_modified"] = response.headers.get("Last-Modified")
+        sub["entries"] = stats.entries
+        sub["skipped"] = stats.skipped
+        if changed:
+            sub["changed"] = sub["checked"]
+        return changed
+
+    # ----- merging -----
+
+    def merge(self, list_name: str) -> dict:
+        """Bring the list file in line with its shards; counts of entries added and removed.
+
+        A list file that no longer exists (deleted, or dropped by a zapret
+        update) is skipped and the error is set on its subscriptions.
+        """
+        with self._busy, metrics.span("subscriptions.merge"):
+            path = self.lists_dir / list_name
+            if not path.exists():
+                return self._merge_failed(list_name, f"Нет списка {list_name}")
+            upstream: Set[str] = set()
+            for sub in self.subscriptions(list_name):
+                upstream |= _read_set(self._shard(sub["id"]))
+            managed = _read_set(self._managed(list_name))
+            lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+            present = {}
+            for rec in listlint.normalize()(listlint.read_records(lines)):
+                if rec.kind in (listlint.DOMAIN, listlint.IP):
+                    present.setdefault(rec.text, []).append(rec.line_no)
+            if managed and managed.isdisjoint(present):
+                managed = set()  # the file was replaced, not edited
+            # Managed entries missing from the file were deleted by the user: not re-added
+            added = sorted(upstream.difference(present, managed))
+            drop = {n for entry in managed - upstream for n in present.get(entry, ())}
+            new_managed = (managed & upstream) | set(added)
+            if added or drop:
+                if self.before_write:
+                    self.before_write(f"subscriptions {list_name}")
+                kept = [line for i, line in enumerate(lines, 1) if i not in drop]
+                _write_lines(path, kept + added)
+            if new_managed != managed:
+                _write_lines(self._managed(list_name), sorted(new_managed))
+            with self._lock:
+                self._merged[list_name] = self._signature(list_name)
+            self._save()
+            return {"list": list_name, "added": len(added), "removed": len(drop), "managed": len(new_managed)}
+
+    def _merge_failed(self, list_name: str, error: str) -> dict:
+        log.warning("Subscriptions of %s not merged: %s", list_name, error)
+        with self._lock:
+            for sub in self._subs.values():
+                if sub["list"] == list_name:
+                    sub["error"] = error
+        self._save()
+        return {"list": list_name, "added": 0, "removed": 0, "error": error}
+
+    def origin(self, list_name: str, entry: str) -> List[str]:
+        """URLs of the subscriptions providing an entry of a list; [] for the user's own."""
+        with self._busy:
+            if entry not in _read_set(self._managed(list_name)):
+                return []
+            return [s["url"] for s in self.subscriptions(list_name) if entry in _read_set(self._shard(s["id"]))]
+
+    # ----- refreshing -----
+
+    def refresh(self, ids: Optional[Iterable[str]] = None, force: bool = False,
+                now: Optional[float] = None) -> List[dict]:
+        """Fetch the given (default: due) subscriptions and merge the lists that need it."""
+        now = time.time() if now is None else now
+        with self._busy:
+            if ids is None:
+                ids = [s["id"] for s in self.subscriptions()
+                       if force or not s["checked"] or now - s["checked"] >= self.interval]
+            lists = []
+            for sub_id in ids:
+                name = self._subs[sub_id]["list"]
+                changed = self.fetch(sub_id, force)
+                # A missing list is tried every time so its subscriptions keep showing the error
+                signature = self._signature(name)
+                if name not in lists and (changed or signature is None or self._merged.get(name) != signature):
+                    lists.append(name)
+            results = []
+            for name in lists:
+                # One list failing must not hold back the others
+                try:
+                    results.append(self.merge(name))
+                except OSError as e:
+                    results.append(self._merge_failed(name, str(e)))
+            return results
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # Wake up often enough to notice due subscriptions, not the full interval
+        while not self._stop.wait(min(self.interval, 600)):
+            try:
+                results = [r for r in self.refresh() if r["added"] or r["removed"]]
+            except Exception as e:
+                log.error("Subscription refresh failed: %s", e)
+                continue
+            if results and self.on_update:
+                try:
+                    self.on_update(results)
+                except Exception as e:
+                    log.error("Subscription update handler error: %s", e)
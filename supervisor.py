@@ -0,0 +1,363 @@
+"""
+Supervisor for the winws.exe process.
+
+Owns one process started from a command line, samples its CPU time, RSS
+and handle count every `interval` seconds and restarts it with exponential
+backoff when it exits. Samples are kept as a bounded time series for the
+Status page.
+
+With an `output` procout.LineRing the process's stdout/stderr are piped
+into it (see procout.PipeReader) together with supervisor markers.
+
+switch() replaces the process with another command line in one step
+(terminate, spawn, wait for winws to report it is capturing) and returns
+the measured gap.
+
+Process access goes through a ProcessBackend. SubprocessBackend starts real
+processes and samples them through the Win32 API on Windows and /proc on
+Linux, so the supervisor runs (and can be exercised with dummy_command())
+on Linux too.
+"""
+
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+# States
+STOPPED = "stopped"
+RUNNING = "running"
+BACKOFF = "backoff"
+FAILED = "failed"
+
+# Events passed to on_event(kind, info)
+STARTED = "started"
+EXITED = "exited"
+GAVE_UP = "gave_up"
+SWITCHED = "switched"
+
+# winws prints this once WinDivert is open and packets are being processed
+READY_MARKER = "capture is started"
+READY_TIMEOUT = 5.0
+
+# (cpu seconds, rss bytes, handle or fd count); None when it can't be read
+RawSample = Optional[Tuple[float, int, int]]
+
+
+class Point:
+    __slots__ = ("t", "cpu", "rss", "handles")
+
+    def __init__(self, t: float, cpu: float, rss: int, handles: int):
+        self.t = t
+        self.cpu = cpu          # percent of one core since the previous sample
+        self.rss = rss
+        self.handles = handles
+
+
+# ----- backends -----
+
+class ProcessBackend:
+    def spawn(self, cmdline: str, cwd: Path):
+        raise NotImplementedError
+
+    def poll(self, proc) -> Optional[int]:
+        """Exit code, or None while running."""
+        raise NotImplementedError
+
+    def terminate(self, proc, timeout: float = 5.0):
+        raise NotImplementedError
+
+    def sample(self, proc) -> RawSample:
+        raise NotImplementedError
+
+
+def _win_sample(pid: int) -> RawSample:
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000 | 0x0010, False, pid)  # QUERY_LIMITED_INFORMATION | VM_READ
+    if not handle:
+        return None
+    try:
+        creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+        if not kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_),
+                                        ctypes.byref(kernel), ctypes.byref(user)):
+            return None
+        cpu = sum((ft.dwHighDateTime << 32 | ft.dwLowDateTime) for ft in (kernel, user)) / 1e7
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        count = wintypes.DWORD()
+        kernel32.GetProcessHandleCount(handle, ctypes.byref(count))
+        return cpu, counters.WorkingSetSize, count.value
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _proc_sample(pid: int) -> RawSample:
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            rss_pages = int(f.read().split()[1])
+        fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except (OSError, IndexError, ValueError):
+        return None
+    # fields[0] is the state (field 3); utime and stime are fields 14 and 15
+    cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    return cpu, rss_pages * _PAGE_SIZE, fds
+
+
+class SubprocessBackend(ProcessBackend):
+    def __init__(self, capture_output: bool = False, popen_kwargs: Optional[dict] = None):
+        self.capture_output = capture_output
+        self.popen_kwargs = popen_kwargs or {}
+
+    def spawn(self, cmdline: str, cwd: Path):
+        kwargs = dict(cwd=str(cwd), creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        if self.capture_output:
+            kwargs.update(stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        kwargs.update(self.popen_kwargs)
+        if sys.platform != "win32" and isinstance(cmdline, str):
+            cmdline = shlex.split(cmdline)
+        return subprocess.Popen(cmdline, **kwargs)
+
+    def poll(self, proc) -> Optional[int]:
+        return proc.poll()
+
+    def terminate(self, proc, timeout: float = 5.0):
+        if proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def sample(self, proc) -> RawSample:
+        if sys.platform == "win32":
+            return _win_sample(proc.pid)
+        return _proc_sample(proc.pid)
+
+
+def dummy_command(lifetime: float = 3600.0, busy: float = 0.0, exit_code: int = 1,
+                  startup: Optional[float] = None) -> str:
+    """Command line of a Python process that stands in for winws.
+
+    It spins for `busy` of every 100 ms (CPU load) and exits with exit_code
+    after `lifetime` seconds. With `startup` it prints READY_MARKER after
+    that many seconds, like winws once WinDivert is open.
+    """
+    ready = "" if startup is None else f"time.sleep({startup}); print({READY_MARKER!r}, flush=True)\n"
+    script = ("import time\n" + ready +
+              f"end = time.time() + {lifetime}\n"
+              "while time.time() < end:\n"
+              f"    t = time.time() + {busy} * 0.1\n"
+              "    while time.time() < t: pass\n"
+              f"    time.sleep({1 - busy} * 0.1)\n"
+              f"raise SystemExit({exit_code})\n")
+    argv = [sys.executable, "-c", script]
+    return subprocess.list2cmdline(argv) if sys.platform == "win32" else shlex.join(argv)
+
+
+# ----- supervisor -----
+
+class Supervisor:
+    def __init__(self, cmdline: str, cwd: Path, backend: Optional[ProcessBackend] = None,
+                 interval: float = 1.0, backoff_initial: float = 1.0, backoff_max: float = 60.0,
+                 stable_after: float = 30.0, max_restarts: Optional[int] = None,
+                 history: int = 3600, on_event: Optional[Callable[[str, dict], None]] = None,
+                 on_sample: Optional[Callable[[Point], None]] = None, output=None):
+        self.cmdline = cmdline
+        self.cwd = cwd
+        self.output = output
+        self.backend = backend or SubprocessBackend(capture_output=output is not None)
+        self.interval = interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.max_restarts = max_restarts
+        self.series = deque(maxlen=history)
+        self.on_event = on_event
+        self.on_sample = on_sample
+
+        self.state = STOPPED
+        self.proc = None
+        self.restarts = 0
+        self.last_exit_code = None
+        self._delay = backoff_initial
+        self._started_at = 0.0
+        self._prev = None  # (monotonic time, cpu seconds)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # ----- control -----
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._spawn()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            proc, self.proc = self.proc, None
+            self.state = STOPPED
+        self._wake.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.interval * 2 + 1)
+        self._wake.clear()
+        if proc is not None:
+            self.backend.terminate(proc)
+
+    def switch(self, cmdline: str, ready_timeout: float = READY_TIMEOUT) -> Optional[float]:
+        """Replace the running process with cmdline (starting the supervisor if needed).
+
+        Returns the gap in seconds from terminating the old process to the new
+        one printing READY_MARKER (or, without captured output, to it being
+        spawned), or None when it exited or did not get ready in time.
+        """
+        seq = self.output.seq if self.output is not None else 0
+        with self._lock:
+            old, self.proc = self.proc, None
+            t0 = time.monotonic()
+            if old is not None:
+                self.backend.terminate(old)
+            self.cmdline = cmdline
+            self.restarts = 0
+            self._delay = self.backoff_initial
+            self._spawn()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+        gap = self._wait_ready(t0, seq, ready_timeout)
+        self._emit(SWITCHED, gap_ms=None if gap is None else round(gap * 1000), ready=gap is not None)
+        return gap
+
+    def _wait_ready(self, t0: float, seq: int, timeout: float) -> Optional[float]:
+        proc = self.proc
+        deadline = t0 + timeout
+        while True:
+            if self.output is None:
+                return time.monotonic() - t0
+            for _, _, text in self.output.since(seq):
+                if READY_MARKER in text:
+                    return time.monotonic() - t0
+            seq = self.output.seq
+            if self.proc is not proc or self.backend.poll(proc) is not None \
+                    or time.monotonic() >= deadline:
+                return None
+            time.sleep(0.005)
+
+    @property
+    def pid(self) -> Optional[int]:
+        proc = self.proc
+        return getattr(proc, "pid", None) if proc is not None else None
+
+    def latest(self) -> Optional[Point]:
+        return self.series[-1] if self.series else None
+
+    # ----- internals -----
+
+    def _emit(self, kind: str, **info):
+        if self.output is not None:
+            details = ", ".join(f"{k}={v}" for k, v in info.items())
+            self.output.append(f"[supervisor] {kind}: {details}")
+        if self.on_event:
+            try:
+                self.on_event(kind, info)
+            except Exception:
+                pass
+
+    def _spawn(self):
+        self.proc = self.backend.spawn(self.cmdline, self.cwd)
+        stream = getattr(self.proc, "stdout", None)
+        if self.output is not None and stream is not None:
+            from procout import PipeReader
+            PipeReader(stream, self.output)
+        self.state = RUNNING
+        self._started_at = time.monotonic()
+        self._prev = None
+        self._emit(STARTED, pid=getattr(self.proc, "pid", None), restarts=self.restarts)
+
+    def _loop(self):
+        next_restart = 0.0
+        while not self._wake.wait(self.interval):
+            with self._lock:
+                if self._thread is None:
+                    return
+                now = time.monotonic()
+                if self.state == RUNNING:
+                    code = self.backend.poll(self.proc)
+                    if code is None:
+                        self._sample(now)
+                        continue
+                    uptime = now - self._started_at
+                    self.last_exit_code = code
+                    if uptime >= self.stable_after:
+                        self._delay = self.backoff_initial
+                    if self.max_restarts is not None and self.restarts >= self.max_restarts:
+                        self.state = FAILED
+                        self._emit(GAVE_UP, code=code, restarts=self.restarts)
+                        self._thread = None
+                        return
+                    self.state = BACKOFF
+                    next_restart = now + self._delay
+                    self._emit(EXITED, code=code, uptime=uptime, retry_in=self._delay)
+                    self._delay = min(self._delay * 2, self.backoff_max)
+                elif self.state == BACKOFF and now >= next_restart:
+                    self.restarts += 1
+                    try:
+                        self._spawn()
+                    except OSError as e:
+                        next_restart = now + self._delay
+                        self._emit(EXITED, code=None, error=str(e), retry_in=self._delay)
+                        self._delay = min(self._delay * 2, self.backoff_max)
+
+    def _sample(self, now: float):
+        raw = self.backend.sample(self.proc)
+        if raw is None:
+            return
+        cpu_seconds, rss, handles = raw
+        cpu = 0.0
+        if self._prev is not None and now > self._prev[0]:
+            cpu = max(0.0, (cpu_seconds - self._prev[1]) / (now - self._prev[0]) * 100)
+        self._prev = (now, cpu_seconds)
+        point = Point(time.time(), cpu, rss, handles)
+        self.series.append(point)
+        if self.on_sample:
+            try:
+                self.on_sample(point)
+            except Exception:
+                pass
+
+
+def series_window(series, seconds: float) -> List[Point]:
+    """Points from the last `seconds` seconds of a series."""
+    if not series:
+        return []
+    cutoff = series[-1].t - seconds
+    return [p for p in series if p.t >= cutoff]
@@ -0,0 +1,53 @@
+import unittest
+
+import health
+
+
+class HealthMonitorTest(unittest.TestCase):
+    """Rates of 0 and 1 make SimulatedNetwork deterministic."""
+
+    def monitor(self, rates, active="a"):
+        self.net = health.SimulatedNetwork(rates, active)
+        return health.HealthMonitor(self.net.check, self.net.launch, self.net.current,
+                                    lambda: sorted(rates), window=6, trial_rounds=2)
+
+    def events(self, monitor):
+        return [kind for kind, _ in monitor.log]
+
+    def run_rounds(self, monitor, n):
+        for _ in range(n):
+            monitor.run_round()
+
+    def test_keeps_a_better_candidate(self):
+        m = self.monitor({"a": 0.0, "b": 1.0})
+        self.run_rounds(m, 4)  # two to fill the window, two of trial
+        self.assertEqual(self.events(m), [health.DEGRADED, health.FAILOVER, health.KEPT])
+        self.assertEqual(self.net.active, "b")
+
+    def test_reverts_a_candidate_no_better(self):
+        m = self.monitor({"a": 0.0, "b": 0.0})
+        self.run_rounds(m, 4)
+        self.assertEqual(self.events(m), [health.DEGRADED, health.FAILOVER, health.REVERTED])
+        self.assertEqual(self.net.active, "a")
+        self.assertIn("b", m.tried)
+        # Nothing left to try: reported once, no more switches
+        self.run_rounds(m, 6)
+        self.assertEqual(self.events(m)[3:], [health.EXHAUSTED])
+        self.assertEqual(self.net.switches, 2)
+
+    def test_no_switch_when_the_network_is_down(self):
+        m = self.monitor({"a": 1.0, "b": 1.0})
+        self.net.offline = True
+        self.run_rounds(m, 8)
+        self.assertEqual(self.events(m), [health.DEGRADED, health.NETWORK_DOWN])
+        self.assertEqual(self.net.switches, 0)
+        self.assertEqual(self.net.active, "a")
+
+        self.net.offline = False
+        self.run_rounds(m, 2)
+        self.assertEqual(self.events(m)[-1], health.RECOVERED)
+        self.assertEqual(self.net.switches, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
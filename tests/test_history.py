@@ -0,0 +1,44 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import history
+
+DAY = history.DAY
+
+
+class RollupTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.now = 1_700_000_000 // DAY * DAY + 12 * 3600
+        self.store = history.History(Path(tmp.name) / history.FILE, history.Retention(raw_days=10))
+        self.addCleanup(self.store.close)
+        self.store.record_many([(self.now - d * DAY, "check", "discord.com", "general", "", 1, None, 100.0, 200, None)
+                                for d in range(1, 31)])
+        self.store.maintain(self.now)
+
+    def series(self):
+        return self.store.series("discord.com", DAY, 0, self.now)
+
+    def test_late_row_keeps_pruned_days(self):
+        before = self.series()
+        self.assertEqual(len(before), 30)
+        self.assertEqual(self.store._db.execute("SELECT COUNT(*) FROM probes").fetchone()[0], 10)
+
+        self.store.record("check", "discord.com", False, "general", ts=self.now - 25 * DAY)
+        self.store.maintain(self.now)
+        self.assertEqual(self.series(), before)
+
+    def test_late_row_within_raw_retention_is_rolled_up(self):
+        self.store.record("check", "discord.com", False, "general", ts=self.now - 5 * DAY)
+        self.store.maintain(self.now)
+        days = self.series()
+        self.assertEqual(len(days), 30)
+        late = next(b for b in days if b["bucket"] == (self.now - 5 * DAY) // DAY * DAY)
+        self.assertEqual((late["count"], late["ok"]), (2, 1))
+        self.assertEqual(sum(b["count"] for b in days), 31)
+
+
+if __name__ == "__main__":
+    unittest.main()
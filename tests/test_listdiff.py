@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+import listdiff
+
+
+class DiffTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def test_views(self):
+        result = listdiff.diff(["a.com", "b.com", "B.com"], ["b.com", "c.com"], tmp_dir=self.tmp)
+        self.assertEqual(result.counts(), {listdiff.REMOVED: 1, listdiff.ADDED: 1, listdiff.COMMON: 1})
+        self.assertEqual(list(result[listdiff.ADDED]), ["c.com"])
+        self.assertEqual(result[listdiff.REMOVED].line(0), "a.com")
+        result.close()
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_failure_leaves_no_temp_files(self):
+        def broken():
+            yield "a.com"
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        with self.assertRaises(UnicodeDecodeError):
+            listdiff.diff(broken(), ["b.com"], tmp_dir=self.tmp)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import random
+import unittest
+
+import necessity
+
+
+class AnalyzeTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(6)
+        self.domains = sorted({f"host{rnd.randrange(10 ** 6)}.example" for _ in range(400)})
+        self.domains += ["www.youtube.com", "discord.com"]
+        self.blocked = set(rnd.sample(self.domains, 80)) | {"www.youtube.com"}
+        self.unfixable = set(rnd.sample(sorted(self.blocked), 10))
+        self.dead = set(rnd.sample(self.domains, 20))
+
+    def truth(self, d):
+        if d in self.dead or d in self.unfixable:
+            return necessity.NOT_FIXED
+        return necessity.FIXED if d in self.blocked else necessity.NEVER_BLOCKED
+
+    def analyze(self, loss):
+        net = necessity.SimulatedNetwork(self.blocked, self.unfixable, self.dead, latency=0, loss=loss, seed=6)
+        report = necessity.analyze(self.domains, net.check, net.set_bypass, workers=8, rate=1e6)
+        return net, report
+
+    def test_classes_are_exact_without_loss(self):
+        net, report = self.analyze(loss=0.0)
+        self.assertEqual(report.classes, {d: self.truth(d) for d in self.domains})
+        self.assertEqual(net.toggles, 2)
+        self.assertTrue(net.bypass_on)
+        # One check per success; failures are retried once; only failures are checked again with the bypass
+        failed = self.blocked | self.dead
+        not_fixed = report.counts()[necessity.NOT_FIXED]
+        self.assertEqual(report.checks, len(self.domains) + len(failed) + len(failed) + not_fixed)
+
+    def test_retries_absorb_packet_loss(self):
+        # A reachable domain looks blocked only if both attempts are lost: 0.05^2
+        net, report = self.analyze(loss=0.05)
+        wrong = [d for d in self.domains if report.classes[d] != self.truth(d)]
+        self.assertLessEqual(len(wrong), len(self.domains) // 50)
+
+    def test_prune_keeps_protected_and_blocked_domains(self):
+        _, report = self.analyze(loss=0.0)
+        prune = report.prune_set()
+        self.assertNotIn("discord.com", prune)  # never blocked here, but protected
+        self.assertFalse(prune & self.blocked)
+        self.assertEqual(prune, {d for d in self.domains if self.truth(d) == necessity.NEVER_BLOCKED} - {"discord.com"})
+
+        lines = ["# list"] + [d.upper() for d in self.domains]
+        kept, removed = necessity.prune_lines(lines, prune)
+        self.assertEqual(removed, len(prune))
+        self.assertEqual(kept[0], "# list")
+        self.assertIn("DISCORD.COM", kept)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import re
+import unittest
+
+import portset
+from portset import PortSet
+from strategy import GAME_FILTER_OFF, GAME_FILTER_ON, Strategy
+
+# Argument strings as in the strategies zapret-discord-youtube ships (general, ALT, FAKE TLS, discord)
+GENERAL = (
+    '--wf-tcp=80,443,2053,2083,2087,2096,8443,%GameFilter% --wf-udp=443,19294-19344,50000-50100,%GameFilter% '
+    '--filter-udp=443 --hostlist="%LISTS%list-general.txt" --hostlist-exclude="%LISTS%list-exclude.txt" '
+    '--ipset-exclude="%LISTS%ipset-exclude.txt" --dpi-desync=fake --dpi-desync-repeats=6 '
+    '--dpi-desync-fake-quic="%BIN%quic_initial_www_google_com.bin" --new '
+    '--filter-udp=19294-19344,50000-50100 --filter-l7=discord,stun --dpi-desync=fake --dpi-desync-repeats=6 --new '
+    '--filter-tcp=2053,2083,2087,2096,8443 --hostlist-domains=discord.media --dpi-desync=multisplit '
+    '--dpi-desync-split-seqovl=568 --dpi-desync-split-pos=1 '
+    '--dpi-desync-split-seqovl-pattern="%BIN%tls_clienthello_www_google_com.bin" --new '
+    '--filter-tcp=443 --hostlist="%LISTS%list-google.txt" --ip-id=zero --dpi-desync=multisplit '
+    '--dpi-desync-split-seqovl=681 --dpi-desync-split-pos=1 '
+    '--dpi-desync-split-seqovl-pattern="%BIN%tls_clienthello_www_google_com.bin" --new '
+    '--filter-tcp=80,443 --hostlist="%LISTS%list-general.txt" --hostlist-exclude="%LISTS%list-exclude.txt" '
+    '--ipset-exclude="%LISTS%ipset-exclude.txt" --dpi-desync=multisplit --dpi-desync-split-seqovl=568 '
+    '--dpi-desync-split-pos=1 --dpi-desync-split-seqovl-pattern="%BIN%tls_clienthello_4pda_to.bin" --new '
+    '--filter-udp=443 --ipset="%LISTS%ipset-all.txt" --hostlist-exclude="%LISTS%list-exclude.txt" '
+    '--ipset-exclude="%LISTS%ipset-exclude.txt" --dpi-desync=fake --dpi-desync-repeats=6 '
+    '--dpi-desync-fake-quic="%BIN%quic_initial_www_google_com.bin" --new '
+    '--filter-tcp=80,443,%GameFilter% --ipset="%LISTS%ipset-all.txt" --hostlist-exclude="%LISTS%list-exclude.txt" '
+    '--ipset-exclude="%LISTS%ipset-exclude.txt" --dpi-desync=multisplit --dpi-desync-split-seqovl=568 '
+    '--dpi-desync-split-pos=1 --dpi-desync-split-seqovl-pattern="%BIN%tls_clienthello_4pda_to.bin" --new '
+    '--filter-udp=%GameFilter% --ipset="%LISTS%ipset-all.txt" --ipset-exclude="%LISTS%ipset-exclude.txt" '
+    '--dpi-desync=fake --dpi-desync-autottl=2 --dpi-desync-repeats=10 --dpi-desync-any-protocol=1 '
+    '--dpi-desync-fake-unknown-udp="%BIN%quic_initial_www_google_com.bin" --dpi-desync-cutoff=n2'
+)
+ALT = (
+    '--wf-tcp=80,443,%GameFilter% --wf-udp=443,50000-50100,%GameFilter% '
+    '--filter-udp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake --dpi-desync-repeats=6 --new '
+    '--filter-udp=50000-50100 --filter-l7=discord,stun --dpi-desync=fake --dpi-desync-repeats=6 --new '
+    '--filter-tcp=80 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake,split2 --dpi-desync-autottl=2 '
+    '--dpi-desync-fooling=md5sig --new '
+    '--filter-tcp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake,fakedsplit '
+    '--dpi-desync-split-pos=1 --dpi-desync-fooling=ts --dpi-desync-repeats=8 --new '
+    '--filter-tcp=80,443,%GameFilter% --ipset="%LISTS%ipset-all.txt" --dpi-desync=fake,fakedsplit '
+    '--dpi-desync-split-pos=1 --dpi-desync-fooling=ts --dpi-desync-repeats=8 --new '
+    '--filter-udp=%GameFilter% --ipset="%LISTS%ipset-all.txt" --dpi-desync=fake --dpi-desync-autottl=2 '
+    '--dpi-desync-repeats=12 --dpi-desync-any-protocol=1 --dpi-desync-cutoff=n3'
+)
+FAKE_TLS = (
+    '--wf-tcp=80,443 --wf-udp=443,50000-50100 '
+    '--filter-udp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake --dpi-desync-repeats=11 --new '
+    '--filter-udp=50000-50100 --filter-l7=discord,stun --dpi-desync=fake --dpi-desync-repeats=6 --new '
+    '--filter-tcp=80 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake,split2 --dpi-desync-autottl=2 '
+    '--dpi-desync-fooling=md5sig --new '
+    '--filter-tcp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake --dpi-desync-repeats=11 '
+    '--dpi-desync-fooling=md5sig --dpi-desync-fake-tls-mod=rnd,dupsid,sni=www.google.com'
+)
+DISCORD = (
+    '--wf-tcp=443 --wf-udp=443,50000-65535 '
+    '--filter-udp=50000-65535 --dpi-desync=fake --dpi-desync-any-protocol --dpi-desync-cutoff=d3 --new '
+    '--filter-tcp=443 --hostlist="%LISTS%list-discord.txt" --dpi-desync=fake,split2 --new '
+    '--filter-udp=443 --hostlist="%LISTS%list-discord.txt" --dpi-desync=fake --dpi-desync-repeats=6'
+)
+# Overlaps the compiler has to resolve: shadowed ports, a catch-all profile, a profile left empty
+SHADOWED = (
+    '--wf-tcp=80,443,1000-2000 --wf-udp=443 '
+    '--debug=1 --filter-tcp=443 --hostlist="a.txt" --dpi-desync=fake --new '
+    '--filter-tcp=80,443,1500-3000 --hostlist="a.txt" --dpi-desync=split2 --new '
+    '--filter-tcp=443 --hostlist="a.txt" --dpi-desync=disorder2 --new '
+    '--filter-udp=443 --filter-tcp=443 --ipset="b.txt" --new '
+    '--ipset="b.txt" --dpi-desync=fake --new '
+    '--filter-udp=443 --ipset="b.txt" --dpi-desync=fake'
+)
+STRATEGIES = {"general": GENERAL, "ALT": ALT, "FAKE TLS": FAKE_TLS, "discord": DISCORD, "shadowed": SHADOWED}
+
+PORT_FILTERS = ("filter-tcp", "filter-udp")
+CONDITIONS = ("hostlist", "ipset", "filter-l3", "filter-l7", "filter-ssid", "filter-net")
+SPEC_RE = re.compile(r'--(?:wf|filter)-(?:tcp|udp)=(\S+)')
+
+
+def outcome(strat: Strategy, game: PortSet, proto: str, port: int):
+    """What winws does with a packet: the profiles it can reach, first to last.
+
+    None when it isn't captured or no reachable profile desyncs. A profile is
+    (conditions, other options); one whose conditions an earlier matching
+    profile has too is never reached, and nothing is after one without any.
+    """
+    captured = [v for n, v in strat.global_opts if n == f"wf-{proto}"]
+    if not any(port in PortSet.parse(v, game) for v in captured):
+        return None
+    chain, seen = [], set()
+    for block in strat.blocks:
+        filters = {n[-3:]: v for n, v in block if n in PORT_FILTERS}
+        if filters and (proto not in filters or port not in PortSet.parse(filters[proto], game)):
+            continue
+        conditions = tuple(sorted(o for o in block if o[0].startswith(CONDITIONS)))
+        if conditions in seen:
+            continue
+        seen.add(conditions)
+        chain.append((conditions, tuple(o for o in block if o[0] not in PORT_FILTERS and o[0] not in CONDITIONS)))
+        if not conditions:
+            break
+    while chain and not any(name == "dpi-desync" for name, _ in chain[-1][1]):
+        chain.pop()
+    return tuple(chain) or None
+
+
+def breakpoints(args: str, game: PortSet):
+    """One port of every range over which no filter of args changes."""
+    points = {0}
+    for spec in SPEC_RE.findall(args):
+        for lo, hi in PortSet.parse(spec, game).intervals:
+            points.update((lo, hi + 1))
+    return sorted(p for p in points if p <= portset.MAX_PORT)
+
+
+class MinimizeArgsTest(unittest.TestCase):
+    def test_same_outcome_for_every_port(self):
+        for name, args in STRATEGIES.items():
+            for game_filter in (GAME_FILTER_OFF, GAME_FILTER_ON):
+                game = portset.game_filter_set(game_filter)
+                minimized = portset.minimize_args(args, game_filter)
+                before, after = Strategy.from_args("", args), Strategy.from_args("", minimized)
+                ports = sorted(set(breakpoints(args, game)) | set(breakpoints(minimized, game)))
+                for proto in portset.PROTOCOLS:
+                    for port in ports:
+                        self.assertEqual(outcome(after, game, proto, port), outcome(before, game, proto, port),
+                                         f"{name}, game filter {game_filter}: {proto} {port}")
+
+    def test_minimized_is_stable(self):
+        for name, args in STRATEGIES.items():
+            for game_filter in (GAME_FILTER_OFF, GAME_FILTER_ON):
+                minimized = portset.minimize_args(args, game_filter)
+                self.assertEqual(portset.minimize_args(minimized, game_filter), minimized, name)
+                self.assertNotIn("%GameFilter%", minimized)
+
+    def test_shadowed_profiles_are_trimmed(self):
+        compiled, report = portset.compile_strategy(Strategy.from_args("", SHADOWED), GAME_FILTER_OFF)
+        self.assertEqual(report.removed_blocks, [2, 5])  # 5: block 3 takes udp 443 for ipset b first
+        self.assertEqual(compiled.get(1, "filter-tcp"), "80,1500-2000")
+        self.assertEqual(compiled.get(0, "debug"), "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import hashlib
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import subscriptions
+
+LIST = "list-general.txt"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves server.docs[path] with an ETag and answers If-None-Match with 304."""
+
+    def do_GET(self):
+        body = self.server.docs[self.path]
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        unchanged = self.headers.get("If-None-Match") == etag
+        self.server.log.append((self.path, 304 if unchanged else 200))
+        self.send_response(304 if unchanged else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0" if unchanged else str(len(body)))
+        self.end_headers()
+        if not unchanged:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SubscriptionsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.docs = {}
+        self.server.log = []
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.lists_dir = Path(tmp.name) / "lists"
+        self.lists_dir.mkdir()
+        self.user = {"mine.example", "shared.example"}
+        self.target = self.lists_dir / LIST
+        self.target.write_text("# my list\n" + "\n".join(sorted(self.user)) + "\n", encoding="utf-8")
+        self.subs = subscriptions.Subscriptions(Path(tmp.name) / "subs", self.lists_dir)
+
+    def publish(self, path, entries):
+        self.server.docs[path] = "".join(f"{e}\n" for e in sorted(entries)).encode()
+
+    def subscribe(self, path, entries):
+        self.publish(path, entries)
+        return self.subs.add(LIST, self.base + path)["id"]
+
+    def entries(self):
+        lines = self.target.read_text(encoding="utf-8").splitlines()
+        return {line for line in lines if line and not line.startswith("#")}
+
+    def test_unchanged_source_answers_304(self):
+        self.subscribe("/a.txt", {"a.example", "b.example"})
+        self.subs.refresh()
+        mtime = self.target.stat().st_mtime_ns
+        self.server.log.clear()
+
+        self.assertEqual(self.subs.refresh(now=time.time() + self.subs.interval), [])
+        self.assertEqual(self.server.log, [("/a.txt", 304)])
+        self.assertEqual(self.subs.subscriptions()[0]["status"], 304)
+        self.assertEqual(self.target.stat().st_mtime_ns, mtime)
+        self.assertEqual(self.subs.origin(LIST, "a.example"), [self.base + "/a.txt"])
+
+    def test_unsubscribe_removes_exactly_its_entries(self):
+        a = {"a1.example", "a2.example", "both.example", "shared.example"}
+        b = {"b1.example", "both.example"}
+        sa = self.subscribe("/a.txt", a)
+        self.subscribe("/b.txt", b)
+        self.subs.refresh()
+        self.assertEqual(self.entries(), a | b | self.user)
+
+        result = self.subs.remove(sa)
+        self.assertEqual(self.entries(), b | self.user)
+        self.assertEqual(result["removed"], 2)  # a1, a2; "both" stays with b, "shared" is the user's
+        self.assertEqual(self.target.read_text(encoding="utf-8").splitlines()[0], "# my list")
+
+    def test_hand_deleted_entry_stays_deleted(self):
+        self.subscribe("/a.txt", {"a1.example", "a2.example"})
+        self.subs.refresh()
+        text = self.target.read_text(encoding="utf-8")
+        self.target.write_text(text.replace("a1.example\n", ""), encoding="utf-8")
+
+        self.subs.merge(LIST)
+        self.assertNotIn("a1.example", self.entries())
+        # Still deleted when the source changes and is downloaded again
+        self.publish("/a.txt", {"a1.example", "a2.example", "a3.example"})
+        self.subs.refresh(now=time.time() + self.subs.interval)
+        self.assertEqual(self.server.log[-1], ("/a.txt", 200))
+        self.assertEqual(self.entries(), {"a2.example", "a3.example"} | self.user)
+
+    def test_missing_list_does_not_stop_other_merges(self):
+        other = self.lists_dir / "list-other.txt"
+        other.write_text("", encoding="utf-8")
+        self.publish("/o.txt", {"o.example"})
+        self.subs.add("list-other.txt", self.base + "/o.txt")
+        self.subscribe("/a.txt", {"a.example"})
+        other.unlink()
+
+        results = {r["list"]: r for r in self.subs.refresh()}
+        self.assertIn("error", results["list-other.txt"])
+        self.assertEqual(results[LIST]["added"], 1)
+        self.assertIn("a.example", self.entries())
+        errors = {s["list"]: s["error"] for s in self.subs.subscriptions()}
+        self.assertEqual(errors[LIST], None)
+        self.assertTrue(errors["list-other.txt"])
+
+        # Merged once the list is back
+        other.write_text("", encoding="utf-8")
+        self.subs.refresh(now=time.time() + self.subs.interval)
+        self.assertEqual(other.read_text(encoding="utf-8"), "o.example\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
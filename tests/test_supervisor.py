@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import procout
+import supervisor
+
+
+class FakeProc:
+    def __init__(self, lifetime, code=1):
+        self.started = time.monotonic()
+        self.lifetime = lifetime
+        self.code = code
+        self.terminated = False
+
+
+class FakeBackend(supervisor.ProcessBackend):
+    """Processes live for the next of `lifetimes` seconds (the last one repeats).
+
+    A "ready" command prints READY_MARKER to `output` after `startup` seconds.
+    """
+
+    def __init__(self, lifetimes, output=None, startup=0.02):
+        self.lifetimes = list(lifetimes)
+        self.output = output
+        self.startup = startup
+        self.spawned = []
+
+    def spawn(self, cmdline, cwd):
+        lifetime = self.lifetimes.pop(0) if len(self.lifetimes) > 1 else self.lifetimes[0]
+        proc = FakeProc(lifetime)
+        self.spawned.append(proc)
+        if cmdline == "ready" and self.output is not None:
+            threading.Timer(self.startup, self.output.append, [supervisor.READY_MARKER]).start()
+        return proc
+
+    def poll(self, proc):
+        if proc.terminated:
+            return -15
+        return proc.code if time.monotonic() - proc.started >= proc.lifetime else None
+
+    def terminate(self, proc, timeout=5.0):
+        proc.terminated = True
+
+    def sample(self, proc):
+        return 1.0, 1 << 20, 10
+
+
+class SupervisorTest(unittest.TestCase):
+    def supervise(self, backend, cmdline="winws", **kwargs):
+        self.events = []
+        options = dict(interval=0.005, backoff_initial=0.02, backoff_max=0.08, stable_after=10)
+        options.update(kwargs)
+        sup = supervisor.Supervisor(cmdline, Path("."), backend=backend,
+                                    on_event=lambda kind, info: self.events.append((kind, info)), **options)
+        self.addCleanup(sup.stop)
+        return sup
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.005)
+
+    def exits(self):
+        return [info for kind, info in self.events if kind == supervisor.EXITED]
+
+    def test_backoff_doubles_and_resets_after_a_stable_run(self):
+        # Two quick crashes, one run longer than stable_after, then quick crashes again
+        sup = self.supervise(FakeBackend([0, 0, 0, 0.1, 0]), stable_after=0.05)
+        sup.start()
+        self.wait_for(lambda: len(self.exits()) >= 6)
+        sup.stop()
+        self.assertEqual([e["retry_in"] for e in self.exits()[:6]], [0.02, 0.04, 0.08, 0.02, 0.04, 0.08])
+
+    def test_gives_up_after_max_restarts(self):
+        backend = FakeBackend([0])
+        sup = self.supervise(backend, max_restarts=2)
+        sup.start()
+        self.wait_for(lambda: sup.state == supervisor.FAILED)
+        self.assertEqual([kind for kind, _ in self.events if kind != supervisor.STARTED],
+                         [supervisor.EXITED, supervisor.EXITED, supervisor.GAVE_UP])
+        self.assertEqual(len(backend.spawned), 3)
+        self.assertEqual(self.events[-1][1]["restarts"], 2)
+
+    def test_switch_gap_ends_at_the_ready_marker(self):
+        output = procout.LineRing()
+        backend = FakeBackend([3600], output, startup=0.05)
+        sup = self.supervise(backend, output=output)
+        sup.start()
+        gap = sup.switch("ready", ready_timeout=2)
+        self.assertIsNotNone(gap)
+        self.assertGreaterEqual(gap, 0.05)
+        self.assertLess(gap, 2)
+        self.assertTrue(backend.spawned[0].terminated)
+        self.assertEqual(self.events[-1], (supervisor.SWITCHED, {"gap_ms": round(gap * 1000), "ready": True}))
+
+    def test_switch_gap_is_none_without_the_ready_marker(self):
+        output = procout.LineRing()
+        sup = self.supervise(FakeBackend([3600], output), output=output)
+        t = time.monotonic()
+        self.assertIsNone(sup.switch("silent", ready_timeout=0.1))
+        self.assertGreaterEqual(time.monotonic() - t, 0.1)
+        self.assertEqual(self.events[-1], (supervisor.SWITCHED, {"gap_ms": None, "ready": False}))
+        self.assertEqual(sup.state, supervisor.RUNNING)
+
+    def test_stop_does_not_restart(self):
+        backend = FakeBackend([3600])
+        sup = self.supervise(backend)
+        sup.start()
+        proc = backend.spawned[0]
+        sup.stop()
+        time.sleep(0.1)
+        self.assertTrue(proc.terminated)
+        self.assertEqual(len(backend.spawned), 1)
+        self.assertEqual(sup.state, supervisor.STOPPED)
+        self.assertIsNone(sup.proc)
+        self.assertEqual(self.exits(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
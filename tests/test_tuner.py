@@ -0,0 +1,37 @@
+import unittest
+
+import tuner
+from strategy import Strategy
+
+BASE = Strategy.from_args("general", "--wf-tcp=80,443 --filter-tcp=443 --dpi-desync=fake --dpi-desync-repeats=6")
+SPACE = tuner.ParamSpace({"dpi-desync": ["fake", "split2", "multisplit"],
+                          "dpi-desync-ttl": [None, "4", "6"],
+                          "dpi-desync-repeats": ["2", "6", "11"]})
+EFFECTS = {("dpi-desync", "multisplit"): 0.5, ("dpi-desync-ttl", "4"): 0.3}
+
+
+class SuccessiveHalvingTest(unittest.TestCase):
+    def test_schedule(self):
+        prober = tuner.SimulatedProber(EFFECTS, base=0.2)
+        result = tuner.successive_halving(BASE, SPACE, prober, n_configs=27, min_trials=2, eta=3)
+        self.assertEqual([len(r) for r in result.rounds], [27, 9, 3])
+        self.assertEqual(result.trials_used, 27 * 2 + 9 * 4 + 3 * 12)
+        self.assertEqual(result.best.trials, 18)
+
+    def test_single_candidate_is_probed_once(self):
+        prober = tuner.SimulatedProber(EFFECTS, base=0.2)
+        result = tuner.successive_halving(BASE, SPACE, prober, n_configs=1, min_trials=3)
+        self.assertEqual(len(result.rounds), 1)
+        self.assertEqual(result.trials_used, 3)
+
+    def test_finds_the_best_config(self):
+        for seed in range(5):
+            prober = tuner.SimulatedProber(EFFECTS, base=0.2, seed=seed)
+            result = tuner.successive_halving(BASE, SPACE, prober, n_configs=27, min_trials=4, seed=seed)
+            self.assertEqual(result.best.config["dpi-desync"], "multisplit", seed)
+            self.assertEqual(result.best.config["dpi-desync-ttl"], "4", seed)
+            self.assertAlmostEqual(prober.success_probability(result.strategy), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+"""
+Parameter search for winws strategies.
+
+Takes a parsed base strategy, varies chosen desync parameters and scores
+each variant with a pluggable prober (fraction of successful connections).
+Successive halving spends few probes on many candidates and more probes on
+the survivors. Scores are cumulative, so a survivor is topped up to eta
+times its probes: with 27 candidates, eta=3 and 2 probes to start, rounds
+probe 27 candidates to 2, 9 to 6 and 3 to 18, and the best of the last 3
+wins. That costs 27*2 + 9*4 + 3*12 = 126 probes, where evaluating the same
+27 at the final precision would cost 27*18 = 486.
+
+SimulatedProber stands in for the network so the search can run anywhere.
+"""
+
+import itertools
+import math
+import random
+import socket
+import ssl
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from strategy import Strategy, winws_cmdline
+
+# Candidate values per winws option; None means "option not set"
+DEFAULT_SPACE = {
+    "dpi-desync": ["fake", "split2", "fake,split2", "fake,disorder2", "multisplit", "fake,multidisorder"],
+    "dpi-desync-fooling": [None, "md5sig", "badseq", "ts", "badsum"],
+    "dpi-desync-repeats": ["2", "6", "11"],
+    "dpi-desync-split-pos": [None, "1", "2", "midsld", "sniext+1"],
+    "dpi-desync-ttl": [None, "4", "6", "8"],
+}
+
+DEFAULT_DOMAINS = ["discord.com", "www.youtube.com", "i.ytimg.com", "gateway.discord.gg"]
+
+
+class ParamSpace:
+    def __init__(self, params: Optional[Dict[str, List[Optional[str]]]] = None,
+                 blocks: Optional[List[int]] = None):
+        self.params = params or DEFAULT_SPACE
+        self.blocks = blocks
+
+    def size(self) -> int:
+        return math.prod(len(v) for v in self.params.values())
+
+    def grid(self) -> Iterator[dict]:
+        names = list(self.params)
+        for values in itertools.product(*(self.params[n] for n in names)):
+            yield dict(zip(names, values))
+
+    def sample(self, n: int, rnd: random.Random) -> List[dict]:
+        if self.size() <= n:
+            return list(self.grid())
+        seen = set()
+        configs = []
+        while len(configs) < n:
+            config = {name: rnd.choice(values) for name, values in self.params.items()}
+            key = tuple(config.values())
+            if key not in seen:
+                seen.add(key)
+                configs.append(config)
+        return configs
+
+    def apply(self, base: Strategy, config: dict, name: Optional[str] = None) -> Strategy:
+        variant = base.copy(name)
+        blocks = self.blocks if self.blocks is not None else variant.desync_blocks()
+        for block in blocks:
+            for param, value in config.items():
+                variant.set(block, param, value)
+        return variant
+
+
+# ----- probers -----
+
+class Prober:
+    """Runs `trials` connection attempts with a strategy active; returns successes."""
+
+    trials_used = 0
+
+    def probe(self, strategy: Strategy, trials: int) -> int:
+        raise NotImplementedError
+
+
+class SimulatedProber(Prober):
+    """Success probability = base + sum of per-(param, value) effects, clamped.
+
+    `effects` maps (param, value) -> delta. Deterministic for a given seed.
+    """
+
+    def __init__(self, effects: Dict[tuple, float], base: float = 0.2, seed: int = 0):
+        self.effects = effects
+        self.base = base
+        self.rnd = random.Random(seed)
+        self.trials_used = 0
+
+    def success_probability(self, strategy: Strategy) -> float:
+        p = self.base
+        for block in strategy.desync_blocks() or [0]:
+            for name, value in strategy.blocks[block]:
+                p += self.effects.get((name, value), 0.0)
+            break  # profiles share the same parameters in a search
+        return min(1.0, max(0.0, p))
+
+    def probe(self, strategy: Strategy, trials: int) -> int:
+        self.trials_used += trials
+        p = self.success_probability(strategy)
+        return sum(1 for _ in range(trials) if self.rnd.random() < p)
+
+
+def https_reachable(domain: str, timeout: float = 5.0) -> bool:
+    """TLS handshake plus a minimal request; DPI blocks usually fail here."""
+    try:
+        ctx = ssl.create_default_context()
+        with socket.create_connection((domain, 443), timeout=timeout) as raw:
+            with ctx.wrap_socket(raw, server_hostname=domain) as s:
+                s.sendall(f"HEAD / HTTP/1.1\r\nHost: {domain}\r\nConnection: close\r\n\r\n".encode())
+                return bool(s.recv(16))
+    except (OSError, ssl.SSLError):
+        return False
+
+
+def _default_launcher(cmdline: str, cwd: Path):
+    return subprocess.Popen(cmdline, cwd=str(cwd),
+                            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+
+class LiveProber(Prober):
+    """Starts winws.exe with the variant and probes real domains."""
+
+    def __init__(self, zapret_dir: Path, domains: Optional[List[str]] = None,
+                 launcher: Callable = _default_launcher, check: Callable[[str], bool] = https_reachable,
+                 warmup: float = 1.0):
+        self.zapret_dir = zapret_dir
+        self.domains = domains or DEFAULT_DOMAINS
+        self.launcher = launcher
+        self.check = check
+        self.warmup = warmup
+        self.trials_used = 0
+
+    def probe(self, strategy: Strategy, trials: int) -> int:
+        proc = self.launcher(winws_cmdline(self.zapret_dir, strategy.to_args()), self.zapret_dir / "bin")
+        try:
+            time.sleep(self.warmup)
+            if proc.poll() is not None:
+                # winws rejected the arguments
+                self.trials_used += trials
+                return 0
+            ok = 0
+            for i in range(trials):
+                ok += self.check(self.domains[i % len(self.domains)])
+            self.trials_used += trials
+            return ok
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+# ----- search -----
+
+class Candidate:
+    __slots__ = ("config", "strategy", "successes", "trials")
+
+    def __init__(self, config: dict, strategy: Strategy):
+        self.config = config
+        self.strategy = strategy
+        self.successes = 0
+        self.trials = 0
+
+    @property
+    def score(self) -> float:
+        return self.successes / self.trials if self.trials else 0.0
+
+
+class SearchResult:
+    def __init__(self, best: Candidate, rounds: List[List[Candidate]], trials_used: int):
+        self.best = best
+        self.rounds = rounds
+        self.trials_used = trials_used
+
+    @property
+    def strategy(self) -> Strategy:
+        return self.best.strategy
+
+
+def successive_halving(base: Strategy, space: ParamSpace, prober: Prober, n_configs: int = 27,
+                       min_trials: int = 2, eta: int = 3, seed: int = 0,
+                       progress: Optional[Callable[[int, int, Candidate], None]] = None) -> SearchResult:
+    """Keep the best 1/eta of the candidates each round, giving survivors eta times more probes,
+    until one is left.
+
+    Probes from earlier rounds count towards a candidate's score.
+    progress(round, candidates left, current best) is called after each round.
+    """
+    rnd = random.Random(seed)
+    candidates = [Candidate(c, space.apply(base, c)) for c in space.sample(n_configs, rnd)]
+    rounds = []
+    start_used = prober.trials_used
+    budget = min_trials
+    round_no = 0
+    while True:
+        for cand in candidates:
+            extra = budget - cand.trials
+            if extra > 0:
+                cand.successes += prober.probe(cand.strategy, extra)
+                cand.trials += extra
+        candidates.sort(key=lambda c: c.score, reverse=True)
+        rounds.append(list(candidates))
+        round_no += 1
+        if progress:
+            progress(round_no, len(candidates), candidates[0])
+        candidates = candidates[:max(1, math.ceil(len(candidates) / eta))]
+        if len(candidates) == 1:
+            break
+        budget *= eta
+    return SearchResult(candidates[0], rounds, prober.trials_used - start_used)
+
+
+def write_strategy(result: SearchResult, base: Strategy, out_dir: Path) -> Path:
+    """Save the winner next to the base strategy, reusing the base .bat as template."""
+    template = base.path.read_text(encoding="utf-8", errors="ignore") if base.path else None
+    path = out_dir / f"{base.name} (tuned).bat"
+    path.write_text(result.strategy.to_bat(template), encoding="utf-8")
+    return path
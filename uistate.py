@@ -0,0 +1,74 @@
+"""
+Last known state of the main window, for an instant start.
+
+At shutdown the window saves a compact snapshot: service/winws status,
+zapret version, strategy and list names and which page and items were
+selected. On the next start it is rendered before anything is scanned or
+queried, marked as stale, and replaced as the watcher scan and
+StatusWorker deliver fresh data (stale-while-revalidate).
+
+The status and version are stamped with the time they were actually
+obtained, so closing the window before a refresh finished doesn't make old
+data look newer than it is.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+FILE = "ui_state.json"
+FORMAT = 1
+# Older snapshots describe a setup that has probably changed too much to be useful
+MAX_AGE = 14 * 24 * 3600
+
+
+def path(app_dir: Path) -> Path:
+    return app_dir / FILE
+
+
+def load(app_dir: Path) -> Optional[dict]:
+    """The saved state, or None when there is none usable."""
+    try:
+        state = json.loads(path(app_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("format") != FORMAT:
+        return None
+    if time.time() - state.get("saved_at", 0) > MAX_AGE:
+        return None
+    # JSON turns the (text, running) status pairs into lists
+    state["status"] = {k: tuple(v) for k, v in (state.get("status") or {}).items()}
+    return state
+
+
+def save(app_dir: Path, state: dict):
+    state = dict(state, format=FORMAT, saved_at=time.time())
+    target = path(app_dir)
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, target)
+    except OSError:
+        pass
+
+
+def clear(app_dir: Path):
+    try:
+        path(app_dir).unlink()
+    except OSError:
+        pass
+
+
+def age_text(timestamp: float) -> str:
+    """"5 мин назад" style age of a timestamp."""
+    seconds = max(0, time.time() - timestamp)
+    if seconds < 60:
+        return "только что"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} мин назад"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} ч назад"
+    return f"{int(seconds // 86400)} дн назад"
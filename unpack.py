@@ -0,0 +1,361 @@
+"""
+Zip extraction for the installer.
+
+setup.py runs extract() on its install thread; the module itself has no Qt
+dependency so it can be benchmarked (python bench.py unpack) and reused.
+
+- Entries are streamed in 1 MB chunks. zipfile checks each entry's CRC-32
+  at the end of the stream, and when a manifest is given the SHA-256 is
+  computed over the same chunks, so nothing is read twice.
+- Progress is byte based and throttled: report(done, total, name) is called
+  at most every `interval` seconds, plus once at the end, no matter how
+  many small files the archive has.
+- Files are written by a small thread pool. zlib and file writes release
+  the GIL, and creating many small files on NTFS (with an antivirus
+  scanning each one) is latency-bound, so a few workers help there; tiny
+  archives are extracted inline.
+
+The manifest is a JSON object {entry name: sha256 hex} written next to
+app.zip at build time (python unpack.py manifest app.zip).
+
+install() is the incremental variant the installer uses. The app directory
+keeps .install-manifest.json with the size, CRC-32 and mtime of every file
+it installed. Only entries whose size or CRC differ from what is on disk
+are extracted, into app/.staging; nothing in the live directory is touched
+until everything there is verified. The commit is then a list of renames
+and deletions recorded in a journal first, so an interrupted commit is
+finished by the next run instead of leaving a half-updated app. Stale files
+are only deleted if the previous install put them there: logs, settings and
+list backups living in the same directory are left alone.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+CHUNK = 1 << 20
+PROGRESS_INTERVAL = 0.1
+WORKERS = min(4, os.cpu_count() or 1)
+# Below this many files a pool costs more than it saves
+POOL_MIN_FILES = 64
+MANIFEST_NAME = "app.manifest.json"
+INSTALLED_MANIFEST = ".install-manifest.json"
+STAGING_DIR = ".staging"
+JOURNAL = ".install-journal.json"
+
+Report = Callable[[int, int, str], None]  # done bytes, total bytes, current entry
+
+
+class VerifyError(Exception):
+    pass
+
+
+class Throttle:
+    """Accumulates extracted bytes from any thread and reports at most every `interval` s."""
+
+    def __init__(self, total: int, report: Optional[Report], interval: float = PROGRESS_INTERVAL):
+        self.total = total
+        self.report = report
+        self.interval = interval
+        self.done = 0
+        self.calls = 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, nbytes: int, name: str):
+        with self._lock:
+            self.done += nbytes
+            now = time.monotonic()
+            if self.report is None or now < self._next:
+                return
+            self._next = now + self.interval
+            self.calls += 1
+            done = self.done
+        self.report(done, self.total, name)
+
+    def finish(self, name: str = ""):
+        if self.report is not None:
+            self.calls += 1
+            self.report(self.done, self.total, name)
+
+
+def _target(dest: str, name: str) -> str:
+    """Destination of an entry; refuses names that escape dest.
+
+    Checked lexically: resolving every path costs more than writing small files.
+    """
+    rel = os.path.normpath(name.replace("\\", "/"))
+    if os.path.isabs(rel) or os.path.splitdrive(rel)[0] or rel == ".." \
+            or rel.startswith(".." + os.sep):
+        raise VerifyError(f"Недопустимый путь в архиве: {name}")
+    return os.path.join(dest, rel)
+
+
+def _copy(z: zipfile.ZipFile, info: zipfile.ZipInfo, target: str, expected: Optional[str],
+          throttle: Throttle):
+    digest = hashlib.sha256() if expected else None
+    try:
+        with z.open(info) as src, open(target, "wb") as dst:
+            while True:
+                chunk = src.read(CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                throttle.add(len(chunk), info.filename)
+    except zipfile.BadZipFile as e:  # raised by the CRC check at end of stream
+        raise VerifyError(f"{info.filename}: {e}") from e
+    if digest is not None and digest.hexdigest() != expected:
+        raise VerifyError(f"{info.filename}: SHA-256 не совпадает с манифестом")
+
+
+def extract(zip_path: Path, dest: Path, report: Optional[Report] = None,
+            manifest: Optional[Dict[str, str]] = None, workers: int = WORKERS,
+            interval: float = PROGRESS_INTERVAL, names: Optional[Set[str]] = None) -> dict:
+    """Extract zip_path (only `names`, if given) into dest, verifying every entry.
+
+    Returns counters. Raises VerifyError on a CRC or manifest mismatch, or
+    when the manifest lists a file the archive doesn't have.
+    """
+    dest = Path(dest).resolve()
+    t = time.perf_counter()
+    with zipfile.ZipFile(zip_path) as z:
+        infos = z.infolist()
+        files = [i for i in infos if not i.is_dir()]
+        if manifest is not None:
+            missing = set(manifest) - {i.filename for i in files}
+            if missing:
+                raise VerifyError(f"В архиве нет файлов из манифеста: {', '.join(sorted(missing)[:5])}")
+        if names is not None:
+            infos = files = [i for i in files if i.filename in names]
+
+        # Directories first, so workers never race on mkdir
+        root = str(dest)
+        jobs = [(i, _target(root, i.filename), (manifest or {}).get(i.filename)) for i in files]
+        dirs = {_target(root, i.filename) for i in infos if i.is_dir()}
+        dirs.update(os.path.dirname(target) for _, target, _ in jobs)
+        dirs.add(root)
+        for d in sorted(dirs):
+            os.makedirs(d, exist_ok=True)
+
+        throttle = Throttle(sum(i.file_size for i in files), report, interval)
+        if workers <= 1 or len(files) < POOL_MIN_FILES:
+            for info, target, expected in jobs:
+                _copy(z, info, target, expected, throttle)
+        else:
+            _extract_pool(zip_path, jobs, throttle, workers)
+    throttle.finish()
+    return {"files": len(files), "bytes": throttle.total, "seconds": time.perf_counter() - t,
+            "progress_calls": throttle.calls, "verified": manifest is not None}
+
+
+def _extract_pool(zip_path: Path, jobs, throttle: Throttle, workers: int):
+    # One ZipFile per worker: a shared one serializes every read on its file lock
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+    failed = threading.Event()
+
+    def run(job):
+        if failed.is_set():
+            return
+        z = getattr(local, "zip", None)
+        if z is None:
+            z = local.zip = zipfile.ZipFile(zip_path)
+            with opened_lock:
+                opened.append(z)
+        try:
+            _copy(z, *job, throttle)
+        except Exception:
+            failed.set()
+            raise
+
+    # Largest entries first so one big file doesn't finish last on its own
+    jobs = sorted(jobs, key=lambda job: job[0].file_size, reverse=True)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run, job) for job in jobs]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
+    finally:
+        for z in opened:
+            z.close()
+
+
+# ----- manifest -----
+
+def build_manifest(zip_path: Path) -> Dict[str, str]:
+    manifest = {}
+    with zipfile.ZipFile(zip_path) as z:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+            digest = hashlib.sha256()
+            with z.open(info) as f:
+                for chunk in iter(lambda: f.read(CHUNK), b""):
+                    digest.update(chunk)
+            manifest[info.filename] = digest.hexdigest()
+    return manifest
+
+
+def load_manifest(path: Path) -> Optional[Dict[str, str]]:
+    """The manifest at path, or None when there is none."""
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+# ----- incremental install -----
+
+def _crc32_file(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: Path, data: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _replace(src: str, dst: str, attempts: int = 5):
+    # A just-killed ZapretGUI.exe can keep its files locked for a moment
+    for attempt in range(attempts):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.2 * (attempt + 1))
+
+
+def _unchanged(info: zipfile.ZipInfo, target: str, old: Optional[dict]) -> Optional[dict]:
+    """The installed record for target if it already matches info, else None."""
+    try:
+        st = os.stat(target)
+    except OSError:
+        return None
+    if st.st_size != info.file_size:
+        return None
+    trusted = (old is not None and old.get("crc") == info.CRC and old.get("size") == info.file_size
+               and old.get("mtime_ns") == st.st_mtime_ns)
+    if not trusted and _crc32_file(target) != info.CRC:
+        return None
+    return {"size": info.file_size, "crc": info.CRC, "mtime_ns": st.st_mtime_ns}
+
+
+def _commit(app_dir: Path, journal: dict):
+    """Apply a journal: move staged files into place, delete stale ones, write the manifest."""
+    root = str(app_dir)
+    staging = app_dir / STAGING_DIR
+    records = journal["records"]
+    for name in journal["moves"]:
+        staged = _target(str(staging), name)
+        target = _target(root, name)
+        if os.path.exists(staged):  # already moved by an interrupted commit otherwise
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _replace(staged, target)
+        records[name]["mtime_ns"] = os.stat(target).st_mtime_ns
+    for name in journal["delete"]:
+        target = _target(root, name)
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            pass
+        # Drop directories the old version had and the new one doesn't
+        parent = os.path.dirname(target)
+        while parent != root:
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+    _write_json(app_dir / INSTALLED_MANIFEST, {"files": records})
+    (app_dir / JOURNAL).unlink()
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def recover(app_dir: Path) -> bool:
+    """Finish a commit a previous run was interrupted in; drop an unfinished staging dir."""
+    app_dir = Path(app_dir)
+    journal = _read_json(app_dir / JOURNAL)
+    if journal is not None:
+        _commit(app_dir, journal)
+        return True
+    shutil.rmtree(app_dir / STAGING_DIR, ignore_errors=True)
+    return False
+
+
+def install(zip_path: Path, app_dir: Path, report: Optional[Report] = None,
+            manifest: Optional[Dict[str, str]] = None, workers: int = WORKERS,
+            interval: float = PROGRESS_INTERVAL) -> dict:
+    """Bring app_dir to the contents of zip_path, writing only what differs."""
+    app_dir = Path(app_dir).resolve()
+    t = time.perf_counter()
+    app_dir.mkdir(parents=True, exist_ok=True)
+    recovered = recover(app_dir)
+    installed = (_read_json(app_dir / INSTALLED_MANIFEST) or {}).get("files", {})
+    root = str(app_dir)
+
+    with zipfile.ZipFile(zip_path) as z:
+        files = [i for i in z.infolist() if not i.is_dir()]
+    records: Dict[str, dict] = {}
+    changed: List[str] = []
+    for info in files:
+        record = _unchanged(info, _target(root, info.filename), installed.get(info.filename))
+        if record is None:
+            changed.append(info.filename)
+            record = {"size": info.file_size, "crc": info.CRC, "mtime_ns": 0}
+        records[info.filename] = record
+    stale = sorted(set(installed) - set(records))
+
+    stats = {"files": 0, "bytes": 0}
+    if changed:
+        stats = extract(zip_path, app_dir / STAGING_DIR, report, manifest, workers, interval,
+                        names=set(changed))
+    elif report is not None:
+        report(0, 0, "")
+    journal = {"moves": changed, "delete": stale, "records": records}
+    _write_json(app_dir / JOURNAL, journal)
+    _commit(app_dir, journal)
+    return {"files": len(files), "changed": len(changed), "deleted": len(stale),
+            "bytes_written": stats["bytes"], "recovered": recovered,
+            "seconds": time.perf_counter() - t}
+
+
+if __name__ == "__main__":
+    # python unpack.py manifest app.zip  ->  app.manifest.json next to it
+    if len(sys.argv) != 3 or sys.argv[1] != "manifest":
+        print("usage: python unpack.py manifest app.zip")
+        sys.exit(2)
+    archive = Path(sys.argv[2])
+    out = archive.with_name(MANIFEST_NAME)
+    out.write_text(json.dumps(build_manifest(archive), indent=1), encoding="utf-8")
+    print(f"{out}: written")
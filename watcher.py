@@ -0,0 +1,189 @@
+"""
+Filesystem watch layer for the zapret directory.
+
+Keeps a stat snapshot of the root (strategies), lists and utils directories
+and turns changes into fine-grained events, so callers reload only the
+affected list, strategy entry or toggle instead of rescanning everything.
+The GUI drives it from QFileSystemWatcher; without Qt it can poll on its
+own thread.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Event kinds (also the keys of the watched directories)
+STRATEGY = "strategy"
+LIST = "list"
+TOGGLE = "toggle"
+
+# Event actions
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+
+# Service/utility scripts that live next to the strategies
+EXCLUDED_BATS = {"service.bat", "uninstall.bat", "install.bat", "start.bat", "stop.bat"}
+
+
+class ChangeEvent:
+    __slots__ = ("kind", "action", "name", "path")
+
+    def __init__(self, kind: str, action: str, name: str, path: Path):
+        self.kind = kind
+        self.action = action
+        self.name = name
+        self.path = path
+
+    def __repr__(self):
+        return f"ChangeEvent({self.kind}, {self.action}, {self.name})"
+
+
+def _matches(kind: str, name: str) -> bool:
+    lower = name.lower()
+    if kind == STRATEGY:
+        return lower.endswith(".bat") and lower not in EXCLUDED_BATS
+    if kind == LIST:
+        return lower.endswith(".txt")
+    if kind == TOGGLE:
+        return lower.endswith(".enabled")
+    return False
+
+
+class ZapretWatcher:
+    def __init__(self, zapret_dir: Path):
+        self.zapret_dir = zapret_dir
+        self.dirs = {
+            STRATEGY: zapret_dir,
+            LIST: zapret_dir / "lists",
+            TOGGLE: zapret_dir / "utils",
+        }
+        # kind -> {file name: (mtime_ns, size)}
+        self._state: Dict[str, Dict[str, Tuple[int, int]]] = {k: {} for k in self.dirs}
+        # kind -> sorted names, dropped whenever a file is added or removed
+        self._sorted: Dict[str, Optional[List[str]]] = {k: None for k in self.dirs}
+        self._lock = threading.Lock()
+        self._poll_thread = None
+        self._poll_stop = threading.Event()
+
+    def _list_dir(self, kind: str) -> Dict[str, Tuple[int, int]]:
+        entries = {}
+        try:
+            with os.scandir(self.dirs[kind]) as it:
+                for entry in it:
+                    if not _matches(kind, entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.is_file():
+                        entries[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return entries
+
+    def scan(self):
+        """Take the initial snapshot without emitting events."""
+        with self._lock:
+            for kind in self.dirs:
+                self._state[kind] = self._list_dir(kind)
+                self._sorted[kind] = None
+
+    def check(self, kind: Optional[str] = None) -> List[ChangeEvent]:
+        """Re-stat one watched directory (or all of them) and return the changes."""
+        kinds = [kind] if kind else list(self.dirs)
+        events = []
+        with self._lock:
+            for k in kinds:
+                old = self._state[k]
+                new = self._list_dir(k)
+                for name, sig in new.items():
+                    if name not in old:
+                        events.append(ChangeEvent(k, ADDED, name, self.dirs[k] / name))
+                    elif old[name] != sig:
+                        events.append(ChangeEvent(k, MODIFIED, name, self.dirs[k] / name))
+                for name in old:
+                    if name not in new:
+                        events.append(ChangeEvent(k, REMOVED, name, self.dirs[k] / name))
+                self._state[k] = new
+                if old.keys() != new.keys():
+                    self._sorted[k] = None
+        return events
+
+    def check_file(self, path: Path) -> List[ChangeEvent]:
+        """Re-stat a single file, e.g. after a fileChanged notification."""
+        path = Path(path)
+        kind = self.kind_for_dir(path.parent)
+        if kind is None or not _matches(kind, path.name):
+            return []
+        with self._lock:
+            state = self._state[kind]
+            old = state.get(path.name)
+            try:
+                st = path.stat()
+                new = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                new = None
+            if new is None:
+                if old is None:
+                    return []
+                del state[path.name]
+                self._sorted[kind] = None
+                return [ChangeEvent(kind, REMOVED, path.name, path)]
+            state[path.name] = new
+            if old is None:
+                self._sorted[kind] = None
+                return [ChangeEvent(kind, ADDED, path.name, path)]
+            if old != new:
+                return [ChangeEvent(kind, MODIFIED, path.name, path)]
+        return []
+
+    def kind_for_dir(self, directory: Path) -> Optional[str]:
+        directory = os.path.normcase(os.path.abspath(directory))
+        for kind, d in self.dirs.items():
+            if os.path.normcase(os.path.abspath(d)) == directory:
+                return kind
+        return None
+
+    def names(self, kind: str) -> List[str]:
+        with self._lock:
+            if self._sorted[kind] is None:
+                self._sorted[kind] = sorted(self._state[kind])
+            return list(self._sorted[kind])
+
+    def strategies(self) -> List[str]:
+        return self.names(STRATEGY)
+
+    def lists(self) -> List[str]:
+        return self.names(LIST)
+
+    def toggles(self) -> List[str]:
+        return [n[:-len(".enabled")] for n in self.names(TOGGLE)]
+
+    def watched_dirs(self) -> List[str]:
+        return [str(d) for d in self.dirs.values()]
+
+    def watched_files(self) -> List[str]:
+        with self._lock:
+            return [str(self.dirs[k] / n) for k, names in self._state.items() for n in names]
+
+    # Polling fallback for platforms or contexts without native notifications
+
+    def start_polling(self, callback: Callable[[List[ChangeEvent]], None], interval: float = 2.0):
+        if self._poll_thread and self._poll_thread.is_alive():
+            return
+        self._poll_stop.clear()
+
+        def loop():
+            while not self._poll_stop.wait(interval):
+                events = self.check()
+                if events:
+                    callback(events)
+
+        self._poll_thread = threading.Thread(target=loop, daemon=True)
+        self._poll_thread.start()
+
+    def stop_polling(self):
+        self._poll_stop.set()